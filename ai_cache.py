@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+
+from ttlcache import TTLCache
+
+# AI javoblari keshi sozlamalari
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "5000"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", str(24 * 3600)))
+# Bo'sh bo'lsa kesh diskka yozilmaydi
+AI_CACHE_FILE = os.getenv("AI_CACHE_FILE", "")
+AI_CACHE_SAVE_INTERVAL = float(os.getenv("AI_CACHE_SAVE_INTERVAL", "300"))
+
+_APOSTROPHES = str.maketrans({"ʻ": "'", "ʼ": "'", "‘": "'", "’": "'", "`": "'"})
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_SPACES = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+# Savol matnini normallashtirish (katta-kichik harf, tinish belgilari, bo'shliqlar)
+def normalize_text(text) -> str:
+    text = str(text or "").lower().translate(_APOSTROPHES)
+    text = _PUNCTUATION.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def _first_number(text):
+    match = _NUMBER.search(str(text or ""))
+    if not match:
+        return None
+    return float(match.group().replace(",", "."))
+
+
+def _age_bucket(age):
+    age = _first_number(age)
+    if age is None:
+        return "?"
+    for limit, bucket in ((25, "<25"), (35, "25-34"), (45, "35-44"), (60, "45-59")):
+        if age < limit:
+            return bucket
+    return "60+"
+
+
+# Daromad: "5 mln", "5000000", "800 ming" kabi yozuvlarni taxminiy guruhlash
+def _income_bucket(income):
+    text = normalize_text(income)
+    amount = _first_number(text)
+    if amount is None:
+        return "?"
+    if "mln" in text or "million" in text:
+        amount *= 1_000_000
+    elif "ming" in text or "k" in text.split():
+        amount *= 1_000
+    for limit, bucket in ((3e6, "<3m"), (7e6, "3-7m"), (15e6, "7-15m"), (30e6, "15-30m")):
+        if amount < limit:
+            return bucket
+    return "30m+"
+
+
+# Profil ma'lumotlaridan guruhlangan kontekst
+def profile_bucket(profile):
+    if not profile or len(profile) < 5:
+        return ("?",)
+    age, job, income, interest, business = profile[:5]
+    return (
+        _age_bucket(age),
+        normalize_text(job),
+        _income_bucket(income),
+        normalize_text(interest),
+        normalize_text(business).startswith("ha"),
+    )
+
+
+# Savol + profil bo'yicha keshlovchi, bir xil so'rovlarni birlashtiruvchi kesh
+class AnswerCache:
+    def __init__(self, maxsize=AI_CACHE_SIZE, ttl=AI_CACHE_TTL, path=AI_CACHE_FILE):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.path = path
+        self.collapsed = 0
+        self._inflight = {}
+        self._save_task = None
+
+    def key(self, question, profile) -> str:
+        raw = json.dumps([normalize_text(question), profile_bucket(profile)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    # Keshdan olish yoki bitta umumiy so'rov bilan hisoblash.
+    # So'rov yuborgan user bekor qilinsa (timeout, limit), unga qo'shilganlar so'rovni o'zlari qayta yuboradi
+    async def get_or_fetch(self, key, fetch):
+        while True:
+            answer = self.cache.get(key)
+            if answer is not None:
+                return answer
+
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.collapsed += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Kutayotganning o'zi bekor qilingan bo'lsa - chiqiladi
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            answer = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Kutuvchi bo'lmasa "exception was never retrieved" chiqmasligi uchun
+            future.exception()
+            raise
+        else:
+            self.cache.set(key, answer)
+            future.set_result(answer)
+            return answer
+        finally:
+            del self._inflight[key]
+
+    def stats(self):
+        return {**self.cache.stats(), "collapsed": self.collapsed, "inflight": len(self._inflight)}
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"AI keshini o'qishda xatolik: {e}")
+            return
+        now = time.time()
+        for key, answer, expires_at in entries:
+            if expires_at > now:
+                self.cache.set(key, answer, ttl=expires_at - now)
+
+    def _write(self, entries):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    async def save(self):
+        if not self.path:
+            return
+        now = time.time()
+        entries = [(key, answer, now + ttl) for key, answer, ttl in self.cache.dump()]
+        try:
+            await asyncio.to_thread(self._write, entries)
+        except Exception as e:
+            print(f"AI keshini yozishda xatolik: {e}")
+
+    async def _save_loop(self):
+        while True:
+            await asyncio.sleep(AI_CACHE_SAVE_INTERVAL)
+            await self.save()
+
+    def start(self):
+        self.load()
+        if self.path and self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_loop())
+
+    async def close(self):
+        if self._save_task is not None:
+            self._save_task.cancel()
+            try:
+                await self._save_task
+            except asyncio.CancelledError:
+                pass
+            self._save_task = None
+        await self.save()
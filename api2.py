@@ -1,24 +1,49 @@
 import asyncio
-import json
+import hashlib
 import os
-import uuid
-import aiohttp
-import requests
-from datetime import datetime, timedelta
+import signal
+from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
-from aiogram import Bot, Dispatcher, F
+from aiogram import BaseMiddleware, Bot, Dispatcher, F
 from aiogram.types import (
     Message,
     CallbackQuery,
+    ChatMemberUpdated,
     InlineKeyboardMarkup,
     InlineKeyboardButton
 )
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.fsm.storage.memory import MemoryStorage
-import requests
-import asyncio
+
+from ai_cache import AnswerCache
+from bank_catalog import BankCatalog
+from broadcast import Broadcaster, BroadcastRunning
+from chat_executor import ChatExecutor
+from conversation import ConversationMemory, estimate_tokens
+from finance import (
+    CREDIT_MAX_TERM, DEPOSIT_MAX_TERM, DEPOSIT_MIN_AMOUNT, DEPOSIT_MIN_TERM,
+    calculate_credit_schedule, calculate_deposit, deposit_cache_stats, parse_amount, parse_rate,
+)
+from fsm_storage import SQLiteStorage
+from llm_client import LLMError, close_session
+from llm_router import build_router
+from llm_scheduler import LLMScheduler, SchedulerOverloaded
+from metrics import FSM_STATES, QUEUE_DEPTH, instrument, start_server, track_stats
+from profiling import PROFILE_UPDATES, LoopMonitor, UpdateProfiler
+from send_queue import SendQueue
+from streaming import StreamingReply
+from sharding import run_supervisor
+from subscription import cache_stats as subscription_cache_stats
+from subscription import channel_username, is_subscribed, on_member_update
+from throttling import ThrottlingMiddleware
+from ttlcache import TTLCache
+from user_store import UserStore
+from webhook import run_webhook
 
 # .env faylini yuklash
 load_dotenv()
@@ -36,25 +61,95 @@ if not GIGA_TOKEN:
 
 print("✅ Tokenlar muvaffaqiyatli yuklandi!")
 
-# JSON fayl nomi
+# Ishlash rejimi: "polling" (ishlab chiqish uchun), "webhook" yoki "sharded" (bir nechta jarayon)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Userlar bazasi (SQLite, WAL rejimida)
+USER_DB_FILE = os.getenv("USER_DB_FILE", "user_data.db")
+
+# FSM holatlari bazasi
+FSM_DB_FILE = os.getenv("FSM_DB_FILE", "fsm_state.db")
+
+# Eski JSON fayl nomi (bir martalik migratsiya uchun)
 USER_DATA_FILE = "user_data.json"
 
-# User ma'lumotlarini saqlash uchun lug'at
-user_data = {}
+# User ma'lumotlari ombori (lug'atga o'xshash)
+user_data = UserStore(USER_DB_FILE)
+
+# Banklar bazasi (banks.json, o'zgarsa bot to'xtamasdan yangilanadi)
+bank_catalog = BankCatalog()
+bank_catalog.load()
+
+# Solishtirish matnlari keshi
+COMPARE_CACHE_SIZE = int(os.getenv("COMPARE_CACHE_SIZE", "2048"))
+COMPARE_CACHE_TTL = float(os.getenv("COMPARE_CACHE_TTL", "3600"))
+_comparison_cache = TTLCache(maxsize=COMPARE_CACHE_SIZE, ttl=COMPARE_CACHE_TTL)
+
+# Kredit grafigi sahifalari (bir sahifa Telegram 4096 belgi chegarasidan oshmasligi uchun 40 qatorgacha)
+SCHEDULE_PAGE_SIZE = min(int(os.getenv("SCHEDULE_PAGE_SIZE", "12")), 40)
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", "1024"))
+SCHEDULE_CACHE_TTL = float(os.getenv("SCHEDULE_CACHE_TTL", "900"))
+_schedule_cache = TTLCache(maxsize=SCHEDULE_CACHE_SIZE, ttl=SCHEDULE_CACHE_TTL)
+
+# AI javoblari keshi
+answer_cache = AnswerCache()
+
+# LLM so'rovlari rejalashtiruvchisi
+llm_scheduler = LLMScheduler()
+
+# LLM provayderlari: OpenAI va GigaChat (xato/sekinlikda biridan ikkinchisiga o'tiladi)
+llm_router = build_router(OPENAI_API_KEY, GIGA_TOKEN)
+
+# AI maslahatchi modeli va suhbat xulosalari uchun (arzonroq) model
+AI_MODEL = os.getenv("AI_MODEL", "gpt-4.1")
+AI_SUMMARY_MODEL = os.getenv("AI_SUMMARY_MODEL", "gpt-4.1-mini")
+# Javobni yozilishi bilan ko'rsatish (oqimli completion va xabarni tahrirlash)
+AI_STREAM = os.getenv("AI_STREAM", "1") == "1"
+
+# Tizim ko'rsatmalari har doim promptning boshida va o'zgarmas turadi
+# (provayder tomonida prompt keshlash ishlashi uchun bu matnga o'zgaruvchi qo'shmang)
+AI_SYSTEM_PROMPT = """Siz moliyaviy maslahatchi AI siz.
+
+Iltimos, quyidagilarga e'tibor bering:
+- Aniq va amaliy maslahatlar bering
+- Moliyaviy jihatdan xavfsiz tavsiyalar
+- O'zbekiston bozoriga moslashtirilgan
+- Batafsil va tushunarli javob
+- Maxfiylikni saqlang
+- Suhbatning oldingi qismini hisobga oling"""
+
+# Eski xabarlarni xulosaga yig'ish (scheduler orqali, userning navbatida)
+async def summarize_conversation(user_id, summary, turns):
+    messages = ConversationMemory.summary_messages(summary, turns)
+    payload = {
+        "model": AI_SUMMARY_MODEL,
+        "messages": messages,
+        "temperature": 0.2,
+        "max_tokens": conversations.summary_tokens
+    }
+    result = await llm_scheduler.run(
+        user_id,
+        lambda: llm_router.complete(payload),
+        tokens=sum(estimate_tokens(message["content"]) for message in messages) + payload["max_tokens"]
+    )
+    return result["choices"][0]["message"]["content"]
+
 
-# Banklar bazasi
-BANKS_DATA = {
-    "NBU": {"name": "NBU", "rate": 18.5, "min_amount": 1000000, "color": "#4CAF50"},
-    "kapitalbank": {"name": "Kapitalbank", "rate": 17.0, "min_amount": 500000, "color": "#2196F3"},
-    "ipoteka": {"name": "Ipoteka bank", "rate": 16.5, "min_amount": 1000000, "color": "#FF9800"},
-    "xalq": {"name": "Xalq banki", "rate": 15.0, "min_amount": 500000, "color": "#9C27B0"},
-    "agro": {"name": "Agrobank", "rate": 14.5, "min_amount": 1000000, "color": "#795548"},
-}
+# Userlar bilan suhbat xotirasi (token byudjeti, xulosa, faol bo'lmaganda o'chiriladi)
+conversations = ConversationMemory(summarize=summarize_conversation)
+
+# Admin buyruqlari (/profile, /broadcast) uchun ruxsat etilgan user ID'lar (vergul bilan)
+ADMIN_IDS = {int(item) for item in os.getenv("ADMIN_IDS", "").split(",") if item.strip()}
+
+# Event loop bloklanishini kuzatish va so'rov bo'yicha profillash
+loop_monitor = LoopMonitor()
+update_profiler = UpdateProfiler()
 
 # Majburiy kanallar
 REQUIRED_CHANNELS = [
     ("1-kanal", "https://t.me/aaadhhaha1")
 ]
+CHANNEL_USERNAMES = [channel_username(link) for _, link in REQUIRED_CHANNELS]
 
 
 class ProfileForm(StatesGroup):
@@ -79,29 +174,70 @@ class DepositForm(StatesGroup):
     capitalization = State()
 
 
-bot = Bot(token=API_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
-
-
-# JSON fayldan ma'lumotlarni o'qish
+# Lokal Bot API server (masalan, yuklama testi uchun)
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER")
+if TELEGRAM_API_SERVER:
+    bot = Bot(token=API_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER)))
+else:
+    bot = Bot(token=API_TOKEN)
+dp = Dispatcher(storage=SQLiteStorage(FSM_DB_FILE))
+
+# Chiquvchi xabarlar navbati (Telegram cheklovlari, RetryAfter, chat bo'yicha tartib).
+# Metrikalardan oldin ulanadi, shunda Bot API vaqti navbatda kutishni o'z ichiga olmaydi
+send_queue = SendQueue()
+bot.session.middleware(send_queue)
+
+# Barcha userlarga xabar yuborish (admin)
+broadcaster = Broadcaster(bot, user_data)
+
+# Metrikalar: handler va Bot API vaqtlari, FSM holatlari, navbatlar va keshlar
+instrument(dp, bot)
+dp.update.outer_middleware(update_profiler)
+
+# Bitta chat update'lari ketma-ket (FSM holatlari aralashmasligi uchun), turli chatlar parallel.
+# Metrikalardan keyin ulanadi - update vaqti navbatda kutishni ham o'z ichiga oladi
+chat_executor = ChatExecutor()
+chat_executor.setup(dp)
+
+# Kiruvchi so'rovlar limiti (user bo'yicha): umumiy limit obuna tekshiruvidan oldin,
+# handler turi bo'yicha limitlar (flags={"throttle": ...}) esa handler tanlangandan keyin
+inbound_throttle = ThrottlingMiddleware(default="default")
+handler_throttle = ThrottlingMiddleware()
+FSM_STATES.track_many(lambda: {(state,): count for state, count in dp.storage.state_counts().items()})
+QUEUE_DEPTH.track(llm_scheduler.depth, queue="llm_scheduler")
+QUEUE_DEPTH.track(user_data.dirty_count, queue="user_store_dirty")
+QUEUE_DEPTH.track(send_queue.depth, queue="send")
+QUEUE_DEPTH.track(chat_executor.waiting, queue="updates")
+track_stats("deposit", deposit_cache_stats)
+track_stats("comparison", _comparison_cache.stats)
+track_stats("subscription", subscription_cache_stats)
+track_stats("ai_answers", answer_cache.stats)
+track_stats("conversations", conversations.stats)
+track_stats("llm_scheduler", llm_scheduler.stats)
+track_stats("llm_router", llm_router.stats)
+for _provider in llm_router.providers:
+    track_stats(f"llm_{_provider.name}", _provider.stats)
+track_stats("event_loop", loop_monitor.stats)
+track_stats("bank_catalog", bank_catalog.stats)
+track_stats("send_queue", send_queue.stats)
+track_stats("updates", chat_executor.stats)
+track_stats("throttle_inbound", inbound_throttle.stats)
+track_stats("throttle_handlers", handler_throttle.stats)
+track_stats("broadcast", lambda: broadcaster.status() or {})
+_metrics_runner = None
+
+
+# Bazani ochish (kerak bo'lsa JSON fayldan ko'chirish)
 def load_user_data():
-    global user_data
-    if os.path.exists(USER_DATA_FILE):
-        try:
-            with open(USER_DATA_FILE, 'r', encoding='utf-8') as f:
-                user_data = json.load(f)
-        except Exception as e:
-            print(f"Faylni o'qishda xatolik: {e}")
-            user_data = {}
-
-
-# JSON faylga ma'lumotlarni yozish
-def save_user_data():
     try:
-        with open(USER_DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
+        user_data.open(migrate_from=USER_DATA_FILE)
     except Exception as e:
-        print(f"Faylga yozishda xatolik: {e}")
+        print(f"Bazani ochishda xatolik: {e}")
+
+
+# O'zgargan userni fon rejimida bazaga yozishga belgilash
+def save_user_data(user_id=None):
+    user_data.mark_dirty(user_id)
 
 
 # Profil to'liqligini tekshirish
@@ -114,12 +250,13 @@ def is_profile_complete(user_id: str) -> bool:
     return len(profile) == 5 and all(profile)
 
 
-# OpenAI API bilan ishlash (requests orqali)
-async def ask_openai(user_id: str, user_question: str) -> str:
+# OpenAI API bilan ishlash (aiohttp orqali)
+# on_delta(matn) berilsa, javob oqim bilan olinadi va har bir bo'lak shu funksiyaga uzatiladi
+async def ask_openai(user_id: str, user_question: str, use_cache: bool = True, on_queued=None, on_delta=None) -> str:
     try:
         # User ma'lumotlarini olish
-        if user_id in user_data:
-            user_info = user_data[user_id]["profile"]
+        user_info = user_data[user_id]["profile"] if user_id in user_data else None
+        if user_info:
             user_context = (
                 f"Yosh: {user_info[0]}, Kasb: {user_info[1]}, "
                 f"Daromad: {user_info[2]}, Qiziqishlar: {user_info[3]}, Biznes: {user_info[4]}"
@@ -127,76 +264,99 @@ async def ask_openai(user_id: str, user_question: str) -> str:
         else:
             user_context = "Foydalanuvchi ma'lumotlari topilmadi"
 
-        # Prompt
-        full_prompt = f"""
-        Siz moliyaviy maslahatchi AI siz. 
-        Foydalanuvchi ma'lumotlari: {user_context}
-
-        Foydalanuvchi savoli: {user_question}
-
-        Iltimos, quyidagilarga e'tibor bering:
-        - Aniq va amaliy maslahatlar bering
-        - Moliyaviy jihatdan xavfsiz tavsiyalar
-        - O'zbekiston bozoriga moslashtirilgan
-        - Batafsil va tushunarli javob
-        - Maxfiylikni saqlang
-        """
-
-        # OpenAI endpoint
-        url = "https://api.openai.com/v1/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json"
-        }
+        # Prompt: o'zgarmas ko'rsatmalar, profil, suhbat xulosasi va oxirgi xabarlar, yangi savol
+        messages = conversations.build_messages(
+            user_id, AI_SYSTEM_PROMPT, f"Foydalanuvchi ma'lumotlari: {user_context}", user_question
+        )
 
         payload = {
-            "model": "gpt-4.1",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": full_prompt
-                }
-            ],
+            "model": AI_MODEL,
+            "messages": messages,
             "temperature": 0.7,
             "max_tokens": 1000
         }
 
-        # Sync so'rovni async qilish
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: requests.post(url, json=payload, headers=headers)
-        )
+        async def generate():
+            if on_delta is None:
+                result = await llm_router.complete(payload)
+                return result["choices"][0]["message"]["content"]
+            parts = []
+            async for delta in llm_router.stream(payload):
+                parts.append(delta)
+                on_delta(delta)
+            return "".join(parts)
+
+        # Umumiy keep-alive sessiya orqali async so'rov
+        # So'rov umumiy limitlar va userlar navbati orqali yuboriladi
+        async def fetch():
+            return await llm_scheduler.run(
+                user_id,
+                generate,
+                tokens=sum(estimate_tokens(message["content"]) for message in messages) + payload["max_tokens"],
+                on_queued=on_queued
+            )
 
-        if response.status_code == 200:
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+        # O'xshash profil va bir xil savol uchun tayyor javob qaytariladi.
+        # Suhbat davom etayotgan bo'lsa, javob oldingi xabarlarga bog'liq - kesh ishlatilmaydi
+        if use_cache and not conversations.has_history(user_id):
+            answer = await answer_cache.get_or_fetch(answer_cache.key(user_question, user_info), fetch)
         else:
-            return f"❌ API xatosi: {response.status_code}. Iltimos, keyinroq urinib ko'ring."
-
+            answer = await fetch()
+        conversations.add_turn(user_id, user_question, answer)
+        return answer
+
+    except SchedulerOverloaded:
+        return "⚠️ Hozir so'rovlar juda ko'p. Iltimos, bir necha daqiqadan keyin qayta urinib ko'ring."
+    except LLMError as e:
+        return f"❌ API xatosi: {e.status}. Iltimos, keyinroq urinib ko'ring."
     except Exception as e:
         return f"❌ Xatolik yuz berdi: {str(e)}. Iltimos, keyinroq urinib ko'ring."
 
 
-# Kanalga a'zolikni tekshirish
-async def check_subscription(user_id: int) -> bool:
-    for name, link in REQUIRED_CHANNELS:
-        try:
-            username = link.split("/")[-1]
-            if not username.startswith("@"):
-                username = "@" + username
+# Kanalga a'zolikni tekshirish (kesh orqali, kanallar parallel tekshiriladi)
+async def check_subscription(user_id: int, force: bool = False) -> bool:
+    return await is_subscribed(bot, CHANNEL_USERNAMES, user_id, force=force)
+
+
+# Obunani har bir update uchun bir marta tekshiruvchi middleware
+class SubscriptionMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        # "Tekshirish" tugmasi bosilganda keshni chetlab o'tamiz
+        is_check = isinstance(event, CallbackQuery) and event.data == "check_sub"
+        subscribed = await check_subscription(user.id, force=is_check)
+        data["subscribed"] = subscribed
+
+        if subscribed or is_check:
+            return await handler(event, data)
+
+        if isinstance(event, CallbackQuery):
+            await event.answer("🚫 Iltimos, avval kanallarga obuna bo'ling.", show_alert=True)
+            if event.message:
+                await event.message.answer(
+                    "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
+                    reply_markup=subscription_keyboard()
+                )
+        else:
+            await event.answer(
+                "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
+                reply_markup=subscription_keyboard()
+            )
+
 
-            member = await bot.get_chat_member(chat_id=username, user_id=user_id)
-            if member.status not in ("member", "administrator", "creator"):
-                return False
-        except Exception as e:
-            print(f"Kanal tekshirishda xatolik: {e}")
-            return False
-    return True
+dp.message.outer_middleware(inbound_throttle)
+dp.callback_query.outer_middleware(inbound_throttle)
+dp.message.outer_middleware(SubscriptionMiddleware())
+dp.callback_query.outer_middleware(SubscriptionMiddleware())
+dp.message.middleware(handler_throttle)
+dp.callback_query.middleware(handler_throttle)
 
 
-# A'zo bo'lish uchun klaviatura
+# A'zo bo'lish uchun klaviatura (bir marta yaratiladi)
+@lru_cache(maxsize=1)
 def subscription_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -209,6 +369,7 @@ def subscription_keyboard():
 
 
 # Asosiy menyu
+@lru_cache(maxsize=1)
 def main_menu():
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -220,10 +381,15 @@ def main_menu():
     )
 
 
-# Bank tanlash klaviaturasi
+# Bank tanlash klaviaturasi (katalogning har bir versiyasi uchun bir marta yaratiladi)
 def banks_keyboard():
+    return _banks_keyboard(bank_catalog.current)
+
+
+@lru_cache(maxsize=4)
+def _banks_keyboard(catalog):
     buttons = []
-    for bank_id, bank_info in BANKS_DATA.items():
+    for bank_id, bank_info in catalog.items():
         buttons.append([
             InlineKeyboardButton(
                 text=f"{bank_info['name']} ({bank_info['rate']}%)",
@@ -235,6 +401,7 @@ def banks_keyboard():
 
 
 # Kapitalizatsiya tanlash
+@lru_cache(maxsize=1)
 def capitalization_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -245,46 +412,6 @@ def capitalization_keyboard():
     )
 
 
-# Depozit hisoblash funksiyasi
-def calculate_deposit(amount, annual_rate, term_months, capitalization=True, tax_rate=12):
-    try:
-        monthly_rate = annual_rate / 100 / 12
-
-        if capitalization:
-            # Murakkab foiz (kapitalizatsiya bilan)
-            total_amount = amount * (1 + monthly_rate) ** term_months
-            total_interest = total_amount - amount
-        else:
-            # Oddiy foiz
-            total_interest = amount * monthly_rate * term_months
-            total_amount = amount + total_interest
-
-        # Oylik daromad
-        monthly_income = total_interest / term_months
-
-        # Soliq hisobi (12% - daromad solig'i)
-        tax_amount = total_interest * (tax_rate / 100)
-        net_interest = total_interest - tax_amount
-        net_amount = amount + net_interest
-
-        return {
-            'initial_amount': amount,
-            'annual_rate': annual_rate,
-            'term_months': term_months,
-            'capitalization': capitalization,
-            'total_interest': round(total_interest, 2),
-            'total_amount': round(total_amount, 2),
-            'monthly_income': round(monthly_income, 2),
-            'tax_amount': round(tax_amount, 2),
-            'net_interest': round(net_interest, 2),
-            'net_amount': round(net_amount, 2),
-            'tax_rate': tax_rate
-        }
-    except Exception as e:
-        print(f"Depozit hisobida xatolik: {e}")
-        return None
-
-
 # Depozit natijasini chiroyli formatda
 def format_deposit_result(result, bank_name):
     if not result:
@@ -335,101 +462,114 @@ def get_deposit_advice(result):
     return " | ".join(advice)
 
 
-# Banklar solishtirish
+# Banklar solishtirish (kesh kaliti katalog versiyasini ham o'z ichiga oladi)
 def compare_banks(amount, term_months):
-    comparison = "🏦 **BANKLAR SOLISHTIRISHI**\n\n"
+    catalog = bank_catalog.current
+    key = (float(amount), int(term_months), catalog.version)
+    comparison = _comparison_cache.get(key)
+    if comparison is not None:
+        return comparison
+
+    parts = ["🏦 **BANKLAR SOLISHTIRISHI**\n\n"]
+
+    # Minimal summaga mos banklar tartiblangan indeksdan olinadi
+    for bank_id in catalog.eligible(amount):
+        bank_info = catalog.get(bank_id)
+        result = calculate_deposit(
+            amount, bank_info['rate'], term_months,
+            capitalization=True, tax_rate=12
+        )
 
-    for bank_id, bank_info in BANKS_DATA.items():
-        if amount >= bank_info['min_amount']:
-            result = calculate_deposit(
-                amount, bank_info['rate'], term_months,
-                capitalization=True, tax_rate=12
+        if result:
+            parts.append(
+                f"🏛️ **{bank_info['name']}** ({bank_info['rate']}%)\n"
+                f"💰 Sof daromad: {result['net_interest']:,.0f} so'm\n"
+                f"💳 Minimal summa: {bank_info['min_amount']:,.0f} so'm\n\n"
             )
 
-            if result:
-                comparison += (
-                    f"🏛️ **{bank_info['name']}** ({bank_info['rate']}%)\n"
-                    f"💰 Sof daromad: {result['net_interest']:,.0f} so'm\n"
-                    f"💳 Minimal summa: {bank_info['min_amount']:,.0f} so'm\n\n"
-                )
-
+    comparison = "".join(parts)
+    _comparison_cache.set(key, comparison)
     return comparison
 
 
-# Kredit grafigini hisoblash
-def calculate_credit_schedule(amount, interest_rate, term, start_date):
-    try:
-        start_date = datetime.strptime(start_date, "%d.%m.%Y")
-        monthly_rate = interest_rate / 100 / 12
-        monthly_payment = amount * (monthly_rate * (1 + monthly_rate) ** term) / ((1 + monthly_rate) ** term - 1)
-
-        schedule = []
-        remaining_balance = amount
-
-        for i in range(1, term + 1):
-            interest_payment = remaining_balance * monthly_rate
-            principal_payment = monthly_payment - interest_payment
-            remaining_balance -= principal_payment
-
-            if i == term:
-                monthly_payment += remaining_balance
-                principal_payment += remaining_balance
-                remaining_balance = 0
-
-            payment_date = start_date + timedelta(days=30 * i)
-
-            schedule.append({
-                'number': i,
-                'date': payment_date.strftime("%d.%m.%Y"),
-                'interest': round(interest_payment, 2),
-                'total_payment': round(monthly_payment, 2),
-                'remaining_balance': round(max(remaining_balance, 0), 2)
-            })
-
-        return schedule
-    except Exception as e:
-        print(f"Kredit grafigini hisoblashda xatolik: {e}")
-        return None
+# Kredit ma'lumotlarining qisqa izi (eskirgan sahifa tugmalarini aniqlash uchun)
+def credit_fingerprint(credit_info):
+    raw = f"{credit_info['amount']}|{credit_info['interest_rate']}|{credit_info['term']}|{credit_info['start_date']}"
+    return hashlib.blake2b(raw.encode(), digest_size=4).hexdigest()
+
+
+# Kredit grafigi (ustunlar ko'rinishida keshlanadi, sahifalar shundan olinadi)
+def cached_schedule(credit_info):
+    key = (credit_info['amount'], credit_info['interest_rate'], credit_info['term'], credit_info['start_date'])
+    schedule = _schedule_cache.get(key)
+    if schedule is None:
+        schedule = calculate_credit_schedule(*key)
+        if schedule:
+            _schedule_cache.set(key, schedule)
+    return schedule
+
+
+SCHEDULE_TABLE_HEADER = (
+    "┌─────┬────────────┬─────────────┬──────────────┬──────────────┐\n"
+    "│ No  │ Sana       │ Foiz        │ Jami to'lov  │ Qoldiq       │\n"
+    "├─────┼────────────┼─────────────┼──────────────┼──────────────┤"
+)
+SCHEDULE_TABLE_FOOTER = "└─────┴────────────┴─────────────┴──────────────┴──────────────┘"
 
 
-# Jadvalni matn shaklida yaratish
-def create_schedule_table(schedule):
+# Jadvalning bitta sahifasini matn shaklida yaratish (faqat shu sahifa qatorlari hisoblanadi)
+def create_schedule_table(schedule, page=0, page_size=SCHEDULE_PAGE_SIZE):
     if not schedule:
         return "Xatolik: Jadval yaratib bo'lmadi"
 
-    table = "📊 **KREDIT TOLOV GRAFIGI**\n\n"
-    table += "┌─────┬────────────┬─────────────┬──────────────┬──────────────┐\n"
-    table += "│ No  │ Sana       │ Foiz        │ Jami to'lov  │ Qoldiq       │\n"
-    table += "├─────┼────────────┼─────────────┼──────────────┼──────────────┤\n"
+    pages = schedule.page_count(page_size)
+    page = min(max(page, 0), pages - 1)
+    start = page * page_size
+    stop = min(start + page_size, len(schedule))
 
-    for payment in schedule[:12]:  # Faqat birinchi 12 oyni ko'rsatamiz
-        table += f"│ {payment['number']:<3} │ {payment['date']} │ {payment['interest']:>11,.0f} │ {payment['total_payment']:>12,.0f} │ {payment['remaining_balance']:>12,.0f} │\n"
-
-    table += "└─────┴────────────┴─────────────┴──────────────┴──────────────┘\n"
+    rows = "\n".join(
+        f"│ {payment['number']:<3} │ {payment['date']} │ {payment['interest']:>11,.0f} │ {payment['total_payment']:>12,.0f} │ {payment['remaining_balance']:>12,.0f} │"
+        for payment in schedule.rows(start, stop)
+    )
 
-    total_interest = sum(payment['interest'] for payment in schedule)
-    total_payments = sum(payment['total_payment'] for payment in schedule)
+    # Jami summalar ustunlardan hisoblanadi, barcha qatorlar yaratilmaydi
+    summary = schedule.summary()
+    return "\n".join([
+        f"📊 *KREDIT TO'LOV GRAFIGI* ({start + 1}-{stop} oylar, {page + 1}/{pages}-sahifa)",
+        "```",
+        SCHEDULE_TABLE_HEADER,
+        rows,
+        SCHEDULE_TABLE_FOOTER,
+        "```",
+        f"*Umumiy foizlar:* {summary['total_interest']:,.0f} so'm",
+        f"*Umumiy to'lov:* {summary['total_payment']:,.0f} so'm",
+        f"*Asosiy qarz:* {summary['principal']:,.0f} so'm",
+        f"*Oylik to'lov:* {summary['monthly_payment']:,.0f} so'm",
+    ])
+
+
+# Grafik sahifalari orasida yurish tugmalari
+def schedule_keyboard(fingerprint, page, pages):
+    if pages <= 1:
+        return None
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="◀", callback_data=f"sched:{fingerprint}:{page - 1}"))
+    buttons.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="sched:page"))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton(text="▶", callback_data=f"sched:{fingerprint}:{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
 
-    table += f"\n**Umumiy foizlar:** {total_interest:,.0f} so'm\n"
-    table += f"**Umumiy to'lov:** {total_payments:,.0f} so'm\n"
-    table += f"**Asosiy qarz:** {schedule[0]['remaining_balance'] + schedule[0]['total_payment'] - schedule[0]['interest']:,.0f} so'm\n"
-    table += f"**Oylik to'lov:** {schedule[0]['total_payment']:,.0f} so'm\n\n"
-    table += f"*Faqat birinchi 12 oy ko'rsatilgan*"
 
-    return table
+# Kanal a'zoligi o'zgarganda keshni yangilash
+@dp.chat_member()
+async def channel_member_update(update: ChatMemberUpdated):
+    on_member_update(update.chat.username, update.new_chat_member.user.id, update.new_chat_member.status)
 
 
 @dp.message(Command("start"))
 async def start_handler(message: Message, state: FSMContext):
     user_id = str(message.from_user.id)
-    subscribed = await check_subscription(message.from_user.id)
-
-    if not subscribed:
-        await message.answer(
-            "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
-            reply_markup=subscription_keyboard()
-        )
-        return
 
     # Agar profil to'liq bo'lsa, menyuni ko'rsat
     if is_profile_complete(user_id):
@@ -446,9 +586,7 @@ async def start_handler(message: Message, state: FSMContext):
 
 
 @dp.callback_query(F.data == "check_sub")
-async def check_subscription_callback(call: CallbackQuery, state: FSMContext):
-    subscribed = await check_subscription(call.from_user.id)
-
+async def check_subscription_callback(call: CallbackQuery, state: FSMContext, subscribed: bool):
     if not subscribed:
         await call.answer("🚫 Hali obuna bo'lmadingiz. Iltimos, kanallarga obuna bo'ling.", show_alert=True)
         await call.message.answer(
@@ -469,14 +607,6 @@ async def check_subscription_callback(call: CallbackQuery, state: FSMContext):
 
 @dp.message(ProfileForm.age)
 async def set_age(message: Message, state: FSMContext):
-    subscribed = await check_subscription(message.from_user.id)
-    if not subscribed:
-        await message.answer(
-            "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
-            reply_markup=subscription_keyboard()
-        )
-        return
-
     user_id = str(message.from_user.id)
 
     if user_id not in user_data:
@@ -489,14 +619,6 @@ async def set_age(message: Message, state: FSMContext):
 
 @dp.message(ProfileForm.job)
 async def set_job(message: Message, state: FSMContext):
-    subscribed = await check_subscription(message.from_user.id)
-    if not subscribed:
-        await message.answer(
-            "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
-            reply_markup=subscription_keyboard()
-        )
-        return
-
     await state.update_data(job=message.text)
     await state.set_state(ProfileForm.income)
     await message.answer("Oylik daromadingiz qancha?")
@@ -504,14 +626,6 @@ async def set_job(message: Message, state: FSMContext):
 
 @dp.message(ProfileForm.income)
 async def set_income(message: Message, state: FSMContext):
-    subscribed = await check_subscription(message.from_user.id)
-    if not subscribed:
-        await message.answer(
-            "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
-            reply_markup=subscription_keyboard()
-        )
-        return
-
     await state.update_data(income=message.text)
     await state.set_state(ProfileForm.interest)
     await message.answer("Qiziqishlaringiz?")
@@ -519,14 +633,6 @@ async def set_income(message: Message, state: FSMContext):
 
 @dp.message(ProfileForm.interest)
 async def set_interest(message: Message, state: FSMContext):
-    subscribed = await check_subscription(message.from_user.id)
-    if not subscribed:
-        await message.answer(
-            "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
-            reply_markup=subscription_keyboard()
-        )
-        return
-
     await state.update_data(interest=message.text)
     await state.set_state(ProfileForm.business)
     await message.answer("Hozir biznesingiz bormi? (ha/yo'q)")
@@ -534,14 +640,6 @@ async def set_interest(message: Message, state: FSMContext):
 
 @dp.message(ProfileForm.business)
 async def finish_profile(message: Message, state: FSMContext):
-    subscribed = await check_subscription(message.from_user.id)
-    if not subscribed:
-        await message.answer(
-            "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
-            reply_markup=subscription_keyboard()
-        )
-        return
-
     user_id = str(message.from_user.id)
 
     await state.update_data(business=message.text)
@@ -558,7 +656,7 @@ async def finish_profile(message: Message, state: FSMContext):
         "credit_info": None
     }
 
-    save_user_data()
+    save_user_data(user_id)
 
     msg = (
         "📋 Profil saqlandi!\n\n"
@@ -578,26 +676,17 @@ async def finish_profile(message: Message, state: FSMContext):
 
 
 # Kredit ma'lumotlarini olish
-@dp.callback_query(F.data == "credit_graph")
+@dp.callback_query(F.data == "credit_graph", flags={"throttle": "calculator"})
 async def start_credit_form(call: CallbackQuery, state: FSMContext):
-    subscribed = await check_subscription(call.from_user.id)
-    if not subscribed:
-        await call.answer("🚫 Iltimos, avval kanallarga obuna bo'ling.", show_alert=True)
-        await call.message.answer(
-            "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
-            reply_markup=subscription_keyboard()
-        )
-        return
-
     await call.message.answer("Kredit miqdorini kiriting (so'mda):")
     await state.set_state(CreditForm.amount)
     await call.answer()
 
 
-@dp.message(CreditForm.amount)
+@dp.message(CreditForm.amount, flags={"throttle": "calculator"})
 async def set_credit_amount(message: Message, state: FSMContext):
     try:
-        amount = float(message.text.replace(',', '').replace(' ', ''))
+        amount = parse_amount(message.text)
         await state.update_data(amount=amount)
         await state.set_state(CreditForm.interest_rate)
         await message.answer("Yillik foiz stavkasini kiriting (%):")
@@ -605,10 +694,10 @@ async def set_credit_amount(message: Message, state: FSMContext):
         await message.answer("Iltimos, raqam kiriting. Masalan: 10000000")
 
 
-@dp.message(CreditForm.interest_rate)
+@dp.message(CreditForm.interest_rate, flags={"throttle": "calculator"})
 async def set_interest_rate(message: Message, state: FSMContext):
     try:
-        interest_rate = float(message.text.replace(',', '.'))
+        interest_rate = parse_rate(message.text)
         await state.update_data(interest_rate=interest_rate)
         await state.set_state(CreditForm.term)
         await message.answer("Kredit muddatini kiriting (oylarda):")
@@ -616,11 +705,11 @@ async def set_interest_rate(message: Message, state: FSMContext):
         await message.answer("Iltimos, foiz stavkasini to'g'ri kiriting. Masalan: 18.5")
 
 
-@dp.message(CreditForm.term)
+@dp.message(CreditForm.term, flags={"throttle": "calculator"})
 async def set_credit_term(message: Message, state: FSMContext):
     try:
         term = int(message.text)
-        if term > 360:
+        if term > CREDIT_MAX_TERM:
             await message.answer("Iltimos, 360 oydan (30 yil) kamroq muddat kiriting.")
             return
         await state.update_data(term=term)
@@ -630,7 +719,7 @@ async def set_credit_term(message: Message, state: FSMContext):
         await message.answer("Iltimos, butun son kiriting. Masalan: 12")
 
 
-@dp.message(CreditForm.start_date)
+@dp.message(CreditForm.start_date, flags={"throttle": "calculator"})
 async def finish_credit_form(message: Message, state: FSMContext):
     user_id = str(message.from_user.id)
 
@@ -641,12 +730,7 @@ async def finish_credit_form(message: Message, state: FSMContext):
         await state.update_data(start_date=start_date)
         data = await state.get_data()
 
-        schedule = calculate_credit_schedule(
-            data['amount'],
-            data['interest_rate'],
-            data['term'],
-            data['start_date']
-        )
+        schedule = cached_schedule(data)
 
         if schedule:
             if user_id in user_data:
@@ -654,15 +738,13 @@ async def finish_credit_form(message: Message, state: FSMContext):
             else:
                 user_data[user_id] = {"profile": [], "credit_info": data}
 
-            save_user_data()
+            save_user_data(user_id)
 
-            table = create_schedule_table(schedule)
-            if len(table) > 4000:
-                parts = [table[i:i + 4000] for i in range(0, len(table), 4000)]
-                for part in parts:
-                    await message.answer(f"```\n{part}\n```", parse_mode="Markdown")
-            else:
-                await message.answer(f"```\n{table}\n```", parse_mode="Markdown")
+            await message.answer(
+                create_schedule_table(schedule),
+                parse_mode="Markdown",
+                reply_markup=schedule_keyboard(credit_fingerprint(data), 0, schedule.page_count(SCHEDULE_PAGE_SIZE))
+            )
 
             await message.answer("✅ Kredit grafigi saqlandi! Quyidagi menyudan boshqa amalni tanlang:",
                                reply_markup=main_menu())
@@ -678,13 +760,8 @@ async def finish_credit_form(message: Message, state: FSMContext):
 
 
 # Depozit kalkulyatorini boshlash
-@dp.callback_query(F.data == "deposit_calc")
+@dp.callback_query(F.data == "deposit_calc", flags={"throttle": "calculator"})
 async def start_deposit_calc(call: CallbackQuery, state: FSMContext):
-    subscribed = await check_subscription(call.from_user.id)
-    if not subscribed:
-        await call.answer("🚫 Iltimos, avval kanallarga obuna bo'ling.", show_alert=True)
-        return
-
     await call.message.answer(
         "🏦 **Depozit Kalkulyatori**\n\n"
         "Depozit summasini kiriting (so'mda):",
@@ -697,11 +774,11 @@ async def start_deposit_calc(call: CallbackQuery, state: FSMContext):
 
 
 # Depozit summasini qabul qilish
-@dp.message(DepositForm.amount)
+@dp.message(DepositForm.amount, flags={"throttle": "calculator"})
 async def set_deposit_amount(message: Message, state: FSMContext):
     try:
-        amount = float(message.text.replace(',', '').replace(' ', ''))
-        if amount < 100000:
+        amount = parse_amount(message.text)
+        if amount < DEPOSIT_MIN_AMOUNT:
             await message.answer("❌ Minimal summa 100,000 so'm. Qayta kiriting:")
             return
 
@@ -719,11 +796,11 @@ async def set_deposit_amount(message: Message, state: FSMContext):
 
 
 # Depozit muddatini qabul qilish
-@dp.message(DepositForm.term)
+@dp.message(DepositForm.term, flags={"throttle": "calculator"})
 async def set_deposit_term(message: Message, state: FSMContext):
     try:
         term = int(message.text)
-        if term < 1 or term > 60:
+        if term < DEPOSIT_MIN_TERM or term > DEPOSIT_MAX_TERM:
             await message.answer("❌ Muddat 1-60 oy oralig'ida bo'lishi kerak. Qayta kiriting:")
             return
 
@@ -740,12 +817,12 @@ async def set_deposit_term(message: Message, state: FSMContext):
 
 
 # Bank tanlash
-@dp.callback_query(F.data.startswith("bank_"))
+@dp.callback_query(F.data.startswith("bank_"), flags={"throttle": "calculator"})
 async def select_bank(call: CallbackQuery, state: FSMContext):
     bank_id = call.data.replace("bank_", "")
 
-    if bank_id in BANKS_DATA:
-        bank_info = BANKS_DATA[bank_id]
+    bank_info = bank_catalog.current.get(bank_id)
+    if bank_info is not None:
         await state.update_data(bank_id=bank_id, interest_rate=bank_info['rate'])
         await state.set_state(DepositForm.capitalization)
 
@@ -764,13 +841,14 @@ async def select_bank(call: CallbackQuery, state: FSMContext):
 
 
 # Kapitalizatsiya tanlash
-@dp.callback_query(F.data.startswith("cap_"))
+@dp.callback_query(F.data.startswith("cap_"), flags={"throttle": "calculator"})
 async def select_capitalization(call: CallbackQuery, state: FSMContext):
     capitalization = call.data == "cap_yes"
     await state.update_data(capitalization=capitalization)
 
     data = await state.get_data()
-    bank_info = BANKS_DATA[data['bank_id']]
+    # Tanlangandan keyin katalogdan olib tashlangan bo'lsa ham hisob davom etadi
+    bank_info = bank_catalog.current.get(data['bank_id']) or {"name": data['bank_id']}
 
     result = calculate_deposit(
         data['amount'],
@@ -802,7 +880,7 @@ async def select_capitalization(call: CallbackQuery, state: FSMContext):
 
 
 # Banklarni solishtirish
-@dp.callback_query(F.data.startswith("compare_"))
+@dp.callback_query(F.data.startswith("compare_"), flags={"throttle": "calculator"})
 async def compare_banks_callback(call: CallbackQuery):
     try:
         _, amount, term = call.data.split("_")
@@ -835,21 +913,47 @@ async def back_to_main(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
 
+# Kredit grafigi sahifasini almashtirish (◀ / ▶)
+@dp.callback_query(F.data.startswith("sched:"), flags={"throttle": "calculator"})
+async def schedule_page(call: CallbackQuery):
+    parts = call.data.split(":")
+    if len(parts) != 3 or not parts[2].isdigit():
+        await call.answer()
+        return
+
+    user_id = str(call.from_user.id)
+    credit_info = (user_data.get(user_id) or {}).get("credit_info")
+    if not credit_info or credit_fingerprint(credit_info) != parts[1]:
+        await call.answer("Bu grafik eskirgan. Iltimos, yangi grafik yarating.", show_alert=True)
+        return
+
+    schedule = cached_schedule(credit_info)
+    if not schedule:
+        await call.answer("❌ Kredit grafigini hisoblab bo'lmadi.", show_alert=True)
+        return
+
+    pages = schedule.page_count(SCHEDULE_PAGE_SIZE)
+    page = min(int(parts[2]), pages - 1)
+    try:
+        await call.message.edit_text(
+            create_schedule_table(schedule, page),
+            parse_mode="Markdown",
+            reply_markup=schedule_keyboard(parts[1], page, pages)
+        )
+    except TelegramBadRequest:
+        # Tugma ikki marta bosilsa xabar o'zgarmaydi
+        pass
+    await call.answer()
+
+
 @dp.callback_query()
 async def callbacks(call: CallbackQuery, state: FSMContext):
     data = call.data
     user_id = str(call.from_user.id)
 
-    subscribed = await check_subscription(call.from_user.id)
-    if not subscribed:
-        await call.answer("🚫 Iltimos, avval kanallarga obuna bo'ling.", show_alert=True)
-        await call.message.answer(
-            "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
-            reply_markup=subscription_keyboard()
-        )
-        return
-
     if data == "ai_consultation":
+        # Menyudan qayta kirilsa, yangi suhbat boshlanadi
+        conversations.reset(user_id)
         await call.message.answer("Savolingizni yozing - Moliyachi AI sizga maslahat beradi:")
         await call.answer()
         return
@@ -888,35 +992,154 @@ async def callbacks(call: CallbackQuery, state: FSMContext):
         return
 
 
-@dp.message()
-async def main_handler(message: Message, state: FSMContext):
-    user_id = str(message.from_user.id)
+# Broadcast tugaganda uni boshlagan adminga hisobot
+async def notify_broadcast_done(job, status):
+    if job.admin_id:
+        await bot.send_message(
+            job.admin_id,
+            f"📣 Broadcast {job.id} yakunlandi ({status}).\n"
+            f"✅ Yuborildi: {job.sent}\n❌ Xato: {job.failed}\n🚫 Bloklagan: {job.blocked}"
+        )
 
-    subscribed = await check_subscription(message.from_user.id)
-    if not subscribed:
+
+# Admin: barcha faol userlarga xabar (/broadcast matn)
+@dp.message(Command("broadcast"), F.from_user.id.in_(ADMIN_IDS))
+async def broadcast_command(message: Message):
+    text = (message.text or "").partition(" ")[2].strip()
+    if not text:
+        await message.answer("Foydalanish: /broadcast <xabar matni>")
+        return
+    try:
+        job_id = await broadcaster.start(text, admin_id=message.from_user.id, on_done=notify_broadcast_done)
+    except BroadcastRunning as e:
+        await message.answer(f"⏳ Broadcast {e} hali davom etmoqda. Holati: /broadcast_status")
+        return
+    await message.answer(f"📣 Broadcast {job_id} boshlandi: {user_data.active_count()} ta faol user.")
+
+
+@dp.message(Command("broadcast_status"), F.from_user.id.in_(ADMIN_IDS))
+async def broadcast_status_command(message: Message):
+    status = broadcaster.status()
+    if status is None:
+        await message.answer("Hozircha broadcast bo'lmagan.")
+        return
+    await message.answer(
+        f"📣 Broadcast {status['id']} ({'davom etmoqda' if status['running'] else 'tugagan'})\n"
+        f"✅ Yuborildi: {status['sent']}\n❌ Xato: {status['failed']}\n🚫 Bloklagan: {status['blocked']}\n"
+        f"⚡ Tezlik: {status['rate']} xabar/s"
+    )
+
+
+@dp.message(Command("broadcast_stop"), F.from_user.id.in_(ADMIN_IDS))
+async def broadcast_stop_command(message: Message):
+    if await broadcaster.stop():
+        await message.answer("⏹ Broadcast to'xtatildi.")
+    else:
+        await message.answer("Faol broadcast yo'q.")
+
+
+# Admin: keyingi N ta update'ni profillash (masalan, /profile 200)
+@dp.message(Command("profile"), F.from_user.id.in_(ADMIN_IDS))
+async def profile_command(message: Message):
+    parts = (message.text or "").split()
+    updates = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else PROFILE_UPDATES
+    loop_stats = loop_monitor.stats()
+
+    async def done(path):
+        await message.answer(f"✅ Profil tayyor: {path}")
+
+    if update_profiler.arm(updates, on_done=done):
         await message.answer(
-            "Botdan foydalanish uchun quyidagi kanallarga obuna bo'ling 👇",
-            reply_markup=subscription_keyboard()
+            f"🔬 Keyingi {updates} ta update profillanadi.\n"
+            f"⏱ Event loop: eng katta kechikish {loop_stats['max_lag']}s, "
+            f"bloklanishlar {loop_stats['stalls']} ta"
         )
-        return
+    else:
+        await message.answer(f"⏳ Profillash davom etmoqda: yana {update_profiler.remaining} ta update qoldi.")
+
+
+@dp.message(flags={"throttle": "ai"})
+async def main_handler(message: Message, state: FSMContext):
+    user_id = str(message.from_user.id)
 
     # Profil to'liqligini tekshirish
     if not is_profile_complete(user_id):
         await message.answer("❌ Iltimos, avval profilingizni to'ldiring. /start buyrug'ini bosing.")
         return
 
-    await message.answer("⏳ Moliyachi AI javob tayyorlayapti...")
-    result = await ask_openai(user_id, message.text)
-    await message.answer(result)
+    # "!" bilan boshlangan savol keshsiz, yangidan javob oladi
+    question = message.text or ""
+    use_cache = not question.startswith("!")
+    if not use_cache:
+        question = question[1:].strip()
 
+    placeholder = await message.answer("⏳ Moliyachi AI javob tayyorlayapti...")
 
-async def main():
+    # Navbatda kutilsa, userga o'rnini ko'rsatamiz
+    async def show_position(position):
+        await placeholder.edit_text(f"⏳ Moliyachi AI javob tayyorlayapti...\n📋 Navbatdagi o'rningiz: {position}")
+
+    if not AI_STREAM:
+        result = await ask_openai(user_id, question, use_cache=use_cache, on_queued=show_position)
+        await message.answer(result)
+        return
+
+    # Javob kelishi bilan placeholder xabarining o'zida ko'rsatiladi
+    reply = StreamingReply(placeholder)
+    try:
+        result = await ask_openai(user_id, question, use_cache=use_cache, on_queued=show_position,
+                                  on_delta=reply.feed)
+    except BaseException:
+        reply.cancel()
+        raise
+    await reply.finish(result)
+
+
+# Bot ishga tushganda (polling, webhook yoki shard worker)
+@dp.startup()
+async def on_startup():
+    global _metrics_runner
     # Ma'lumotlarni yuklash
     load_user_data()
+    user_data.start()
+    answer_cache.start()
+    conversations.start()
+    bank_catalog.start()
+    loop_monitor.start()
+    _metrics_runner = await start_server()
+    # Uzilib qolgan broadcast davom ettiriladi (bazadagi band qilish uni faqat bitta jarayonga beradi)
+    await broadcaster.resume(on_done=notify_broadcast_done)
+    # SIGUSR1 - keyingi PROFILE_UPDATES ta update'ni profillash (faqat Unix)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, update_profiler.arm)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        pass
     print("Bot ishga tushdi...")
     print(f"Yuklangan userlar soni: {len(user_data)}")
 
-    await dp.start_polling(bot)
+
+# Bot to'xtaganda barcha navbatdagi yozuvlarni saqlash
+@dp.shutdown()
+async def on_shutdown():
+    if _metrics_runner is not None:
+        await _metrics_runner.cleanup()
+    await loop_monitor.close()
+    await bank_catalog.close()
+    await broadcaster.close()
+    await user_data.close()
+    await answer_cache.close()
+    await conversations.close()
+    await dp.storage.close()
+    await close_session()
+
+
+async def main():
+    if BOT_MODE == "webhook":
+        await run_webhook(dp, bot)
+    elif BOT_MODE == "sharded":
+        await run_supervisor(dp, bot)
+    else:
+        await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+from types import MappingProxyType
+
+# Banklar katalogi fayli (standart - shu modul yonidagi banks.json, bot qaysi papkadan ishga
+# tushirilsa ham) va o'zgarishlarni tekshirish oralig'i (soniya)
+BANKS_FILE = os.getenv("BANKS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "banks.json"))
+BANKS_RELOAD_INTERVAL = float(os.getenv("BANKS_RELOAD_INTERVAL", "30"))
+
+# Fayl topilmasa ishlatiladigan standart ro'yxat
+DEFAULT_BANKS = {
+    "NBU": {"name": "NBU", "rate": 18.5, "min_amount": 1000000, "color": "#4CAF50"},
+    "kapitalbank": {"name": "Kapitalbank", "rate": 17.0, "min_amount": 500000, "color": "#2196F3"},
+    "ipoteka": {"name": "Ipoteka bank", "rate": 16.5, "min_amount": 1000000, "color": "#FF9800"},
+    "xalq": {"name": "Xalq banki", "rate": 15.0, "min_amount": 500000, "color": "#9C27B0"},
+    "agro": {"name": "Agrobank", "rate": 14.5, "min_amount": 1000000, "color": "#795548"},
+}
+
+
+# Katalog ma'lumotlarini tekshirish
+def validate_banks(banks):
+    if not isinstance(banks, dict) or not banks:
+        raise ValueError("Banklar ro'yxati bo'sh yoki noto'g'ri formatda")
+    result = {}
+    for bank_id, info in banks.items():
+        if not isinstance(info, dict):
+            raise ValueError(f"{bank_id}: bank ma'lumoti lug'at bo'lishi kerak")
+        name, rate, min_amount = info.get("name"), info.get("rate"), info.get("min_amount")
+        if not isinstance(name, str) or not name:
+            raise ValueError(f"{bank_id}: nomi ko'rsatilmagan")
+        if not isinstance(rate, (int, float)) or rate <= 0:
+            raise ValueError(f"{bank_id}: foiz stavkasi musbat son bo'lishi kerak")
+        if not isinstance(min_amount, (int, float)) or min_amount < 0:
+            raise ValueError(f"{bank_id}: minimal summa manfiy bo'lmasligi kerak")
+        # callback_data 64 baytdan oshmasligi kerak ("bank_" + id)
+        if len(f"bank_{bank_id}".encode()) > 64:
+            raise ValueError(f"{bank_id}: ID juda uzun")
+        result[str(bank_id)] = MappingProxyType(dict(info))
+    return result
+
+
+# Katalogning o'zgarmas nusxasi: banklar, versiya va min_amount bo'yicha tartiblangan indeks
+class Catalog:
+    __slots__ = ("banks", "version", "_min_amounts", "_eligible")
+
+    def __init__(self, banks):
+        banks = validate_banks(banks)
+        self.banks = MappingProxyType(banks)
+        canonical = json.dumps({key: dict(value) for key, value in banks.items()}, sort_keys=True, ensure_ascii=False)
+        self.version = hashlib.blake2b(canonical.encode(), digest_size=8).hexdigest()
+
+        # min_amount bo'yicha o'sish tartibida; har bir prefiks uchun mos banklar
+        # katalogdagi ko'rsatish tartibida oldindan tayyorlanadi
+        order = {bank_id: position for position, bank_id in enumerate(banks)}
+        by_min = sorted(banks, key=lambda bank_id: (banks[bank_id]["min_amount"], order[bank_id]))
+        self._min_amounts = [banks[bank_id]["min_amount"] for bank_id in by_min]
+        self._eligible = [
+            tuple(sorted(by_min[:count], key=order.__getitem__))
+            for count in range(len(by_min) + 1)
+        ]
+
+    def get(self, bank_id):
+        return self.banks.get(bank_id)
+
+    def items(self):
+        return self.banks.items()
+
+    def __contains__(self, bank_id):
+        return bank_id in self.banks
+
+    def __len__(self):
+        return len(self.banks)
+
+    # Summa minimal talabga mos keladigan banklar (bisect bilan)
+    def eligible(self, amount):
+        return self._eligible[bisect.bisect_right(self._min_amounts, amount)]
+
+
+# Fayldan yuklanadigan va o'zgarganda avtomatik yangilanadigan katalog
+class BankCatalog:
+    def __init__(self, path=BANKS_FILE, default=DEFAULT_BANKS):
+        self.path = path
+        self.current = Catalog(default)
+        self.reloads = 0
+        self._stamp = None
+        self._task = None
+
+    @property
+    def version(self):
+        return self.current.version
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return Catalog(json.load(f))
+
+    # Faylni o'qib, to'liq tekshirilgan yangi nusxani bitta o'zlashtirish bilan almashtirish.
+    # Xato bo'lsa, eski katalog qoladi
+    def load(self):
+        stamp = self._file_stamp()
+        if stamp is None:
+            if self._stamp is None:
+                print(f"⚠️ Banklar katalogi {os.path.abspath(self.path)} topilmadi! Standart banklar ro'yxati "
+                      f"ishlatiladi va fayldagi o'zgarishlar foydalanuvchilarga yetib bormaydi (BANKS_FILE)")
+            self._stamp = None
+            return False
+        self._stamp = stamp
+        try:
+            catalog = self._read()
+        except Exception as e:
+            print(f"Banklar katalogini yuklashda xatolik: {e}")
+            return False
+        return self._swap(catalog)
+
+    async def reload(self):
+        stamp = self._file_stamp()
+        if stamp is None and self._stamp is not None:
+            print(f"⚠️ Banklar katalogi {os.path.abspath(self.path)} o'chirildi, oxirgi yuklangan nusxa ishlatiladi")
+            self._stamp = None
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            catalog = await asyncio.to_thread(self._read)
+        except Exception as e:
+            print(f"Banklar katalogini yuklashda xatolik: {e}")
+            return False
+        return self._swap(catalog)
+
+    def _swap(self, catalog):
+        if catalog.version == self.current.version:
+            return False
+        self.current = catalog
+        self.reloads += 1
+        print(f"Banklar katalogi yangilandi: {len(catalog)} ta bank (versiya {catalog.version})")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(BANKS_RELOAD_INTERVAL)
+            await self.reload()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {"banks": len(self.current), "reloads": self.reloads}
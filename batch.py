@@ -0,0 +1,285 @@
+# Kredit va depozit hisoblarini fayldan ommaviy bajarish (back-office uchun).
+# Botdagi kabi qiymatlar o'qiladi, tekshiriladi va finance.py funksiyalari bilan hisoblanadi
+#
+# Ishga tushirish:
+#   python batch.py credit loans.csv -o results.csv
+#   python batch.py credit loans.csv --schedule -o schedules.jsonl
+#   python batch.py deposit deposits.jsonl -o - --workers 4
+#
+# Kredit ustunlari: id, amount, interest_rate, term, start_date (kun.oy.yil)
+# Depozit ustunlari: id, amount, term, bank_id yoki interest_rate,
+#                    capitalization (ha/yo'q, standart - ha), tax_rate (standart - 12)
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+
+from finance import (
+    CREDIT_MAX_TERM, DEPOSIT_MAX_TERM, DEPOSIT_MIN_AMOUNT, DEPOSIT_MIN_TERM,
+    calculate_credit_schedules, calculate_deposit, parse_amount, parse_rate,
+)
+
+# Bitta jarayonga bir martada beriladigan qatorlar soni
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "500"))
+# Jarayon haqida stderr'ga yozish oralig'i (soniya)
+BATCH_PROGRESS_INTERVAL = float(os.getenv("BATCH_PROGRESS_INTERVAL", "5"))
+
+CREDIT_FIELDS = ["id", "amount", "interest_rate", "term", "start_date",
+                 "monthly_payment", "total_interest", "total_payment", "principal", "error"]
+SCHEDULE_FIELDS = ["id", "number", "date", "interest", "total_payment", "remaining_balance", "error"]
+DEPOSIT_FIELDS = ["id", "bank_id", "initial_amount", "annual_rate", "term_months", "capitalization",
+                  "total_interest", "total_amount", "monthly_income", "tax_amount", "net_interest", "net_amount",
+                  "tax_rate", "error"]
+
+YES = {"1", "true", "yes", "y", "ha", "cap_yes"}
+NO = {"0", "false", "no", "n", "yo'q", "yoq", "cap_no"}
+
+
+def _text(row, name):
+    value = row.get(name)
+    return "" if value is None else str(value).strip()
+
+
+# Ustun qiymatini bot handler'idagi funksiya bilan o'qish
+def _value(row, name, parse=str):
+    text = _text(row, name)
+    if not text:
+        raise ValueError(f"{name} ko'rsatilmagan")
+    try:
+        return parse(text)
+    except ValueError:
+        raise ValueError(f"{name}: noto'g'ri qiymat {text!r}") from None
+
+
+def _capitalization(text):
+    text = text.lower()
+    if text in YES:
+        return True
+    if text in NO:
+        return False
+    raise ValueError(text)
+
+
+def _parse_credit(row):
+    amount = _value(row, "amount", parse_amount)
+    interest_rate = _value(row, "interest_rate", parse_rate)
+    term = _value(row, "term", int)
+    if term > CREDIT_MAX_TERM:
+        raise ValueError(f"term: muddat {CREDIT_MAX_TERM} oydan oshmasligi kerak")
+    start_date = _value(row, "start_date")
+    try:
+        datetime.strptime(start_date, "%d.%m.%Y")
+    except ValueError:
+        raise ValueError(f"start_date: sana kun.oy.yil formatida bo'lishi kerak ({start_date!r})") from None
+    # finance.calculate_credit_schedules ham shu holatda hisoblamaydi
+    if interest_rate == 0 or term <= 0:
+        raise ValueError("Foiz stavkasi va muddat noldan katta bo'lishi kerak")
+    return amount, interest_rate, term, start_date
+
+
+def _parse_deposit(row, rates):
+    amount = _value(row, "amount", parse_amount)
+    if amount < DEPOSIT_MIN_AMOUNT:
+        raise ValueError(f"amount: minimal summa {DEPOSIT_MIN_AMOUNT:,} so'm")
+    term = _value(row, "term", int)
+    if not DEPOSIT_MIN_TERM <= term <= DEPOSIT_MAX_TERM:
+        raise ValueError(f"term: muddat {DEPOSIT_MIN_TERM}-{DEPOSIT_MAX_TERM} oy oralig'ida bo'lishi kerak")
+
+    bank_id = _text(row, "bank_id")
+    if bank_id:
+        if bank_id not in rates:
+            raise ValueError(f"bank_id: {bank_id!r} katalogda yo'q")
+        interest_rate = rates[bank_id]
+    else:
+        interest_rate = _value(row, "interest_rate", parse_rate)
+
+    capitalization = _value(row, "capitalization", _capitalization) if _text(row, "capitalization") else True
+    # Bot har doim 12% soliq bilan hisoblaydi
+    tax_rate = _value(row, "tax_rate", parse_rate) if _text(row, "tax_rate") else 12
+    return bank_id, (amount, interest_rate, term, capitalization, tax_rate)
+
+
+# Qatorlar bo'lagini hisoblash (ishchi jarayonda). Natija: (yoziladigan yozuvlar, xatolar soni)
+def credit_chunk(rows, schedule=False):
+    parsed = []
+    for row in rows:
+        try:
+            parsed.append(row["_error"] if "_error" in row else _parse_credit(row))
+        except ValueError as e:
+            parsed.append(str(e))
+    results = iter(calculate_credit_schedules(loan for loan in parsed if not isinstance(loan, str)))
+
+    records, errors = [], 0
+    for row, loan in zip(rows, parsed):
+        ident = _text(row, "id")
+        result = None if isinstance(loan, str) else next(results)
+        if not result:
+            errors += 1
+            records.append({"id": ident, "error": loan if isinstance(loan, str) else "Hisoblab bo'lmadi"})
+        elif schedule:
+            records.extend({"id": ident, **payment, "error": ""} for payment in result.rows())
+        else:
+            amount, interest_rate, term, start_date = loan
+            records.append({
+                "id": ident, "amount": amount, "interest_rate": interest_rate, "term": term,
+                "start_date": start_date, **result.summary(), "error": "",
+            })
+    return records, errors
+
+
+def deposit_chunk(rows, rates):
+    records, errors = [], 0
+    for row in rows:
+        ident = _text(row, "id")
+        try:
+            if "_error" in row:
+                raise ValueError(row["_error"])
+            bank_id, params = _parse_deposit(row, rates)
+        except ValueError as e:
+            errors += 1
+            records.append({"id": ident, "error": str(e)})
+            continue
+        result = calculate_deposit(*params)
+        if result is None:
+            errors += 1
+            records.append({"id": ident, "error": "Hisoblab bo'lmadi"})
+        else:
+            records.append({"id": ident, "bank_id": bank_id, **result, "error": ""})
+    return records, errors
+
+
+# Kiruvchi qatorlar oqimi (fayl to'liq o'qilmaydi)
+def read_rows(stream, fmt):
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = {"_error": f"{number}-qator: JSON xato ({e})"}
+        if not isinstance(row, dict):
+            row = {"_error": f"{number}-qator: obyekt kutilgan"}
+        yield row
+
+
+class RecordWriter:
+    def __init__(self, stream, fmt, fields):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=fields, restval="", extrasaction="ignore")
+            self._csv.writeheader()
+
+    def write(self, records):
+        if self.fmt == "csv":
+            self._csv.writerows(records)
+        else:
+            self.stream.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+
+# Bo'laklarni jarayonlarga tarqatish. Natijalar kirish tartibida qaytadi, navbatda
+# ko'pi bilan workers*2 bo'lak turadi - katta fayl ham xotiraga to'liq yuklanmaydi
+def process_chunks(chunks, work, workers):
+    if workers <= 1:
+        for chunk in chunks:
+            yield len(chunk), work(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(work, chunk)))
+            if len(pending) >= workers * 2:
+                size, future = pending.popleft()
+                yield size, future.result()
+        while pending:
+            size, future = pending.popleft()
+            yield size, future.result()
+
+
+def _format(path, explicit, default="csv"):
+    if explicit:
+        return explicit
+    if path == "-":
+        return default
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+# Depozit uchun bank stavkalari (bot ishlatadigan katalogdan)
+def _bank_rates(path):
+    from bank_catalog import BANKS_FILE, BankCatalog
+
+    catalog = BankCatalog(path or BANKS_FILE)
+    # Katalog xabarlari natija oqimiga (stdout) aralashmasligi uchun
+    with contextlib.redirect_stdout(sys.stderr):
+        catalog.load()
+    return {bank_id: info["rate"] for bank_id, info in catalog.current.items()}
+
+
+def run(args):
+    input_format = _format(args.input, args.input_format)
+    output_format = _format(args.output, args.format, default=input_format)
+
+    if args.mode == "credit":
+        work = partial(credit_chunk, schedule=args.schedule)
+        fields = SCHEDULE_FIELDS if args.schedule else CREDIT_FIELDS
+    else:
+        work = partial(deposit_chunk, rates=_bank_rates(args.banks))
+        fields = DEPOSIT_FIELDS
+
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if args.input == "-" else stack.enter_context(
+            open(args.input, "r", encoding="utf-8-sig", newline=""))
+        target = sys.stdout if args.output == "-" else stack.enter_context(
+            open(args.output, "w", encoding="utf-8", newline=""))
+        writer = RecordWriter(target, output_format, fields)
+
+        rows = read_rows(source, input_format)
+        chunks = iter(lambda: list(itertools.islice(rows, args.chunk_size)), [])
+
+        total = errors = 0
+        started = last_report = time.perf_counter()
+        for size, (records, failed) in process_chunks(chunks, work, args.workers):
+            writer.write(records)
+            total += size
+            errors += failed
+            now = time.perf_counter()
+            if now - last_report >= BATCH_PROGRESS_INTERVAL:
+                last_report = now
+                print(f"⏳ {total:,} qator, {total / (now - started):,.0f} qator/s", file=sys.stderr)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"✅ {total:,} qator ({errors:,} xato) {elapsed:.2f} s da hisoblandi: "
+          f"{total / elapsed:,.0f} qator/s", file=sys.stderr)
+    return total, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kredit va depozit hisoblarini fayldan ommaviy bajarish")
+    parser.add_argument("mode", choices=["credit", "deposit"])
+    parser.add_argument("input", help="CSV yoki JSONL fayl ('-' - stdin)")
+    parser.add_argument("-o", "--output", default="-", help="natija fayli ('-' - stdout)")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"], help="standart - fayl kengaytmasidan")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="natija formati (standart - kengaytmadan)")
+    parser.add_argument("--schedule", action="store_true", help="kredit uchun har oylik to'lov qatorlari")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="jarayonlar soni (1 - bitta jarayon)")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE)
+    parser.add_argument("--banks", help="banklar katalogi (standart - BANKS_FILE)")
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size musbat bo'lishi kerak")
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
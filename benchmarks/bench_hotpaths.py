@@ -0,0 +1,278 @@
+# Moliyaviy hisoblar va saqlash uchun mikrobenchmarklar
+#
+# Ishga tushirish:
+#   python benchmarks/bench_hotpaths.py --output bench_results.json
+#   python benchmarks/bench_hotpaths.py --users 1000 10000 100000 --compare bench_results.json
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# api2 import qilinishi uchun soxta tokenlar (tarmoqqa so'rov yuborilmaydi)
+os.environ.setdefault("API_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("GIGA_TOKEN", "benchmark")
+_TMP_DIR = tempfile.mkdtemp(prefix="finai-bench-")
+os.environ["USER_DB_FILE"] = os.path.join(_TMP_DIR, "user_data.db")
+os.environ["FSM_DB_FILE"] = os.path.join(_TMP_DIR, "fsm_state.db")
+
+import numpy as np  # noqa: E402
+
+import api2  # noqa: E402
+import finance  # noqa: E402
+from user_store import UserStore  # noqa: E402
+
+JOBS = ["dasturchi", "o'qituvchi", "shifokor", "talaba", "tadbirkor", "haydovchi", "muhandis"]
+INTERESTS = ["investitsiya", "depozit", "kredit", "ko'chmas mulk", "biznes", "jamg'arma"]
+
+
+# Bitta holatni o'lchash: vaqt (bir necha marta) va eng yuqori xotira (tracemalloc bilan alohida)
+def measure(name, params, func, setup=None, repeat=5):
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        gc.collect()
+        started = time.perf_counter()
+        func(arg) if setup else func()
+        times.append(time.perf_counter() - started)
+
+    arg = setup() if setup else None
+    gc.collect()
+    tracemalloc.start()
+    func(arg) if setup else func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "name": name,
+        "params": params,
+        "runs": repeat,
+        "mean_s": statistics.mean(times),
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "peak_kb": round(peak / 1024, 1),
+    }
+    print(f"{name:<28} {json.dumps(params):<32} median {result['median_s'] * 1000:10.3f} ms  peak {result['peak_kb']:10.1f} KB")
+    return result
+
+
+def random_loans(rng, count, term):
+    return [
+        (rng.randrange(10, 5000) * 100000, round(rng.uniform(10, 30), 1), term, "01.10.2024")
+        for _ in range(count)
+    ]
+
+
+def random_user(rng):
+    return {
+        "profile": [
+            str(rng.randint(18, 70)),
+            rng.choice(JOBS),
+            f"{rng.randint(1, 50)} mln",
+            rng.choice(INTERESTS),
+            rng.choice(["ha", "yo'q"]),
+        ],
+        "credit_info": {
+            "amount": float(rng.randrange(10, 5000) * 100000),
+            "interest_rate": round(rng.uniform(10, 30), 1),
+            "term": rng.choice([12, 24, 36, 60, 120, 360]),
+            "start_date": "01.10.2024",
+        } if rng.random() < 0.3 else None,
+    }
+
+
+def bench_finance(rng, terms, repeat):
+    results = []
+    for term in terms:
+        amount, rate, _, start = random_loans(rng, 1, term)[0]
+        results.append(measure(
+            "calculate_credit_schedule", {"term": term},
+            lambda: api2.calculate_credit_schedule(amount, rate, term, start), repeat=repeat
+        ))
+        schedule = api2.calculate_credit_schedule(amount, rate, term, start)
+        results.append(measure(
+            "create_schedule_table", {"term": term},
+            lambda: api2.create_schedule_table(schedule), repeat=repeat
+        ))
+        results.append(measure(
+            "materialize_rows", {"term": term},
+            lambda: list(schedule), repeat=repeat
+        ))
+
+    for count in (100, 1000):
+        loans = random_loans(rng, count, 360)
+        results.append(measure(
+            "calculate_credit_schedules", {"loans": count, "term": 360},
+            lambda: finance.calculate_credit_schedules(loans), repeat=repeat
+        ))
+
+    deposits = [
+        (rng.randrange(1, 1000) * 100000, rng.choice([14.5, 15.0, 16.5, 17.0, 18.5]), rng.randint(1, 60), rng.random() < 0.5)
+        for _ in range(1000)
+    ]
+
+    def cold_deposits():
+        finance._deposit_cache.clear()
+        for amount, rate, term, cap in deposits:
+            api2.calculate_deposit(amount, rate, term, cap)
+
+    def warm_deposits():
+        for amount, rate, term, cap in deposits:
+            api2.calculate_deposit(amount, rate, term, cap)
+
+    results.append(measure("calculate_deposit", {"calls": 1000, "cache": "cold"}, cold_deposits, repeat=repeat))
+    warm_deposits()
+    results.append(measure("calculate_deposit", {"calls": 1000, "cache": "warm"}, warm_deposits, repeat=repeat))
+
+    def cold_compare():
+        api2._comparison_cache.clear()
+        finance._deposit_cache.clear()
+        for amount, _, term, _ in deposits[:200]:
+            api2.compare_banks(amount, term)
+
+    def warm_compare():
+        for amount, _, term, _ in deposits[:200]:
+            api2.compare_banks(amount, term)
+
+    results.append(measure("compare_banks", {"calls": 200, "cache": "cold"}, cold_compare, repeat=repeat))
+    warm_compare()
+    results.append(measure("compare_banks", {"calls": 200, "cache": "warm"}, warm_compare, repeat=repeat))
+
+    formatted = [api2.calculate_deposit(*deposit) for deposit in deposits]
+    results.append(measure(
+        "format_deposit_result", {"calls": 1000},
+        lambda: [api2.format_deposit_result(result, "NBU") for result in formatted], repeat=repeat
+    ))
+    return results
+
+
+def bench_store(rng, sizes, repeat):
+    results = []
+    for size in sizes:
+        users = {str(1000000 + i): random_user(rng) for i in range(size)}
+        path = os.path.join(_TMP_DIR, f"users_{size}.db")
+
+        # To'liq yozish: barcha userlar belgilanib, bitta tranzaksiyada yoziladi
+        def fresh_store():
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            store = UserStore(path)
+            store.open()
+            for user_id, record in users.items():
+                store[user_id] = record
+            return store
+
+        def save_all(store):
+            api2.user_data = store
+            api2.save_user_data()
+            store.flush_sync()
+
+        results.append(measure("save_user_data", {"users": size, "dirty": size}, save_all, setup=fresh_store,
+                               repeat=max(1, repeat // 2)))
+
+        # Bitta user o'zgarganda yozish narxi
+        store = fresh_store()
+        store.flush_sync()
+        sample = rng.sample(list(users), min(1000, size))
+
+        def save_one():
+            user_id = rng.choice(sample)
+            store[user_id]["credit_info"] = {"amount": 1.0, "interest_rate": 18.0, "term": 12, "start_date": "01.10.2024"}
+            api2.user_data = store
+            api2.save_user_data(user_id)
+            store.flush_sync()
+
+        results.append(measure("save_user_data", {"users": size, "dirty": 1}, save_one, repeat=repeat))
+
+        # Ochish va 1000 ta tasodifiy userni o'qish
+        def load_sample():
+            loaded = UserStore(path)
+            api2.user_data = loaded
+            api2.USER_DATA_FILE = os.path.join(_TMP_DIR, "missing.json")
+            api2.load_user_data()
+            for user_id in sample:
+                api2.is_profile_complete(user_id)
+            loaded._conn.close()
+
+        results.append(measure("load_user_data", {"users": size, "reads": len(sample)}, load_sample, repeat=repeat))
+        store._conn.close()
+        if store._writer is not None:
+            store._writer.close()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+# Avvalgi natijalar bilan solishtirish
+def compare(previous_path, results):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {
+            (item["name"], json.dumps(item["params"], sort_keys=True)): item
+            for item in json.load(f)["results"]
+        }
+    print(f"\n{'benchmark':<60} {'oldin':>10} {'hozir':>10} {'farq':>8}")
+    for item in results:
+        key = (item["name"], json.dumps(item["params"], sort_keys=True))
+        if key not in previous:
+            continue
+        before, after = previous[key]["median_s"], item["median_s"]
+        change = (after - before) / before * 100 if before else 0.0
+        label = f"{item['name']} {key[1]}"
+        print(f"{label:<60} {before * 1000:9.3f}ms {after * 1000:9.3f}ms {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="finai hot path benchmarklari")
+    parser.add_argument("--terms", type=int, nargs="+", default=[12, 120, 360])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="avvalgi natijalar fayli")
+    parser.add_argument("--skip-store", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    np.random.seed(args.seed)
+
+    results = bench_finance(rng, args.terms, args.repeat)
+    if not args.skip_store:
+        results += bench_store(rng, args.users, args.repeat)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.compare:
+        compare(args.compare, results)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nNatijalar {args.output} fayliga yozildi")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# User yozuvlarining xotiradagi hajmi: eski lug'at ko'rinishi va ixcham UserRecord
+#
+# Ishga tushirish:
+#   python benchmarks/bench_user_memory.py --users 10000 100000 --output memory_results.json
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from user_store import UserRecord  # noqa: E402
+
+JOBS = ["dasturchi", "o'qituvchi", "shifokor", "talaba", "tadbirkor", "haydovchi", "muhandis"]
+INTERESTS = ["investitsiya", "depozit", "kredit", "ko'chmas mulk", "biznes", "jamg'arma"]
+
+
+# Bazadagi ko'rinishdagi (JSON) userlar; satrlar har safar yangi obyekt bo'lib o'qiladi
+def random_rows(rng, count):
+    rows = []
+    for _ in range(count):
+        record = {
+            "profile": [
+                str(rng.randint(18, 70)),
+                rng.choice(JOBS),
+                f"{rng.randint(1, 50)} mln",
+                rng.choice(INTERESTS),
+                rng.choice(["ha", "yo'q"]),
+            ],
+            "credit_info": {
+                "amount": float(rng.randrange(10, 5000) * 100000),
+                "interest_rate": round(rng.uniform(10, 30), 1),
+                "term": rng.choice([12, 24, 36, 60, 120, 360]),
+                "start_date": "01.10.2024",
+            } if rng.random() < 0.3 else None,
+        }
+        rows.append(json.dumps(record, ensure_ascii=False))
+    return rows
+
+
+def legacy_layout(rows):
+    return {str(1000000 + i): json.loads(row) for i, row in enumerate(rows)}
+
+
+def compact_layout(rows):
+    return {str(1000000 + i): UserRecord.from_dict(json.loads(row)) for i, row in enumerate(rows)}
+
+
+# Qurilgan obyektlarning xotirada egallagan joyi (tracemalloc bo'yicha)
+def measure(name, rows, build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    users = build(rows)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del users
+    result = {
+        "name": name,
+        "users": len(rows),
+        "bytes": current,
+        "bytes_per_user": round(current / len(rows), 1),
+        "peak_bytes": peak,
+        "build_s": round(elapsed, 4),
+    }
+    print(f"{name:<10} {len(rows):>8} ta user  {current / 1024 / 1024:9.2f} MB  "
+          f"{result['bytes_per_user']:8.1f} bayt/user  qurish {elapsed * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="User yozuvlari xotira benchmarki")
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="memory_results.json")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    for count in args.users:
+        rows = random_rows(rng, count)
+        legacy = measure("legacy", rows, legacy_layout)
+        compact = measure("compact", rows, compact_layout)
+        saving = 1 - compact["bytes"] / legacy["bytes"]
+        print(f"{'':<10} tejash: {saving * 100:.1f}%\n")
+        results += [legacy, compact]
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Natijalar {args.output} fayliga yozildi")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import asyncio
+import contextvars
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from ratelimit import TokenBucket
+
+# Broadcast tezligi (umumiy 30/s chegaradan pastroq, oddiy javoblar uchun joy qoladi),
+# bir vaqtda yuborilayotgan xabarlar va checkpoint oralig'i (shuncha userdan keyin saqlanadi)
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "25"))
+BROADCAST_BATCH = int(os.getenv("BROADCAST_BATCH", "200"))
+# Broadcast'ni yuborayotgan jarayon uni shuncha soniyaga band qiladi va muntazam yangilab turadi.
+# Jarayon o'lsa, muddat tugagach boshqasi (yoki qayta ishga tushgan o'zi) davom ettiradi
+BROADCAST_LEASE = float(os.getenv("BROADCAST_LEASE", "60"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    admin_id INTEGER,
+    status TEXT NOT NULL,
+    last_user_id TEXT NOT NULL DEFAULT '',
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+)
+"""
+
+# Bu xatolar user botni bloklagan yoki chat yo'qligini bildiradi
+BLOCKED_ERRORS = ("blocked", "deactivated", "chat not found", "user not found")
+
+
+class BroadcastRunning(Exception):
+    pass
+
+
+class _Job:
+    __slots__ = ("id", "text", "admin_id", "last_user_id", "sent", "failed", "blocked", "started_at")
+
+    def __init__(self, id, text, admin_id, last_user_id="", sent=0, failed=0, blocked=0):
+        self.id = id
+        self.text = text
+        self.admin_id = admin_id
+        self.last_user_id = last_user_id
+        self.sent = sent
+        self.failed = failed
+        self.blocked = blocked
+        self.started_at = time.monotonic()
+
+
+# Barcha faol userlarga xabar yuborish: userlar bazadan bo'lib-bo'lib o'qiladi,
+# har bir bo'limdan keyin holat saqlanadi (to'xtab qolsa, shu joydan davom etadi),
+# botni bloklaganlar nofaol deb belgilanadi
+class Broadcaster:
+    def __init__(self, bot, store, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY, batch=BROADCAST_BATCH,
+                 lease=BROADCAST_LEASE):
+        self.bot = bot
+        self.store = store
+        self.rate = rate
+        self.concurrency = concurrency
+        self.batch = batch
+        self.lease = lease
+        # Shu jarayonni bazada aniqlash uchun (shard'lar va bir nechta nusxa orasida)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.job = None
+        self._task = None
+        self._waiter = None
+        self._conn = None
+        self._stop_requested = False
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.store.path, timeout=30, check_same_thread=False)
+            with self._conn:
+                self._conn.execute(SCHEMA)
+                columns = {row[1] for row in self._conn.execute("PRAGMA table_info(broadcasts)")}
+                if "owner" not in columns:
+                    self._conn.execute("ALTER TABLE broadcasts ADD COLUMN owner TEXT")
+                    self._conn.execute("ALTER TABLE broadcasts ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+        return self._conn
+
+    # Holatni saqlash (faqat broadcast hali shu jarayonga tegishli bo'lsa). release=True - band qilish bekor
+    # qilinadi, aks holda muddati uzaytiriladi. Boshqa jarayon egallab olgan bo'lsa False qaytadi
+    def _save(self, job, status, release=False):
+        now = time.time()
+        owner, lease_until = (None, 0) if release else (self.owner, now + self.lease)
+        with self._db() as conn:
+            cursor = conn.execute(
+                "UPDATE broadcasts SET status = ?, last_user_id = ?, sent = ?, failed = ?, blocked = ?, updated_at = ?, "
+                "owner = ?, lease_until = ? WHERE id = ? AND owner = ?",
+                (status, job.last_user_id, job.sent, job.failed, job.blocked, now,
+                 owner, lease_until, job.id, self.owner)
+            )
+        return cursor.rowcount == 1
+
+    def _create(self, job):
+        now = time.time()
+        with self._db() as conn:
+            conn.execute(
+                "INSERT INTO broadcasts (id, text, admin_id, status, created_at, updated_at, owner, lease_until) "
+                "VALUES (?, ?, ?, 'running', ?, ?, ?, ?)",
+                (job.id, job.text, job.admin_id, now, now, self.owner, now + self.lease)
+            )
+
+    def _unfinished(self):
+        row = self._db().execute(
+            "SELECT id, text, admin_id, last_user_id, sent, failed, blocked, lease_until FROM broadcasts "
+            "WHERE status = 'running' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        return (_Job(*row[:-1]), row[-1]) if row else (None, 0)
+
+    # Broadcast'ni shu jarayonga band qilish (bo'sh yoki muddati o'tgan bo'lsa)
+    def _claim(self, job_id):
+        now = time.time()
+        with self._db() as conn:
+            cursor = conn.execute(
+                "UPDATE broadcasts SET owner = ?, lease_until = ? "
+                "WHERE id = ? AND status = 'running' AND (owner IS NULL OR owner = ? OR lease_until < ?)",
+                (self.owner, now + self.lease, job_id, self.owner, now)
+            )
+        return cursor.rowcount == 1
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    # Yangi broadcast boshlash
+    async def start(self, text, admin_id=None, on_done=None):
+        if self.running:
+            raise BroadcastRunning(self.job.id)
+        # Hali yozilmagan yangi userlar ham ro'yxatga tushishi uchun
+        await self.store.flush()
+        job = _Job(uuid.uuid4().hex[:8], text, admin_id)
+        await asyncio.to_thread(self._create, job)
+        self._launch(job, on_done)
+        return job.id
+
+    # Bot qayta ishga tushganda tugallanmagan broadcastni davom ettirish. Uni boshqa jarayon
+    # yuborayotgan bo'lsa, band qilish muddati tugagach yana tekshiriladi
+    async def resume(self, on_done=None):
+        if self.running:
+            return None
+        job, lease_until = await asyncio.to_thread(self._unfinished)
+        if job is None:
+            return None
+        if not await asyncio.to_thread(self._claim, job.id):
+            if self._waiter is None or self._waiter.done():
+                self._waiter = contextvars.Context().run(
+                    asyncio.create_task, self._resume_later(lease_until - time.time(), on_done)
+                )
+            return None
+        print(f"Broadcast {job.id} {job.last_user_id or 'boshi'}dan davom ettirilmoqda")
+        self._launch(job, on_done)
+        return job.id
+
+    async def _resume_later(self, delay, on_done):
+        await asyncio.sleep(max(delay, 0) + 1)
+        self._waiter = None
+        await self.resume(on_done)
+
+    # Band qilish muddatini uzaytirib turish; boshqa jarayon egallab olgan bo'lsa yuborish to'xtatiladi
+    async def _renew(self, job):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not await asyncio.to_thread(self._save, job, "running"):
+                print(f"Broadcast {job.id} boshqa jarayonga o'tdi, bu yerda to'xtatilmoqda")
+                self._task.cancel()
+                return
+
+    def _launch(self, job, on_done):
+        self.job = job
+        self._stop_requested = False
+        # Admin update'ining konteksti (metrikalar) broadcast so'rovlariga o'tmasligi uchun
+        self._task = contextvars.Context().run(asyncio.create_task, self._run(job, on_done))
+
+    # Admin to'xtatgan broadcast qayta davom ettirilmaydi
+    async def stop(self):
+        if not self.running:
+            return False
+        self._stop_requested = True
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    async def _run(self, job, on_done):
+        bucket = TokenBucket(self.rate)
+        limit = asyncio.Semaphore(self.concurrency)
+        status = "running"
+        renew = asyncio.create_task(self._renew(job))
+        try:
+            while True:
+                user_ids = self.store.active_user_ids(job.last_user_id, self.batch)
+                if not user_ids:
+                    break
+                blocked = []
+                try:
+                    await asyncio.gather(*(self._deliver(job, user_id, bucket, limit, blocked) for user_id in user_ids))
+                finally:
+                    # Bo'lim yarmida to'xtatilsa ham bloklaganlar saqlanadi
+                    await self.store.deactivate(blocked)
+                # Bo'lim to'liq tugagandan keyin checkpoint: uzilsa ko'pi bilan bitta bo'lim qayta yuboriladi
+                job.last_user_id = user_ids[-1]
+                if not await asyncio.to_thread(self._save, job, "running"):
+                    print(f"Broadcast {job.id} boshqa jarayonga o'tdi, bu yerda to'xtatilmoqda")
+                    raise asyncio.CancelledError
+            status = "done"
+        except asyncio.CancelledError:
+            # Bot to'xtatilganda (shutdown) holat "running" qoladi va keyingi ishga tushishda davom etadi
+            status = "stopped" if self._stop_requested else "running"
+            raise
+        except Exception as e:
+            print(f"Broadcast {job.id} xatolik bilan to'xtadi: {e}")
+            status = "failed"
+        finally:
+            renew.cancel()
+            # Band qilish bekor qilinadi: shutdown'dan keyin qayta ishga tushgan jarayon darhol davom ettiradi
+            await asyncio.to_thread(self._save, job, status, True)
+            print(f"Broadcast {job.id}: {status}, yuborildi {job.sent}, xato {job.failed}, bloklangan {job.blocked}")
+        if on_done is not None:
+            await on_done(job, status)
+
+    async def _deliver(self, job, user_id, bucket, limit, blocked):
+        async with limit:
+            delay = bucket.delay()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = bucket.delay()
+            bucket.consume()
+            try:
+                await self.bot.send_message(int(user_id), job.text)
+                job.sent += 1
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                if isinstance(e, TelegramForbiddenError) or any(reason in str(e).lower() for reason in BLOCKED_ERRORS):
+                    job.blocked += 1
+                    blocked.append(user_id)
+                else:
+                    job.failed += 1
+            except Exception as e:
+                print(f"Broadcast: {user_id} ga yuborib bo'lmadi: {e}")
+                job.failed += 1
+
+    def status(self):
+        job = self.job
+        if job is None:
+            return None
+        elapsed = time.monotonic() - job.started_at
+        return {
+            "id": job.id,
+            "running": self.running,
+            "sent": job.sent,
+            "failed": job.failed,
+            "blocked": job.blocked,
+            "rate": round(job.sent / elapsed, 1) if elapsed else 0.0,
+        }
+
+    async def close(self):
+        if self._waiter is not None:
+            self._waiter.cancel()
+            self._waiter = None
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+
+from aiogram import BaseMiddleware
+
+from metrics import COUNT_BUCKETS, Counter, Histogram
+from ttlcache import TTLCache
+
+# Bir vaqtda qayta ishlanadigan update'lar soni (turli chatlar bo'yicha)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "200"))
+# Bitta chatda navbatda turishi mumkin bo'lgan update'lar (oshsa yangi xabar va tugma bosilishlari
+# tashlab yuboriladi; a'zolik kabi xizmat update'lari har doim navbatga qo'yiladi)
+UPDATE_CHAT_MAX_PENDING = int(os.getenv("UPDATE_CHAT_MAX_PENDING", "10"))
+# Shu vaqt ichida bir xil tugma bosilishi, oldingisi hali tugamagan bo'lsa, takror hisoblanadi
+UPDATE_DUPLICATE_WINDOW = float(os.getenv("UPDATE_DUPLICATE_WINDOW", "2.0"))
+
+UPDATE_CHAT_DEPTH = Histogram("finai_update_chat_depth", "Update kelganda chat navbatining uzunligi",
+                              buckets=COUNT_BUCKETS)
+UPDATE_DROPPED = Counter("finai_update_dropped_total", "Tashlab yuborilgan update'lar", ["reason"])
+
+# Navbat to'lganda tashlab yuborilishi mumkin bo'lgan update turlari (foydalanuvchi yozgan/bosgan narsalar)
+FLOOD_UPDATE_TYPES = ("message", "edited_message", "callback_query")
+FLOOD_NOTICE = "⏳ Oldingi so'rovlaringiz hali bajarilmoqda. Iltimos, javobni kuting va keyin qayta yuboring."
+
+
+class _ChatQueue:
+    __slots__ = ("lock", "pending", "keys", "warned")
+
+    def __init__(self):
+        # asyncio.Lock kutayotganlarni kelish tartibida uyg'otadi - chat ichida tartib shu bilan saqlanadi
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        # takrorlanishni aniqlash kaliti -> kelgan vaqti (faqat navbatdagi/ishlanayotgan update'lar)
+        self.keys = {}
+        # Navbat to'lgani haqida ogohlantirish yuborilganmi (navbat bo'shaguncha bir marta)
+        self.warned = False
+
+
+# Update'larni bitta chat ichida qat'iy ketma-ket, turli chatlar uchun esa parallel
+# (ko'pi bilan UPDATE_CONCURRENCY ta) qayta ishlovchi middleware. Qayta yuborilgan update_id va
+# ketma-ket bosilgan bir xil tugma birlashtiriladi; bir xil matnli xabarlar esa alohida qayta
+# ishlanadi (foydalanuvchi bir savolni ataylab qayta yuborishi mumkin)
+class ChatExecutor(BaseMiddleware):
+    def __init__(self, concurrency=UPDATE_CONCURRENCY, max_pending=UPDATE_CHAT_MAX_PENDING,
+                 duplicate_window=UPDATE_DUPLICATE_WINDOW):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.duplicate_window = duplicate_window
+        self.limit = asyncio.Semaphore(concurrency)
+        self.pending = 0
+        self.running = 0
+        self.processed = 0
+        self.duplicates = 0
+        self.flood_dropped = 0
+        self._chats = {}
+        self._seen = TTLCache(maxsize=20000, ttl=300)
+
+    # Dispatcher'ga ulash. FSM holati chat navbati kelgandan keyin o'qilishi kerak
+    # (aks holda ketma-ket xabarlar eski holatni ko'radi), shuning uchun dispatcher'ning
+    # FSM middleware'i shu middleware'dan keyinga ko'chiriladi
+    def setup(self, dp):
+        fsm = getattr(dp, "fsm", None)
+        if fsm is not None and fsm in dp.update.outer_middleware:
+            dp.update.outer_middleware.unregister(fsm)
+            dp.update.outer_middleware(self)
+            dp.update.outer_middleware(fsm)
+        else:
+            dp.update.outer_middleware(self)
+
+    # Navbatda kutayotgan (hali boshlanmagan) update'lar
+    def waiting(self):
+        return self.pending - self.running
+
+    def chat_depth(self, chat_id):
+        entry = self._chats.get(chat_id)
+        return entry.pending if entry else 0
+
+    @staticmethod
+    def _duplicate_key(update):
+        query = update.callback_query
+        if query is not None and query.data:
+            return query.message.message_id if query.message else None, query.data
+        return None
+
+    # Tashlab yuborilgan tugma bosilishiga javob (aks holda tugmada soat belgisi qoladi);
+    # notice berilsa, foydalanuvchiga sababi ham aytiladi
+    @staticmethod
+    async def _drop(update, reason, notice=None):
+        UPDATE_DROPPED.inc(reason=reason)
+        try:
+            if update.callback_query is not None:
+                await update.callback_query.answer(notice)
+            elif notice and update.message is not None:
+                await update.message.answer(notice)
+        except Exception:
+            pass
+
+    async def __call__(self, handler, event, data):
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        chat_id = chat.id if chat is not None else user.id if user is not None else None
+
+        # Telegram webhook'ni qayta yuborganda bir xil update_id keladi
+        if event.update_id in self._seen:
+            self.duplicates += 1
+            await self._drop(event, "redelivered")
+            return None
+        self._seen.set(event.update_id, True)
+
+        if chat_id is None:
+            async with self.limit:
+                return await handler(event, data)
+
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            entry = self._chats[chat_id] = _ChatQueue()
+        if entry.pending >= self.max_pending and event.event_type in FLOOD_UPDATE_TYPES:
+            self.flood_dropped += 1
+            notice = None if entry.warned else FLOOD_NOTICE
+            entry.warned = True
+            await self._drop(event, "flood", notice)
+            return None
+
+        key = self._duplicate_key(event)
+        now = time.monotonic()
+        if key is not None:
+            seen_at = entry.keys.get(key)
+            if seen_at is not None and now - seen_at < self.duplicate_window:
+                self.duplicates += 1
+                await self._drop(event, "duplicate")
+                return None
+            entry.keys[key] = now
+
+        entry.pending += 1
+        self.pending += 1
+        UPDATE_CHAT_DEPTH.observe(entry.pending)
+        try:
+            async with entry.lock:
+                # Global limit chat navbatidan keyin olinadi: kutayotgan update'lar o'rin egallamaydi
+                async with self.limit:
+                    self.running += 1
+                    try:
+                        return await handler(event, data)
+                    finally:
+                        self.running -= 1
+                        self.processed += 1
+        finally:
+            entry.pending -= 1
+            self.pending -= 1
+            if key is not None and entry.keys.get(key) == now:
+                del entry.keys[key]
+            if entry.pending == 0 and self._chats.get(chat_id) is entry:
+                del self._chats[chat_id]
+
+    def stats(self):
+        return {
+            "chats": len(self._chats),
+            "pending": self.pending,
+            "running": self.running,
+            "max_chat_depth": max((entry.pending for entry in self._chats.values()), default=0),
+            "processed": self.processed,
+            "duplicates": self.duplicates,
+            "flood_dropped": self.flood_dropped,
+        }
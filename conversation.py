@@ -0,0 +1,200 @@
+import asyncio
+import os
+from collections import deque
+
+from ttlcache import TTLCache
+
+# Suhbat tarixi uchun token byudjeti (xulosa + oxirgi xabarlar, yangi savolsiz)
+CONV_TOKEN_BUDGET = int(os.getenv("CONV_TOKEN_BUDGET", "1500"))
+# Xulosa uzunligi chegarasi (token)
+CONV_SUMMARY_TOKENS = int(os.getenv("CONV_SUMMARY_TOKENS", "250"))
+# Bir userda saqlanadigan xabarlar soni (savol va javob alohida hisoblanadi)
+CONV_MAX_MESSAGES = int(os.getenv("CONV_MAX_MESSAGES", "20"))
+# Shuncha vaqt yozmagan userning suhbati o'chiriladi (soniya)
+CONV_TTL = float(os.getenv("CONV_TTL", "1800"))
+# Xotirada saqlanadigan suhbatlar soni
+CONV_MAX_USERS = int(os.getenv("CONV_MAX_USERS", "20000"))
+CONV_PURGE_INTERVAL = float(os.getenv("CONV_PURGE_INTERVAL", "300"))
+
+# Har bir xabar uchun chat formatining qo'shimcha tokenlari
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = (
+    "Quyidagi moliyaviy maslahat suhbatining qisqa xulosasini yozing. "
+    "Userning maqsadlari, raqamlar (summa, muddat, foiz) va berilgan asosiy tavsiyalarni saqlang. "
+    "Faqat xulosa matnini qaytaring."
+)
+
+
+# Taxminiy token soni (~4 belgi = 1 token, scheduler ham shunday hisoblaydi)
+def estimate_tokens(text) -> int:
+    return len(text) // 4 + MESSAGE_OVERHEAD
+
+
+def _truncate(text, tokens):
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+class _Turn:
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+        self.tokens = estimate_tokens(content)
+
+
+class Conversation:
+    __slots__ = ("summary", "turns", "tokens", "pending", "compacting")
+
+    def __init__(self):
+        self.summary = ""
+        self.turns = deque()
+        self.tokens = 0
+        # Byudjetdan chiqib, hali xulosaga qo'shilmagan xabarlar
+        self.pending = []
+        self.compacting = False
+
+
+# Userlar bilan suhbat xotirasi: oxirgi xabarlar token byudjeti ichida saqlanadi,
+# eskilari fon rejimida bitta xulosaga yig'iladi. Prompt boshida doim bir xil
+# tizim ko'rsatmalari turadi (provayder tomonida prompt keshlash ishlashi uchun)
+class ConversationMemory:
+    def __init__(self, summarize=None, budget=CONV_TOKEN_BUDGET, summary_tokens=CONV_SUMMARY_TOKENS,
+                 max_messages=CONV_MAX_MESSAGES, ttl=CONV_TTL, max_users=CONV_MAX_USERS):
+        # summarize(user_id, summary, turns) -> yangi xulosa matni; turns = [(role, content), ...]
+        self.summarize = summarize
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self.max_messages = max_messages
+        self.conversations = TTLCache(maxsize=max_users, ttl=ttl)
+        self.compactions = 0
+        self.summary_failures = 0
+        self._tasks = set()
+        self._purge_task = None
+
+    def _get(self, user_id, create=False):
+        conversation = self.conversations.get(user_id)
+        if conversation is None and create:
+            conversation = Conversation()
+        if conversation is not None:
+            # Har bir murojaatda faol bo'lmaslik muddati yangilanadi
+            self.conversations.set(user_id, conversation)
+        return conversation
+
+    def has_history(self, user_id) -> bool:
+        conversation = self.conversations.get(user_id)
+        return conversation is not None and bool(conversation.turns or conversation.summary or conversation.pending)
+
+    def reset(self, user_id):
+        self.conversations.pop(user_id)
+
+    # LLM'ga yuboriladigan xabarlar: o'zgarmas tizim ko'rsatmasi, user profili, xulosa, oxirgi xabarlar, savol
+    def build_messages(self, user_id, system_prompt, user_context, question):
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": user_context},
+        ]
+        conversation = self._get(user_id)
+        if conversation is not None:
+            if conversation.summary:
+                messages.append({"role": "system", "content": f"Suhbatning oldingi qismi xulosasi: {conversation.summary}"})
+            messages += [{"role": turn.role, "content": turn.content} for turn in conversation.turns]
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    # Javob berilgandan keyin savol-javobni saqlash; byudjetdan oshsa eski xabarlar xulosaga o'tadi
+    def add_turn(self, user_id, question, answer):
+        conversation = self._get(user_id, create=True)
+        for turn in (_Turn("user", question), _Turn("assistant", answer)):
+            conversation.turns.append(turn)
+            conversation.tokens += turn.tokens
+
+        budget = self.budget - (estimate_tokens(conversation.summary) if conversation.summary else 0)
+        evicted = []
+        # Savol va javob birga chiqariladi (tarix javobsiz savol yoki savolsiz javobdan boshlanmasligi uchun)
+        while conversation.turns and (
+            conversation.tokens > budget or len(conversation.turns) > self.max_messages
+            or conversation.turns[0].role != "user"
+        ):
+            turn = conversation.turns.popleft()
+            conversation.tokens -= turn.tokens
+            evicted.append(turn)
+        if not evicted:
+            return
+
+        conversation.pending += evicted
+        if not conversation.compacting:
+            conversation.compacting = True
+            task = asyncio.create_task(self._compact(user_id, conversation))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _compact(self, user_id, conversation):
+        try:
+            # Xulosa tayyorlanayotganda yangi xabarlar chiqib qolsa, ular keyingi aylanishda qo'shiladi
+            while conversation.pending:
+                turns, conversation.pending = conversation.pending, []
+                summary = None
+                if self.summarize is not None:
+                    try:
+                        summary = await self.summarize(user_id, conversation.summary, [(turn.role, turn.content) for turn in turns])
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        self.summary_failures += 1
+                        print(f"Suhbat xulosasini tayyorlashda xatolik: {e}")
+                if not summary:
+                    summary = self._fallback_summary(conversation.summary, turns)
+                conversation.summary = _truncate(summary.strip(), self.summary_tokens)
+                self.compactions += 1
+        finally:
+            conversation.compacting = False
+
+    # LLM ishlamasa: eski xulosa va userning savollari
+    @staticmethod
+    def _fallback_summary(summary, turns):
+        questions = "; ".join(turn.content for turn in turns if turn.role == "user")
+        return f"{summary} Userning oldingi savollari: {questions}" if summary else f"Userning oldingi savollari: {questions}"
+
+    # Xulosa so'rovi uchun xabarlar
+    @staticmethod
+    def summary_messages(summary, turns):
+        transcript = "\n".join(f"{'User' if role == 'user' else 'AI'}: {content}" for role, content in turns)
+        if summary:
+            transcript = f"Oldingi xulosa: {summary}\n\n{transcript}"
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": transcript},
+        ]
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(CONV_PURGE_INTERVAL)
+            self.conversations.purge()
+
+    def start(self):
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purge_loop())
+
+    async def close(self):
+        tasks = list(self._tasks)
+        if self._purge_task is not None:
+            tasks.append(self._purge_task)
+            self._purge_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        conversations = [conversation for _, conversation, _ in self.conversations.dump()]
+        return {
+            "users": len(conversations),
+            "messages": sum(len(conversation.turns) for conversation in conversations),
+            "tokens": sum(conversation.tokens for conversation in conversations),
+            "summaries": sum(1 for conversation in conversations if conversation.summary),
+            "compacting": len(self._tasks),
+            "compactions": self.compactions,
+            "summary_failures": self.summary_failures,
+        }
@@ -0,0 +1,222 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from ttlcache import TTLCache
+
+# Depozit hisoblari keshi
+DEPOSIT_CACHE_SIZE = int(os.getenv("DEPOSIT_CACHE_SIZE", "4096"))
+DEPOSIT_CACHE_TTL = float(os.getenv("DEPOSIT_CACHE_TTL", "3600"))
+_deposit_cache = TTLCache(maxsize=DEPOSIT_CACHE_SIZE, ttl=DEPOSIT_CACHE_TTL)
+
+# Kalkulyatorlarga kiritiladigan qiymatlar chegaralari (bot va batch rejimi uchun umumiy)
+CREDIT_MAX_TERM = 360
+DEPOSIT_MIN_AMOUNT = 100000
+DEPOSIT_MIN_TERM = 1
+DEPOSIT_MAX_TERM = 60
+
+
+# Summani o'qish: "10 000 000" va "10,000,000" ko'rinishlari ham qabul qilinadi
+def parse_amount(text):
+    return float(text.replace(',', '').replace(' ', ''))
+
+
+# Foiz stavkasini o'qish: "18,5" -> 18.5
+def parse_rate(text):
+    return float(text.replace(',', '.'))
+
+
+# Kredit grafigi ustunlar ko'rinishida (qatorlar faqat so'ralganda dict qilinadi)
+class CreditSchedule:
+    __slots__ = ("amount", "monthly_rate", "term", "start", "interest", "total_payment", "remaining_balance")
+
+    def __init__(self, amount, monthly_rate, term, start, interest, total_payment, remaining_balance):
+        self.amount = amount
+        self.monthly_rate = monthly_rate
+        self.term = term
+        self.start = start
+        self.interest = interest
+        self.total_payment = total_payment
+        self.remaining_balance = remaining_balance
+
+    def __len__(self):
+        return self.term
+
+    def __bool__(self):
+        return self.term > 0
+
+    def row(self, i):
+        return {
+            'number': i + 1,
+            'date': (self.start + timedelta(days=30 * (i + 1))).strftime("%d.%m.%Y"),
+            'interest': round(float(self.interest[i]), 2),
+            'total_payment': round(float(self.total_payment[i]), 2),
+            'remaining_balance': round(float(self.remaining_balance[i]), 2)
+        }
+
+    # Berilgan oraliqdagi qatorlar generatori
+    def rows(self, start=0, stop=None):
+        stop = self.term if stop is None else min(stop, self.term)
+        for i in range(max(start, 0), stop):
+            yield self.row(i)
+
+    def __iter__(self):
+        return self.rows()
+
+    # page_size qatordan iborat sahifalar soni
+    def page_count(self, page_size):
+        return -(-self.term // page_size)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(self.term))]
+        if index < 0:
+            index += self.term
+        if not 0 <= index < self.term:
+            raise IndexError(index)
+        return self.row(index)
+
+    # Umumiy foizlar (yaxlitlangan qiymatlar yig'indisi)
+    def total_interest(self):
+        return round(float(np.round(self.interest, 2).sum()), 2)
+
+    def total_payments(self):
+        return round(float(np.round(self.total_payment, 2).sum()), 2)
+
+    # Jadval ostidagi jami ko'rsatkichlar (asosiy qarz birinchi qatordan tiklanadi)
+    def summary(self):
+        first = self.row(0)
+        return {
+            'monthly_payment': first['total_payment'],
+            'total_interest': self.total_interest(),
+            'total_payment': self.total_payments(),
+            'principal': first['remaining_balance'] + first['total_payment'] - first['interest'],
+        }
+
+
+# Bir nechta kredit uchun grafikni yopiq formulada hisoblash
+def _amortize(amounts, monthly_rates, terms):
+    max_term = int(terms.max())
+    months = np.arange(1, max_term + 1)
+
+    growth = (1 + monthly_rates)[:, None] ** months[None, :]
+    growth_n = (1 + monthly_rates) ** terms
+    payments = amounts * monthly_rates * growth_n / (growth_n - 1)
+
+    # k-oydan keyingi qoldiq: P(1+r)^k - M((1+r)^k - 1) / r
+    balance = amounts[:, None] * growth - payments[:, None] * (growth - 1) / monthly_rates[:, None]
+    previous = np.empty_like(balance)
+    previous[:, 0] = amounts
+    previous[:, 1:] = balance[:, :-1]
+
+    interest = previous * monthly_rates[:, None]
+    total_payment = np.repeat(payments[:, None], max_term, axis=1)
+
+    # Oxirgi oyda qolgan qoldiq to'lovga qo'shiladi
+    loans = np.arange(len(terms))
+    last = terms - 1
+    total_payment[loans, last] += balance[loans, last]
+    balance[loans, last] = 0
+
+    return interest, total_payment, np.maximum(balance, 0)
+
+
+# Bir nechta kredit grafigini bitta chaqiruvda hisoblash
+# loans: (amount, interest_rate, term, start_date) lar ro'yxati
+def calculate_credit_schedules(loans):
+    loans = list(loans)
+    results = [None] * len(loans)
+    valid, starts = [], []
+
+    for index, (amount, interest_rate, term, start_date) in enumerate(loans):
+        try:
+            start = datetime.strptime(start_date, "%d.%m.%Y")
+            term = int(term)
+            if interest_rate == 0 or term <= 0:
+                raise ValueError("Foiz stavkasi va muddat noldan katta bo'lishi kerak")
+        except Exception as e:
+            print(f"Kredit grafigini hisoblashda xatolik: {e}")
+            continue
+        valid.append((index, float(amount), interest_rate / 100 / 12, term))
+        starts.append(start)
+
+    if not valid:
+        return results
+
+    indexes, amounts, monthly_rates, terms = (np.array(column) for column in zip(*valid))
+    # Juda katta yoki cheksiz stavka/summada qiymatlar inf/nan bo'ladi - bunday grafik qaytarilmaydi.
+    # Qisqa muddatli kreditlarning to'ldirilgan ustunlaridagi overflow natijaga kirmaydi
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        interest, total_payment, remaining_balance = _amortize(amounts, monthly_rates, terms)
+
+    for row, index in enumerate(indexes):
+        term = int(terms[row])
+        columns = (interest[row, :term], total_payment[row, :term], remaining_balance[row, :term])
+        if not all(np.isfinite(column).all() for column in columns):
+            print("Kredit grafigini hisoblashda xatolik: natija chekli son emas")
+            continue
+        results[index] = CreditSchedule(amounts[row], monthly_rates[row], term, starts[row], *columns)
+    return results
+
+
+# Kredit grafigini hisoblash
+def calculate_credit_schedule(amount, interest_rate, term, start_date):
+    return calculate_credit_schedules([(amount, interest_rate, term, start_date)])[0]
+
+
+# Depozit summalarini hisoblash (keshlanadigan qism)
+def _deposit_totals(amount, annual_rate, term_months, capitalization, tax_rate):
+    monthly_rate = annual_rate / 100 / 12
+
+    if capitalization:
+        # Murakkab foiz (kapitalizatsiya bilan)
+        total_amount = amount * (1 + monthly_rate) ** term_months
+        total_interest = total_amount - amount
+    else:
+        # Oddiy foiz
+        total_interest = amount * monthly_rate * term_months
+        total_amount = amount + total_interest
+
+    # Oylik daromad
+    monthly_income = total_interest / term_months
+
+    # Soliq hisobi (12% - daromad solig'i)
+    tax_amount = total_interest * (tax_rate / 100)
+    net_interest = total_interest - tax_amount
+    net_amount = amount + net_interest
+
+    return {
+        'total_interest': round(total_interest, 2),
+        'total_amount': round(total_amount, 2),
+        'monthly_income': round(monthly_income, 2),
+        'tax_amount': round(tax_amount, 2),
+        'net_interest': round(net_interest, 2),
+        'net_amount': round(net_amount, 2),
+    }
+
+
+# Depozit hisoblash funksiyasi (natijalar normallashtirilgan kalit bo'yicha keshlanadi)
+def calculate_deposit(amount, annual_rate, term_months, capitalization=True, tax_rate=12):
+    try:
+        key = (float(amount), float(annual_rate), int(term_months), bool(capitalization), float(tax_rate))
+        totals = _deposit_cache.get(key)
+        if totals is None:
+            totals = _deposit_totals(*key)
+            _deposit_cache.set(key, totals)
+
+        return {
+            'initial_amount': amount,
+            'annual_rate': annual_rate,
+            'term_months': term_months,
+            'capitalization': capitalization,
+            **totals,
+            'tax_rate': tax_rate
+        }
+    except Exception as e:
+        print(f"Depozit hisobida xatolik: {e}")
+        return None
+
+
+def deposit_cache_stats():
+    return _deposit_cache.stats()
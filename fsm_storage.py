@@ -0,0 +1,218 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+from metrics import STORE_FLUSH_LATENCY, STORE_FLUSH_ROWS
+
+# Xotiradagi "issiq" qatlam hajmi
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+# Tashlab ketilgan holatlar shu vaqtdan keyin o'chiriladi (soniyalarda)
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", str(24 * 3600)))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", "600"))
+# Bir nechta jarayon (shard'lar yoki bir nechta bot nusxasi) bitta bazadan foydalansa:
+# holat har safar bazadan o'qiladi va o'zgarish darhol yoziladi (issiq qatlam chetlab o'tiladi)
+FSM_SHARED = os.getenv("FSM_SHARED", "1" if os.getenv("SHARD_INDEX") else "0") == "1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+UPSERT = """
+INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+ON CONFLICT(key) DO UPDATE SET
+    state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+# SQLite ustidagi FSM storage: LRU kesh + TTL + guruhlab yozish.
+# Issiq qatlam faqat bitta jarayon uchun to'g'ri: boshqa jarayonlar bilan bo'lishilsa shared=True
+class SQLiteStorage(BaseStorage):
+    def __init__(self, path, key_builder=None, shared=FSM_SHARED):
+        self.path = path
+        self.shared = shared
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._conn = None
+        self._writer = None
+        # key -> [state, data, updated_at]
+        self._hot = OrderedDict()
+        self._dirty = set()
+        # Yozilayotgan (hali commit qilinmagan) kalitlar - xotiradan chiqarib yuborilmaydi
+        self._flushing = set()
+        self._lock = None
+        self._flush_task = None
+        self._last_sweep = time.monotonic()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = _connect(self.path)
+            with self._conn:
+                self._conn.execute(SCHEMA)
+        return self._conn
+
+    def _expired(self, updated_at):
+        return updated_at < time.time() - FSM_STATE_TTL
+
+    def _entry(self, key):
+        name = self.key_builder.build(key)
+        entry = self._hot.get(name)
+        if entry is None or self.shared and name not in self._dirty and name not in self._flushing:
+            row = self.conn.execute(
+                "SELECT state, data, updated_at FROM fsm WHERE key = ?", (name,)
+            ).fetchone()
+            if row is None or self._expired(row[2]):
+                entry = [None, {}, time.time()]
+            else:
+                entry = [row[0], json.loads(row[1]), row[2]]
+            self._hot[name] = entry
+            self._evict(keep=name)
+        elif self._expired(entry[2]):
+            entry[0], entry[1] = None, {}
+        self._hot.move_to_end(name)
+        return name, entry
+
+    def _pinned(self, name):
+        return name in self._dirty or name in self._flushing
+
+    # Faqat yozilgan yozuvlarni xotiradan chiqarish
+    def _evict(self, keep=None):
+        while len(self._hot) > FSM_CACHE_SIZE:
+            victim = next((name for name in self._hot if not self._pinned(name) and name != keep), None)
+            if victim is None:
+                break
+            del self._hot[victim]
+
+    # Shared rejimda o'zgarish boshqa jarayonlarga darhol ko'rinishi uchun shu yerning o'zida yoziladi
+    async def _touch(self, name, entry):
+        entry[2] = time.time()
+        self._dirty.add(name)
+        if self.shared:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key, state=None):
+        name, entry = self._entry(key)
+        entry[0] = state.state if isinstance(state, State) else state
+        await self._touch(name, entry)
+
+    async def get_state(self, key):
+        _, entry = self._entry(key)
+        return entry[0]
+
+    async def set_data(self, key, data):
+        name, entry = self._entry(key)
+        entry[1] = data.copy()
+        await self._touch(name, entry)
+
+    async def get_data(self, key):
+        _, entry = self._entry(key)
+        return entry[1].copy()
+
+    # Xotiradagi holatlar soni (monitoring uchun)
+    def state_counts(self):
+        counts = {}
+        for state, _, _ in self._hot.values():
+            if state is not None:
+                counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    # JSON'ga aylanmaydigan ma'lumot faqat o'z kalitini yozilmay qoldiradi (qolganlari yoziladi)
+    def _snapshot(self):
+        dirty, self._dirty = self._dirty, set()
+        self._flushing |= dirty
+        upserts, deletes = [], []
+        for name in dirty:
+            entry = self._hot.get(name)
+            if entry is None:
+                continue
+            state, data, updated_at = entry
+            if state is None and not data:
+                deletes.append((name,))
+                continue
+            try:
+                upserts.append((name, state, json.dumps(data, ensure_ascii=False), updated_at))
+            except (TypeError, ValueError) as e:
+                print(f"FSM holatini saqlab bo'lmadi ({name}): {e}")
+        return dirty, upserts, deletes
+
+    def _write(self, upserts, deletes, sweep):
+        if self._writer is None:
+            self._writer = _connect(self.path)
+            with self._writer:
+                self._writer.execute(SCHEMA)
+        with self._writer:
+            if upserts:
+                self._writer.executemany(UPSERT, upserts)
+            if deletes:
+                self._writer.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+            if sweep:
+                self._writer.execute("DELETE FROM fsm WHERE updated_at < ?", (time.time() - FSM_STATE_TTL,))
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            sweep = time.monotonic() - self._last_sweep >= FSM_SWEEP_INTERVAL
+            if not self._dirty and not sweep:
+                return
+            started = time.perf_counter()
+            dirty = set(self._dirty)
+            try:
+                dirty, upserts, deletes = self._snapshot()
+                await asyncio.to_thread(self._write, upserts, deletes, sweep)
+            except BaseException as e:
+                self._flushing -= dirty
+                self._dirty |= dirty
+                if not isinstance(e, Exception):
+                    raise
+                print(f"FSM holatini yozishda xatolik: {e}")
+                return
+            self._flushing -= dirty
+            STORE_FLUSH_LATENCY.observe(time.perf_counter() - started, store="fsm")
+            STORE_FLUSH_ROWS.inc(len(upserts) + len(deletes), store="fsm")
+            if sweep:
+                self._last_sweep = time.monotonic()
+                for name in [name for name, entry in self._hot.items() if self._expired(entry[2])]:
+                    if not self._pinned(name):
+                        del self._hot[name]
+            self._evict()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FSM_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        for conn in (self._writer, self._conn):
+            if conn is not None:
+                conn.close()
+        self._writer = None
+        self._conn = None
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+import random
+import time
+
+import aiohttp
+
+from metrics import LLM_FIRST_TOKEN, LLM_LATENCY, LLM_REQUESTS, LLM_RETRIES
+
+# OpenAI endpoint (lokal test serverlari uchun o'zgartirish mumkin)
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/")
+
+# Ulanishlar puli va timeoutlar
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+
+# Qayta urinishlar
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+
+# Qayta urinib ko'rsa bo'ladigan HTTP statuslar
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# Butun jarayon uchun bitta keep-alive sessiya
+_session = None
+
+
+class LLMError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+
+
+# Sessiyani olish (birinchi chaqiruvda yaratiladi)
+def get_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=LLM_POOL_SIZE,
+            limit_per_host=LLM_POOL_SIZE,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=LLM_CONNECT_TIMEOUT,
+            sock_read=LLM_READ_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+
+# Sessiyani yopish (bot to'xtaganda)
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+# Keyingi urinishgacha kutish vaqti
+def _backoff_delay(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = min(LLM_BACKOFF_BASE * (2 ** attempt), LLM_BACKOFF_MAX)
+    return delay * (0.5 + random.random() / 2)
+
+
+# Chat completion so'rovi (retry va backoff bilan).
+# url/provider boshqa OpenAI-mos provayderlar uchun (masalan, GigaChat)
+async def chat_completion(payload: dict, api_key: str, url: str = None, provider: str = "openai",
+                          max_retries: int = LLM_MAX_RETRIES, ssl=None) -> dict:
+    url = url or f"{OPENAI_API_BASE}/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    session = get_session()
+    attempt = 0
+    while True:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            async with session.post(url, json=payload, headers=headers, ssl=ssl) as response:
+                status = str(response.status)
+                if response.status == 200:
+                    return await response.json()
+
+                if response.status in RETRY_STATUSES and attempt < max_retries:
+                    delay = _backoff_delay(attempt, response.headers.get("Retry-After"))
+                else:
+                    raise LLMError(response.status, await response.text())
+        except asyncio.TimeoutError:
+            status = "timeout"
+            if attempt >= max_retries:
+                raise
+            delay = _backoff_delay(attempt)
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError):
+            status = "connection_error"
+            if attempt >= max_retries:
+                raise
+            delay = _backoff_delay(attempt)
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - started, provider=provider, status=status)
+            LLM_REQUESTS.inc(provider=provider, status=status)
+
+        attempt += 1
+        LLM_RETRIES.inc(provider=provider)
+        await asyncio.sleep(delay)
+
+
+# SSE oqimidagi matn bo'laklari ("data: {...}" qatorlari, oxirida "data: [DONE]")
+async def _sse_deltas(response):
+    async for raw in response.content:
+        line = raw.decode("utf-8").strip()
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        choices = json.loads(data).get("choices") or []
+        if choices:
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+
+
+# Oqimli chat completion: javob matnini bo'laklab qaytaruvchi async generator.
+# Qayta urinish faqat birinchi bo'lak kelguncha (javob boshlangach xato yuqoriga uzatiladi)
+async def stream_completion(payload: dict, api_key: str, url: str = None, provider: str = "openai",
+                            max_retries: int = LLM_MAX_RETRIES, ssl=None):
+    url = url or f"{OPENAI_API_BASE}/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream"
+    }
+    payload = {**payload, "stream": True}
+
+    session = get_session()
+    attempt = 0
+    while True:
+        started = time.perf_counter()
+        status = "error"
+        streamed = False
+        try:
+            async with session.post(url, json=payload, headers=headers, ssl=ssl) as response:
+                status = str(response.status)
+                if response.status == 200:
+                    async for delta in _sse_deltas(response):
+                        if not streamed:
+                            streamed = True
+                            LLM_FIRST_TOKEN.observe(time.perf_counter() - started, provider=provider)
+                        yield delta
+                    return
+
+                if response.status in RETRY_STATUSES and attempt < max_retries:
+                    delay = _backoff_delay(attempt, response.headers.get("Retry-After"))
+                else:
+                    raise LLMError(response.status, await response.text())
+        except asyncio.TimeoutError:
+            status = "timeout"
+            if streamed or attempt >= max_retries:
+                raise
+            delay = _backoff_delay(attempt)
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError):
+            status = "connection_error"
+            if streamed or attempt >= max_retries:
+                raise
+            delay = _backoff_delay(attempt)
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - started, provider=provider, status=status)
+            LLM_REQUESTS.inc(provider=provider, status=status)
+
+        attempt += 1
+        LLM_RETRIES.inc(provider=provider)
+        await asyncio.sleep(delay)
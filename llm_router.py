@@ -0,0 +1,544 @@
+import abc
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+
+import aiohttp
+
+from llm_client import OPENAI_API_BASE, LLMError, chat_completion, get_session, stream_completion
+from metrics import Counter
+
+# Provayderlar (vergul bilan, birinchisi asosiy). Kaliti yo'q provayder o'tkazib yuboriladi
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "openai,gigachat")
+# Boshqa provayderga o'tishdan oldin bitta provayderdagi qayta urinishlar
+LLM_PROVIDER_RETRIES = int(os.getenv("LLM_PROVIDER_RETRIES", "1"))
+
+# Statistika oynasi: oxirgi shuncha so'rov va shuncha soniya
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "200"))
+LLM_STATS_WINDOW_SECONDS = float(os.getenv("LLM_STATS_WINDOW_SECONDS", "300"))
+
+# Circuit breaker: xatolar ulushi yoki ketma-ket xatolar oshsa provayder vaqtincha o'chiriladi
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_MIN_REQUESTS = int(os.getenv("LLM_BREAKER_MIN_REQUESTS", "10"))
+LLM_BREAKER_CONSECUTIVE = int(os.getenv("LLM_BREAKER_CONSECUTIVE", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Hedging: javob p95 dan kechiksa, ikkinchi so'rov yuboriladi (birinchi kelgan javob olinadi)
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Qo'shimcha so'rovlar ulushi chegarasi (yuklama ikki barobar oshib ketmasligi uchun)
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+
+# GigaChat (GIGA_TOKEN - OAuth uchun "Authorization key")
+GIGA_API_BASE = os.getenv("GIGA_API_BASE", "https://gigachat.devices.sberbank.ru/api/v1").rstrip("/")
+GIGA_AUTH_URL = os.getenv("GIGA_AUTH_URL", "https://ngw.devices.sberbank.ru:9443/api/v2/oauth")
+GIGA_SCOPE = os.getenv("GIGA_SCOPE", "GIGACHAT_API_PERS")
+GIGA_MODEL = os.getenv("GIGA_MODEL", "GigaChat")
+# GigaChat sertifikati Rossiya Mintsifri CA bilan imzolangan; u tizimda bo'lmasa "0" qo'yiladi
+GIGA_VERIFY_SSL = os.getenv("GIGA_VERIFY_SSL", "1") == "1"
+
+LLM_HEDGES = Counter("finai_llm_hedged_total", "Hedging sababli yuborilgan qo'shimcha so'rovlar", ["provider"])
+LLM_FAILOVERS = Counter("finai_llm_failovers_total", "Xato sababli boshqa provayderga o'tishlar", ["provider"])
+LLM_BREAKER_OPENS = Counter("finai_llm_breaker_open_total", "Circuit breaker ochilishlari", ["provider"])
+
+
+# Provayder nosozligi: 5xx, timeout va ulanish xatolari. 4xx (noto'g'ri so'rov, avtorizatsiya)
+# so'rovning o'zidagi xato - breaker'ga hisoblanmaydi va boshqa provayderga o'tilmaydi
+def is_provider_failure(error):
+    if isinstance(error, LLMError):
+        return error.status >= 500
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
+
+
+# Oqimning birinchi bo'lagi (bo'sh oqim uchun None); generator keyingi bo'laklar uchun ochiq qoladi
+async def _first_delta(generator):
+    async for delta in generator:
+        return delta
+    return None
+
+
+# Oxirgi so'rovlar bo'yicha kechikish va xatolar ulushi
+class RollingStats:
+    def __init__(self, size=LLM_STATS_WINDOW, seconds=LLM_STATS_WINDOW_SECONDS):
+        self.seconds = seconds
+        self._samples = deque(maxlen=size)
+
+    def record(self, latency, ok):
+        self._samples.append((time.monotonic(), latency, ok))
+
+    def reset(self):
+        self._samples.clear()
+
+    def _recent(self):
+        since = time.monotonic() - self.seconds
+        return [sample for sample in self._samples if sample[0] >= since]
+
+    def error_rate(self):
+        samples = self._recent()
+        if not samples:
+            return 0.0, 0
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return errors / len(samples), len(samples)
+
+    # Muvaffaqiyatli so'rovlar kechikishining kvantili (namuna kam bo'lsa None)
+    def quantile(self, q, min_samples=1):
+        latencies = sorted(latency for _, latency, ok in self._recent() if ok)
+        if len(latencies) < max(min_samples, 1):
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+# closed -> (xatolar) -> open -> (cooldown) -> half_open -> (bitta sinov so'rovi) -> closed/open
+class CircuitBreaker:
+    def __init__(self, error_rate=LLM_BREAKER_ERROR_RATE, min_requests=LLM_BREAKER_MIN_REQUESTS,
+                 consecutive=LLM_BREAKER_CONSECUTIVE, cooldown=LLM_BREAKER_COOLDOWN):
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.consecutive = consecutive
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opens = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    # So'rov yuborish mumkinmi (half_open holatida faqat bitta sinov so'roviga ruxsat)
+    def allow(self):
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self.state = "half_open"
+            self._trial = False
+        if self.state == "half_open":
+            if self._trial:
+                return False
+            self._trial = True
+        return True
+
+    # Sinov so'rovi bekor qilindi (natija yo'q) - keyingi so'rov sinov bo'ladi
+    def release(self):
+        if self.state == "half_open":
+            self._trial = False
+
+    def record_success(self):
+        self._failures = 0
+        if self.state == "half_open":
+            self.state = "closed"
+            self._trial = False
+            return True
+        return False
+
+    def record_failure(self, error_rate, samples):
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.consecutive or (
+            samples >= self.min_requests and error_rate >= self.error_rate
+        ):
+            opened = self.state != "open"
+            if opened:
+                self.opens += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._trial = False
+            return opened
+        return False
+
+
+# Provayder: bitta chat-completions endpoint, o'z statistikasi va circuit breaker'i bilan
+class Provider(abc.ABC):
+    name = "provider"
+
+    def __init__(self):
+        self.stats_window = RollingStats()
+        self.breaker = CircuitBreaker()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+
+    @abc.abstractmethod
+    async def complete(self, payload):
+        ...
+
+    # Oqimli javob (matn bo'laklari); oqimni qo'llamaydigan provayder butun javobni bitta bo'lak qiladi
+    async def stream_deltas(self, payload):
+        result = await self.complete(payload)
+        yield result["choices"][0]["message"]["content"]
+
+    def _failed(self, started, error):
+        if not is_provider_failure(error):
+            # Provayder javob berdi, lekin so'rovni rad etdi - sinov so'rovi natijasiz hisoblanadi
+            self.rejected += 1
+            self.breaker.release()
+            return
+        self.errors += 1
+        self.stats_window.record(time.monotonic() - started, False)
+        if self.breaker.record_failure(*self.stats_window.error_rate()):
+            LLM_BREAKER_OPENS.inc(provider=self.name)
+            print(f"⚠️ LLM provayder {self.name} vaqtincha o'chirildi ({self.breaker.cooldown:.0f}s)")
+
+    def _succeeded(self, started):
+        self.stats_window.record(time.monotonic() - started, True)
+        if self.breaker.record_success():
+            # Eski xatolar qayta ochilishga sabab bo'lmasligi uchun
+            self.stats_window.reset()
+            print(f"LLM provayder {self.name} qayta ishlayapti")
+
+    async def call(self, payload):
+        self.requests += 1
+        started = time.monotonic()
+        try:
+            result = await self.complete(payload)
+        except asyncio.CancelledError:
+            # Hedging'da yutqazgan so'rov - provayder xatosi emas
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self._failed(started, e)
+            raise
+        self._succeeded(started)
+        return result
+
+    async def stream(self, payload):
+        self.requests += 1
+        started = time.monotonic()
+        try:
+            async for delta in self.stream_deltas(payload):
+                yield delta
+        except (asyncio.CancelledError, GeneratorExit):
+            # O'quvchi oqimni o'zi to'xtatdi
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self._failed(started, e)
+            raise
+        self._succeeded(started)
+
+    def stats(self):
+        error_rate, samples = self.stats_window.error_rate()
+        p50 = self.stats_window.quantile(0.5)
+        p95 = self.stats_window.quantile(0.95)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "error_rate": round(error_rate, 3),
+            "samples": samples,
+            "p50": round(p50, 3) if p50 is not None else 0.0,
+            "p95": round(p95, 3) if p95 is not None else 0.0,
+            "open": self.breaker.state != "closed",
+            "opens": self.breaker.opens,
+        }
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def __init__(self, api_key, base=OPENAI_API_BASE):
+        super().__init__()
+        self.api_key = api_key
+        self.url = f"{base}/chat/completions"
+
+    async def complete(self, payload):
+        return await chat_completion(payload, self.api_key, url=self.url, provider=self.name,
+                                     max_retries=LLM_PROVIDER_RETRIES)
+
+    async def stream_deltas(self, payload):
+        async for delta in stream_completion(payload, self.api_key, url=self.url, provider=self.name,
+                                             max_retries=LLM_PROVIDER_RETRIES):
+            yield delta
+
+
+# GigaChat: OAuth token (30 daqiqa amal qiladi) keshlanadi va muddati tugashidan oldin yangilanadi
+class GigaChatProvider(Provider):
+    name = "gigachat"
+
+    def __init__(self, auth_key, base=GIGA_API_BASE, auth_url=GIGA_AUTH_URL, scope=GIGA_SCOPE,
+                 model=GIGA_MODEL, verify_ssl=GIGA_VERIFY_SSL):
+        super().__init__()
+        self.auth_key = auth_key
+        self.url = f"{base}/chat/completions"
+        self.auth_url = auth_url
+        self.scope = scope
+        self.model = model
+        self.ssl = None if verify_ssl else False
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _access_token(self, force=False):
+        if not force and self._token and time.time() < self._expires_at - 60:
+            return self._token
+        async with self._lock:
+            # Boshqa so'rov allaqachon yangilagan bo'lishi mumkin
+            if not force and self._token and time.time() < self._expires_at - 60:
+                return self._token
+            headers = {
+                "Authorization": f"Basic {self.auth_key}",
+                "RqUID": str(uuid.uuid4()),
+                "Content-Type": "application/x-www-form-urlencoded",
+                "Accept": "application/json",
+            }
+            async with get_session().post(self.auth_url, data={"scope": self.scope}, headers=headers,
+                                          ssl=self.ssl) as response:
+                if response.status != 200:
+                    raise LLMError(response.status, f"GigaChat OAuth: {await response.text()}")
+                data = await response.json()
+            self._token = data["access_token"]
+            # expires_at millisekundlarda
+            self._expires_at = data["expires_at"] / 1000
+            return self._token
+
+    # GigaChat faqat bitta (birinchi) system xabarni qabul qiladi
+    @staticmethod
+    def _messages(messages):
+        system = []
+        index = 0
+        while index < len(messages) and messages[index]["role"] == "system":
+            system.append(messages[index]["content"])
+            index += 1
+        rest = [
+            {"role": "user" if message["role"] == "system" else message["role"], "content": message["content"]}
+            for message in messages[index:]
+        ]
+        return ([{"role": "system", "content": "\n\n".join(system)}] if system else []) + rest
+
+    async def complete(self, payload):
+        payload = {**payload, "model": self.model, "messages": self._messages(payload["messages"])}
+        token = await self._access_token()
+        try:
+            return await chat_completion(payload, token, url=self.url, provider=self.name,
+                                         max_retries=LLM_PROVIDER_RETRIES, ssl=self.ssl)
+        except LLMError as e:
+            if e.status != 401:
+                raise
+        # Token bekor qilingan bo'lsa, bir marta yangilab qayta urinamiz
+        token = await self._access_token(force=True)
+        return await chat_completion(payload, token, url=self.url, provider=self.name,
+                                     max_retries=LLM_PROVIDER_RETRIES, ssl=self.ssl)
+
+    async def stream_deltas(self, payload):
+        payload = {**payload, "model": self.model, "messages": self._messages(payload["messages"])}
+        for force in (False, True):
+            token = await self._access_token(force=force)
+            try:
+                async for delta in stream_completion(payload, token, url=self.url, provider=self.name,
+                                                     max_retries=LLM_PROVIDER_RETRIES, ssl=self.ssl):
+                    yield delta
+                return
+            except LLMError as e:
+                # 401 javob boshlanmasdan keladi - token yangilanib bir marta qayta urinib ko'riladi
+                if e.status != 401 or force:
+                    raise
+
+
+# Provayderlar orasida tanlash: ishlayotgan birinchi provayder, xato bo'lsa keyingisi,
+# javob p95 dan kechiksa - keyingi provayderga (yoki yagona bo'lsa o'ziga) hedged so'rov
+class LLMRouter:
+    def __init__(self, providers, hedge=LLM_HEDGE, hedge_min_delay=LLM_HEDGE_MIN_DELAY,
+                 hedge_min_samples=LLM_HEDGE_MIN_SAMPLES, hedge_max_ratio=LLM_HEDGE_MAX_RATIO):
+        if not providers:
+            raise ValueError("Kamida bitta LLM provayder kerak")
+        self.providers = list(providers)
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_ratio = hedge_max_ratio
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.unavailable = 0
+
+    def _next(self, tried):
+        for provider in self.providers:
+            if provider not in tried and provider.breaker.allow():
+                return provider
+        return None
+
+    def _hedge_delay(self, provider):
+        if not self.hedge or self.hedged >= self.hedge_max_ratio * self.requests:
+            return None
+        p95 = provider.stats_window.quantile(0.95, self.hedge_min_samples)
+        return None if p95 is None else max(p95, self.hedge_min_delay)
+
+    # Hedged so'rov uchun provayder (boshqasi bo'lmasa - ishlayotgan asosiy provayderning o'zi)
+    def _hedge_target(self, primary, tried):
+        backup = self._next(tried)
+        if backup is None and primary.breaker.state == "closed":
+            backup = primary
+        if backup is not None:
+            self.hedged += 1
+            LLM_HEDGES.inc(provider=backup.name)
+            tried.append(backup)
+        return backup
+
+    # Hamma so'rovlar xato bilan tugagach keyingi provayder (faqat provayder nosozligida)
+    def _failover(self, tried, error):
+        if not is_provider_failure(error):
+            return None
+        backup = self._next(tried)
+        if backup is not None:
+            self.failovers += 1
+            LLM_FAILOVERS.inc(provider=backup.name)
+            tried.append(backup)
+        return backup
+
+    async def complete(self, payload):
+        self.requests += 1
+        primary = self._next(())
+        if primary is None:
+            self.unavailable += 1
+            raise LLMError(503, "Barcha LLM provayderlari vaqtincha ishlamayapti")
+
+        tried = [primary]
+        tasks = {asyncio.create_task(primary.call(payload)): primary}
+        hedge_task = None
+        hedge_delay = self._hedge_delay(primary)
+        last_error = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Javob p95 dan kechikdi - qo'shimcha so'rov
+                    hedge_delay = None
+                    backup = self._hedge_target(primary, tried)
+                    if backup is not None:
+                        hedge_task = asyncio.create_task(backup.call(payload))
+                        tasks[hedge_task] = backup
+                    continue
+
+                winner = None
+                for task in done:
+                    tasks.pop(task)
+                    # Bir vaqtda tugaganlarning xatolari ham o'qiladi ("never retrieved" chiqmasligi uchun)
+                    error = task.exception()
+                    if error is not None:
+                        last_error = error
+                    elif winner is None:
+                        winner = task
+                if winner is not None:
+                    if winner is hedge_task:
+                        self.hedge_wins += 1
+                    return winner.result()
+
+                # Hamma so'rovlar xato bilan tugadi - keyingi provayderga o'tamiz
+                if not tasks:
+                    backup = self._failover(tried, last_error)
+                    if backup is None:
+                        break
+                    tasks[asyncio.create_task(backup.call(payload))] = backup
+                    hedge_delay = None
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise last_error
+
+    # Oqimli javob: complete() dagi kabi hedging va failover, lekin birinchi bo'lakkacha -
+    # birinchi bo'lagi oldin kelgan oqim olinadi. Javob boshlangach provayder almashtirilmaydi
+    # (matn ikki xil bo'lib qolmasligi uchun), shu sababli keyingi xatolar chaqiruvchiga uzatiladi
+    async def stream(self, payload):
+        self.requests += 1
+        primary = self._next(())
+        if primary is None:
+            self.unavailable += 1
+            raise LLMError(503, "Barcha LLM provayderlari vaqtincha ishlamayapti")
+
+        streams = {}
+
+        def start(provider):
+            generator = provider.stream(payload)
+            task = asyncio.create_task(_first_delta(generator))
+            streams[task] = generator
+            return task
+
+        tried = [primary]
+        start(primary)
+        hedge_task = None
+        hedge_delay = self._hedge_delay(primary)
+        last_error = None
+        winner = None
+        try:
+            while streams:
+                done, _ = await asyncio.wait(streams, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Birinchi bo'lak p95 dan kechikdi - qo'shimcha oqim
+                    hedge_delay = None
+                    backup = self._hedge_target(primary, tried)
+                    if backup is not None:
+                        hedge_task = start(backup)
+                    continue
+
+                for task in done:
+                    generator = streams.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        last_error = error
+                    elif winner is None:
+                        winner = task, generator
+                    else:
+                        await generator.aclose()
+                if winner is not None:
+                    break
+
+                if not streams:
+                    backup = self._failover(tried, last_error)
+                    if backup is None:
+                        break
+                    start(backup)
+                    hedge_delay = None
+        finally:
+            await self._discard(streams)
+
+        if winner is None:
+            raise last_error
+        task, generator = winner
+        if task is hedge_task:
+            self.hedge_wins += 1
+        try:
+            first = task.result()
+            if first is None:
+                return
+            yield first
+            async for delta in generator:
+                yield delta
+        finally:
+            await generator.aclose()
+
+    # Yutqazgan oqimlarni to'xtatish (Provider.stream breaker sinovini bo'shatadi)
+    @staticmethod
+    async def _discard(streams):
+        for task in streams:
+            task.cancel()
+        await asyncio.gather(*streams, return_exceptions=True)
+        for generator in streams.values():
+            await generator.aclose()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "unavailable": self.unavailable,
+        }
+
+
+# Sozlamalar bo'yicha router (kaliti berilgan provayderlar LLM_PROVIDERS tartibida)
+def build_router(openai_api_key=None, giga_token=None):
+    factories = {
+        "openai": lambda: OpenAIProvider(openai_api_key) if openai_api_key else None,
+        "gigachat": lambda: GigaChatProvider(giga_token) if giga_token else None,
+    }
+    providers = []
+    for name in LLM_PROVIDERS.split(","):
+        name = name.strip().lower()
+        if name not in factories:
+            if name:
+                print(f"Noma'lum LLM provayder: {name}")
+            continue
+        provider = factories[name]()
+        if provider is not None:
+            providers.append(provider)
+    return LLMRouter(providers)
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+
+from ratelimit import TokenBucket
+
+# Bir vaqtda ishlaydigan LLM so'rovlari soni
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Daqiqalik limitlar (provayder limitlaridan biroz pastroq qo'yiladi)
+LLM_RPM = float(os.getenv("LLM_RPM", "400"))
+LLM_TPM = float(os.getenv("LLM_TPM", "200000"))
+# Navbat shundan oshsa, yangi so'rovlar rad etiladi
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "200"))
+
+
+class SchedulerOverloaded(Exception):
+    pass
+
+
+class _Job:
+    __slots__ = ("user_id", "factory", "tokens", "future", "enqueued_at")
+
+    def __init__(self, user_id, factory, tokens, future):
+        self.user_id = user_id
+        self.factory = factory
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+# LLM so'rovlari rejalashtiruvchisi: umumiy limitlar + userlar orasida navbatma-navbat (round-robin)
+class LLMScheduler:
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, rpm=LLM_RPM, tpm=LLM_TPM, max_queue=LLM_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.requests = TokenBucket(rpm, per=60)
+        self.tokens = TokenBucket(tpm, per=60)
+        self.running = 0
+        self.rejected = 0
+        self.started = 0
+        self.completed = 0
+        self.avg_wait = 0.0
+        self.max_wait = 0.0
+        # user_id -> navbatdagi so'rovlar; tartib = round-robin navbati
+        self._queues = OrderedDict()
+        self._depth = 0
+        self._wake = None
+        self._task = None
+        self._active = set()
+
+    def depth(self):
+        return self._depth
+
+    # Navbatdagi o'rin (1 dan boshlab): har bir aylanishda har bir userdan bittadan so'rov olinadi
+    def position(self, job):
+        jobs = self._queues.get(job.user_id)
+        if not jobs or job not in jobs:
+            return 0
+        index = jobs.index(job)
+        ahead = index
+        before = True
+        for user_id, other in self._queues.items():
+            if user_id == job.user_id:
+                before = False
+            else:
+                ahead += min(len(other), index + 1 if before else index)
+        return ahead + 1
+
+    def stats(self):
+        return {
+            "queued": self._depth,
+            "running": self.running,
+            "users": len(self._queues),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait": round(self.avg_wait, 3),
+            "max_wait": round(self.max_wait, 3),
+        }
+
+    # So'rovni navbatga qo'yib, natijasini kutish
+    # on_queued(position) - so'rov darhol boshlanmasa chaqiriladi
+    async def run(self, user_id, factory, tokens=1000, on_queued=None):
+        if self._depth >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerOverloaded()
+
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+        job = _Job(user_id, factory, tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(user_id, deque()).append(job)
+        self._depth += 1
+        self._wake.set()
+
+        if on_queued is not None and (self.running >= self.max_concurrency or self._depth > 1):
+            try:
+                await on_queued(self.position(job))
+            except Exception as e:
+                print(f"Navbat haqida xabar berishda xatolik: {e}")
+
+        return await job.future
+
+    def _next_job(self):
+        while self._queues:
+            user_id, jobs = next(iter(self._queues.items()))
+            job = jobs.popleft()
+            self._depth -= 1
+            if jobs:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if not job.future.done():
+                return job
+        return None
+
+    async def _loop(self):
+        while True:
+            if self.running >= self.max_concurrency or not self._queues:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            job = self._next_job()
+            if job is None:
+                continue
+
+            # Daqiqalik limitlarga sig'guncha kutish
+            delay = max(self.requests.delay(1), self.tokens.delay(job.tokens))
+            if delay > 0:
+                await asyncio.sleep(delay)
+                # Kutish paytida so'rov egasi ketib qolgan bo'lsa, limit sarflanmaydi
+                if job.future.done():
+                    continue
+            self.requests.consume(1)
+            self.tokens.consume(job.tokens)
+
+            wait = time.monotonic() - job.enqueued_at
+            self.avg_wait = wait if self.started == 0 else self.avg_wait * 0.9 + wait * 0.1
+            self.max_wait = max(self.max_wait, wait)
+
+            self.started += 1
+            self.running += 1
+            task = asyncio.create_task(self._execute(job))
+            self._active.add(task)
+            task.add_done_callback(self._active.discard)
+
+    # So'rov egasi bekor qilinsa (user kutmay ketib qolsa), LLM so'rovi ham to'xtatiladi -
+    # o'rin va tokenlar boshqa userlarga bo'shaydi
+    async def _execute(self, job):
+        factory = asyncio.create_task(job.factory())
+
+        def abandon(future):
+            if future.cancelled():
+                factory.cancel()
+
+        job.future.add_done_callback(abandon)
+        try:
+            result = await factory
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            # Factory bekor qilinsa yoki BaseException ko'tarsa ham so'rov egasi abadiy kutib qolmaydi
+            if not job.future.done():
+                job.future.cancel()
+            job.future.remove_done_callback(abandon)
+            self.running -= 1
+            self.completed += 1
+            self._wake.set()
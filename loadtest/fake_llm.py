@@ -0,0 +1,143 @@
+# Yuklama testi uchun lokal chat-completions serverlari (OpenAI va GigaChat),
+# sozlanadigan kechikish, sekin javoblar ("dum") va xatolar bilan
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+ANSWER = (
+    "Depozit uchun foiz stavkasi yuqori va ishonchli bankni tanlang. "
+    "Jamg'armani bir nechta bankka bo'lib qo'yish xavfni kamaytiradi."
+)
+
+# Oqimli javobda birinchi bo'lak umumiy kechikishning shu qismida keladi, qolgani bo'laklarga taqsimlanadi
+FIRST_TOKEN_SHARE = 0.2
+
+
+class FakeOpenAI:
+    chat_path = "/v1/chat/completions"
+
+    def __init__(self, latency=0.5, jitter=0.1, error_rate=0.0, slow_rate=0.0, slow_latency=5.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Shu ulushdagi so'rovlar slow_latency soniya davom etadi (hedging'ni sinash uchun)
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        # True bo'lsa hamma so'rovlar 503 qaytaradi (provayder ishlamay qolishi)
+        self.down = False
+        self.requests = 0
+        self.errors = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self._random = random.Random(seed)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post(self.chat_path, self.handle_chat)
+        return app
+
+    def _delay(self):
+        if self._random.random() < self.slow_rate:
+            return self.slow_latency
+        return max(0.0, self._random.uniform(self.latency - self.jitter, self.latency + self.jitter))
+
+    def _authorized(self, request):
+        return True
+
+    # SSE: "data: {chunk}" qatorlari va oxirida "data: [DONE]"
+    async def _stream(self, request, payload, duration):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        words = ANSWER.split(" ")
+        pieces = [" ".join(words[i:i + 2]) + " " for i in range(0, len(words), 2)]
+        pieces[-1] = pieces[-1].rstrip()
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(duration / len(pieces))
+            chunk = {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    def stats(self):
+        return {"requests": self.requests, "errors": self.errors, "max_inflight": self.max_inflight}
+
+    async def handle_chat(self, request):
+        payload = await request.json()
+        if not self._authorized(request):
+            return web.json_response({"status": 401, "message": "Unauthorized"}, status=401)
+        self.requests += 1
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            stream = bool(payload.get("stream"))
+            delay = self._delay()
+            await asyncio.sleep(delay * FIRST_TOKEN_SHARE if stream else delay)
+            if self.down or self._random.random() < self.error_rate:
+                self.errors += 1
+                return web.json_response({"error": {"message": "fake error"}}, status=500)
+            if stream:
+                return await self._stream(request, payload, delay * (1 - FIRST_TOKEN_SHARE))
+
+            prompt_tokens = sum(len(str(message.get("content", ""))) for message in payload.get("messages", [])) // 4
+            completion_tokens = len(ANSWER) // 4
+            return web.json_response({
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+        finally:
+            self.inflight -= 1
+
+
+# GigaChat: OAuth (Basic authorization key -> 30 daqiqalik access token) va chat-completions
+class FakeGigaChat(FakeOpenAI):
+    chat_path = "/api/v1/chat/completions"
+
+    def __init__(self, *args, token_ttl=1800, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token_ttl = token_ttl
+        self.tokens_issued = 0
+        self._tokens = {}
+
+    def app(self):
+        app = super().app()
+        app.router.add_post("/api/v2/oauth", self.handle_oauth)
+        return app
+
+    async def handle_oauth(self, request):
+        form = await request.post()
+        if not request.headers.get("Authorization", "").startswith("Basic ") or not request.headers.get("RqUID"):
+            return web.json_response({"code": 6, "message": "credentials doesn't match db data"}, status=401)
+        if not form.get("scope"):
+            return web.json_response({"code": 7, "message": "scope is empty"}, status=400)
+        token = uuid.uuid4().hex
+        expires_at = time.time() + self.token_ttl
+        self._tokens[token] = expires_at
+        self.tokens_issued += 1
+        return web.json_response({"access_token": token, "expires_at": int(expires_at * 1000)})
+
+    def _authorized(self, request):
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        return self._tokens.get(token, 0) > time.time()
+
+    def stats(self):
+        return {**super().stats(), "tokens_issued": self.tokens_issued}
@@ -0,0 +1,246 @@
+# Yuklama testi uchun lokal Bot API server (getUpdates, sendMessage, editMessageText, getChatMember ...)
+import asyncio
+import json
+import time
+from collections import Counter, deque
+
+from aiohttp import web
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "FinAI", "username": "finai_test_bot"}
+
+
+def user_object(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "language_code": "uz"}
+
+
+class _Chat:
+    __slots__ = ("messages", "waiters", "sends")
+
+    def __init__(self):
+        self.messages = []
+        self.waiters = []
+        self.sends = deque()
+
+
+class FakeTelegram:
+    # chat_limit - chatga soniyasiga ruxsat etilgan xabarlar (oshsa 429 RetryAfter qaytadi)
+    def __init__(self, latency=0.0, record_path=None, chat_limit=None):
+        self.latency = latency
+        self.chat_limit = chat_limit
+        self.calls = Counter()
+        self.chats = {}
+        self.ready = asyncio.Event()
+        self._pending = deque()
+        self._new_update = asyncio.Event()
+        self._update_id = 0
+        self._message_id = 0
+        self._started = time.monotonic()
+        self._record = open(record_path, "w", encoding="utf-8") if record_path else None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/bot{token}/{method}", self.handle)
+        return app
+
+    def close(self):
+        if self._record is not None:
+            self._record.close()
+
+    # --- update'larni yaratish ---
+
+    def push(self, update):
+        self._update_id += 1
+        update = {"update_id": self._update_id, **update}
+        self._pending.append(update)
+        self._new_update.set()
+        if self._record is not None:
+            self._record.write(json.dumps({"t": time.monotonic() - self._started, "update": update}, ensure_ascii=False) + "\n")
+        return update
+
+    def push_message(self, user_id, text):
+        self._message_id += 1
+        return self.push({"message": {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user_object(user_id),
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}
+               if text.startswith("/") else {}),
+        }})
+
+    def push_callback(self, user_id, data):
+        return self.push({"callback_query": {
+            "id": str(self._update_id + 1),
+            "from": user_object(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": self._message_with_button(user_id, data),
+        }})
+
+    # Oxirgi bot xabarlaridagi matni berilgan tugmaning callback_data'si
+    def find_button(self, chat_id, text):
+        chat = self.chats.get(chat_id)
+        for message in reversed(chat.messages if chat else []):
+            markup = message.get("reply_markup") or {}
+            for row in markup.get("inline_keyboard", []):
+                for button in row:
+                    if button.get("text") == text:
+                        return button.get("callback_data")
+        return None
+
+    # Callback tugmasi bor oxirgi bot xabari
+    def _message_with_button(self, chat_id, data):
+        chat = self.chats.get(chat_id)
+        messages = chat.messages if chat else []
+        for message in reversed(messages):
+            markup = message.get("reply_markup") or {}
+            for row in markup.get("inline_keyboard", []):
+                if any(button.get("callback_data") == data for button in row):
+                    return self._message_object(message)
+        if messages:
+            return self._message_object(messages[-1])
+        self._message_id += 1
+        return {"message_id": self._message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER, "text": "-"}
+
+    # --- bot javoblarini kutish ---
+
+    def message_count(self, chat_id):
+        chat = self.chats.get(chat_id)
+        return len(chat.messages) if chat else 0
+
+    async def wait_for(self, chat_id, predicate, start=0, timeout=30.0):
+        chat = self.chats.setdefault(chat_id, _Chat())
+        for message in chat.messages[start:]:
+            if predicate(message):
+                return message
+        future = asyncio.get_running_loop().create_future()
+        waiter = (predicate, future)
+        chat.waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if waiter in chat.waiters:
+                chat.waiters.remove(waiter)
+
+    def _deliver(self, chat_id, message):
+        chat = self.chats.setdefault(chat_id, _Chat())
+        chat.messages.append(message)
+        for waiter in list(chat.waiters):
+            predicate, future = waiter
+            if not future.done() and predicate(message):
+                future.set_result(message)
+                chat.waiters.remove(waiter)
+
+    # --- Bot API metodlari ---
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.chat_limit and method in ("sendMessage", "editMessageText") and self._flooded(params):
+            self.calls["429"] += 1
+            return web.json_response({
+                "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1},
+            })
+
+        handler = getattr(self, "api_" + method[0].lower() + method[1:], None)
+        if handler is None:
+            return web.json_response({"ok": True, "result": True})
+        return web.json_response({"ok": True, "result": await handler(params)})
+
+    # Oxirgi 1 soniyadagi xabarlar soni chegaradan oshdimi
+    def _flooded(self, params):
+        chat = self.chats.setdefault(int(params["chat_id"]), _Chat())
+        now = time.monotonic()
+        while chat.sends and now - chat.sends[0] >= 1.0:
+            chat.sends.popleft()
+        if len(chat.sends) >= self.chat_limit:
+            return True
+        chat.sends.append(now)
+        return False
+
+    @staticmethod
+    def _json_param(params, name):
+        value = params.get(name)
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        return value
+
+    def _message_object(self, message):
+        result = {
+            "message_id": message["message_id"],
+            "date": int(message["time"]),
+            "chat": {"id": message["chat_id"], "type": "private"},
+            "from": BOT_USER,
+            "text": message["text"],
+        }
+        if message.get("reply_markup"):
+            result["reply_markup"] = message["reply_markup"]
+        return result
+
+    def _record_outgoing(self, method, params, message_id=None):
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        chat_id = int(params["chat_id"])
+        message = {
+            "method": method,
+            "message_id": int(message_id),
+            "chat_id": chat_id,
+            "text": params.get("text", ""),
+            "reply_markup": self._json_param(params, "reply_markup"),
+            "time": time.time(),
+            "received_at": time.monotonic(),
+        }
+        self._deliver(chat_id, message)
+        return self._message_object(message)
+
+    async def api_getMe(self, params):
+        self.ready.set()
+        return BOT_USER
+
+    async def api_getUpdates(self, params):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        while self._pending and self._pending[0]["update_id"] < offset:
+            self._pending.popleft()
+        if not self._pending and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), min(timeout, 1.0))
+            except asyncio.TimeoutError:
+                pass
+        return [update for _, update in zip(range(limit), self._pending)]
+
+    async def api_sendMessage(self, params):
+        return self._record_outgoing("sendMessage", params)
+
+    async def api_editMessageText(self, params):
+        return self._record_outgoing("editMessageText", params, params.get("message_id"))
+
+    async def api_getChatMember(self, params):
+        return {"status": "member", "user": user_object(int(params["user_id"]))}
+
+    async def api_answerCallbackQuery(self, params):
+        return True
+
+    async def api_deleteWebhook(self, params):
+        return True
+
+    async def api_setWebhook(self, params):
+        return True
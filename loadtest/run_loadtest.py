@@ -0,0 +1,340 @@
+# Lokal soxta Telegram, OpenAI va GigaChat serverlari bilan haqiqiy dp ustida yuklama testi
+#
+# Ishga tushirish:
+#   python loadtest/run_loadtest.py --users 2000 --concurrency 300 --llm-latency 0.8
+#   python loadtest/run_loadtest.py --flows profile,ai --llm-slow-rate 0.05 --openai-down-after 10
+#   python loadtest/run_loadtest.py --users 500 --record updates.jsonl
+#   python loadtest/run_loadtest.py --replay updates.jsonl --speed 2
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path[:0] = [ROOT, HERE]
+
+from fake_llm import FakeGigaChat, FakeOpenAI  # noqa: E402
+from fake_telegram import FakeTelegram  # noqa: E402
+
+QUESTIONS = [
+    "Qaysi bankda depozit ochsam yaxshi?",
+    "qaysi bankda depozit ochsam yaxshi",
+    "Kredit olishim kerakmi yoki jamg'arishim kerakmi?",
+    "10 million so'mni qayerga investitsiya qilsam bo'ladi?",
+    "Ipoteka uchun qancha boshlang'ich to'lov kerak?",
+    "Oylik daromadimning qancha qismini jamg'arishim kerak?",
+]
+
+
+def contains(text):
+    return lambda message: text in message["text"]
+
+
+def not_waiting(message):
+    return not message["text"].startswith("⏳")
+
+
+# Oqimli javobning yakuniy ko'rinishi (yozilmoqda belgisisiz)
+def answer_complete(message):
+    return not_waiting(message) and not message["text"].endswith("▌")
+
+
+# Har bir qadam: (nomi, turi, qiymati, kutilgan javob sharti).
+# "wait" turi hech narsa yubormaydi - oldingi qadamdan beri o'tgan vaqt o'lchanadi
+def flow_steps(flow, rng, unique_questions):
+    if flow == "profile":
+        return [
+            ("start", "message", "/start", contains("Yoshingizni kiriting")),
+            ("profile_age", "message", str(rng.randint(18, 70)), contains("Kasbingiz")),
+            ("profile_job", "message", rng.choice(["dasturchi", "o'qituvchi", "talaba"]), contains("daromadingiz")),
+            ("profile_income", "message", f"{rng.randint(1, 30)} mln", contains("Qiziqishlaringiz")),
+            ("profile_interest", "message", rng.choice(["investitsiya", "depozit"]), contains("biznesingiz")),
+            ("profile_business", "message", rng.choice(["ha", "yo'q"]), contains("menyudan")),
+        ]
+    if flow == "credit":
+        return [
+            ("credit_start", "callback", "credit_graph", contains("Kredit miqdorini")),
+            ("credit_amount", "message", str(rng.randrange(10, 500) * 1000000), contains("foiz stavkasini")),
+            ("credit_rate", "message", str(round(rng.uniform(10, 30), 1)), contains("muddatini")),
+            ("credit_term", "message", str(rng.choice([12, 36, 120, 360])), contains("sanani")),
+            ("credit_finish", "message", "01.10.2024", contains("Kredit grafigi saqlandi")),
+            ("credit_next_page", "button", "▶", contains("2/")),
+        ]
+    if flow == "deposit":
+        return [
+            ("deposit_start", "callback", "deposit_calc", contains("Depozit summasini")),
+            ("deposit_amount", "message", str(rng.randrange(1, 100) * 1000000), contains("muddatini kiriting")),
+            ("deposit_term", "message", str(rng.randint(1, 60)), contains("banklardan birini")),
+            ("deposit_bank", "callback", "bank_kapitalbank", contains("kapitalizatsiyasi")),
+            ("deposit_capitalization", "callback", rng.choice(["cap_yes", "cap_no"]), contains("solishtirishni")),
+        ]
+    if flow == "ai":
+        question = rng.choice(QUESTIONS)
+        if unique_questions:
+            question = f"{question} #{rng.randrange(10 ** 9)}"
+        return [
+            # Birinchi mazmun (oqimda - birinchi bo'lak) va to'liq javob
+            ("ai_question", "message", question, not_waiting),
+            ("ai_answer_done", "wait", None, answer_complete),
+        ]
+    raise ValueError(f"Noma'lum oqim: {flow}")
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.timeouts = defaultdict(int)
+        self.updates = 0
+
+    def add(self, step, latency):
+        self.latencies[step].append(latency)
+
+    @staticmethod
+    def percentile(values, q):
+        values = sorted(values)
+        if not values:
+            return None
+        index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+        return values[index]
+
+    def summary(self, elapsed):
+        rows = {}
+        all_values = []
+        for step, values in sorted(self.latencies.items()):
+            all_values += values
+            rows[step] = self._row(values, step)
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "updates": self.updates,
+            "throughput_updates_per_s": round(self.updates / elapsed, 2) if elapsed else None,
+            "overall": self._row(all_values),
+            "steps": rows,
+        }
+
+    def _row(self, values, step=None):
+        row = {"count": len(values)}
+        for q in (50, 95, 99):
+            value = self.percentile(values, q)
+            row[f"p{q}_ms"] = round(value * 1000, 2) if value is not None else None
+        if step is not None:
+            row["errors"] = self.errors.get(step, 0)
+            row["timeouts"] = self.timeouts.get(step, 0)
+        return row
+
+
+# Bitta simulyatsiya qilingan user: har bir qadamda javobni kutib, keyingisiga o'tadi
+async def simulate_user(telegram, user_id, flows, stats, rng, timeout, unique_questions):
+    for flow in flows:
+        for step, kind, value, expect in flow_steps(flow, rng, unique_questions):
+            if kind != "wait":
+                start_index = telegram.message_count(user_id)
+                started = time.monotonic()
+                stats.updates += 1
+            if kind == "message":
+                telegram.push_message(user_id, value)
+            elif kind == "button":
+                data = telegram.find_button(user_id, value)
+                if data is None:
+                    continue
+                telegram.push_callback(user_id, data)
+            elif kind == "callback":
+                telegram.push_callback(user_id, value)
+            try:
+                message = await telegram.wait_for(user_id, expect, start=start_index, timeout=timeout)
+            except asyncio.TimeoutError:
+                stats.timeouts[step] += 1
+                return
+            stats.add(step, message["received_at"] - started)
+            if message["text"].startswith(("❌", "⚠️")):
+                stats.errors[step] += 1
+
+
+# Yozib olingan update oqimini qayta yuborish (javobgacha bo'lgan vaqt o'lchanadi)
+async def replay(telegram, path, stats, speed, timeout):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    async def send(record):
+        update = dict(record["update"])
+        update.pop("update_id", None)
+        event = update.get("message") or update.get("callback_query")
+        chat_id = event["from"]["id"]
+        step = "message" if "message" in update else "callback_query"
+        start_index = telegram.message_count(chat_id)
+        started = time.monotonic()
+        telegram.push(update)
+        stats.updates += 1
+        try:
+            message = await telegram.wait_for(chat_id, lambda m: True, start=start_index, timeout=timeout)
+        except asyncio.TimeoutError:
+            stats.timeouts[step] += 1
+            return
+        stats.add(step, message["received_at"] - started)
+
+    tasks = []
+    began = time.monotonic()
+    for record in records:
+        delay = record["t"] / speed - (time.monotonic() - began)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(record)))
+    await asyncio.gather(*tasks)
+
+
+async def run(args):
+    from aiohttp import web
+
+    import api2
+
+    telegram = FakeTelegram(latency=args.tg_latency, record_path=args.record, chat_limit=args.tg_chat_limit)
+    llm = FakeOpenAI(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.llm_error_rate,
+                     slow_rate=args.llm_slow_rate, slow_latency=args.llm_slow_latency, seed=args.seed)
+    giga = FakeGigaChat(latency=args.giga_latency, jitter=args.llm_jitter, error_rate=args.giga_error_rate,
+                        seed=args.seed + 1)
+
+    runners = []
+    for app, port in ((telegram.app(), args.tg_port), (llm.app(), args.llm_port), (giga.app(), args.giga_port)):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        runners.append(runner)
+
+    polling = asyncio.create_task(api2.dp.start_polling(api2.bot, handle_signals=False))
+    await asyncio.wait_for(telegram.ready.wait(), 30)
+
+    # Testning o'rtasida OpenAI ishlamay qoladi (GigaChat'ga o'tish va circuit breaker'ni sinash uchun)
+    async def openai_outage():
+        await asyncio.sleep(args.openai_down_after)
+        llm.down = True
+        print(f"OpenAI fake serveri o'chirildi ({args.openai_down_after}s)")
+
+    outage = asyncio.create_task(openai_outage()) if args.openai_down_after is not None else None
+
+    stats = Stats()
+    rng = random.Random(args.seed)
+    started = time.monotonic()
+    if args.replay:
+        await replay(telegram, args.replay, stats, args.speed, args.timeout)
+    else:
+        limit = asyncio.Semaphore(args.concurrency)
+        flows = args.flows.split(",")
+
+        async def one(user_id):
+            async with limit:
+                await simulate_user(telegram, user_id, flows, stats, random.Random(rng.random()),
+                                    args.timeout, args.unique_questions)
+
+        await asyncio.gather(*(one(5_000_000 + i) for i in range(args.users)))
+    elapsed = time.monotonic() - started
+    if outage is not None:
+        outage.cancel()
+    router_stats = {"router": api2.llm_router.stats()}
+    router_stats.update({provider.name: provider.stats() for provider in api2.llm_router.providers})
+
+    # Bot metrikalarini saqlash (/metrics endpoint)
+    if args.metrics_output:
+        from aiohttp import ClientSession
+
+        async with ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{args.metrics_port}/metrics") as response:
+                with open(args.metrics_output, "w", encoding="utf-8") as f:
+                    f.write(await response.text())
+
+    await api2.dp.stop_polling()
+    await polling
+    for runner in runners:
+        await runner.cleanup()
+    telegram.close()
+
+    report = stats.summary(elapsed)
+    report["bot_api_calls"] = dict(telegram.calls)
+    report["llm"] = llm.stats()
+    report["gigachat"] = giga.stats()
+    report["llm_router"] = router_stats
+    report["config"] = {key: value for key, value in vars(args).items()}
+    return report
+
+
+def print_report(report):
+    print(f"\nUpdate'lar: {report['updates']}, vaqt: {report['elapsed_s']}s, "
+          f"o'tkazuvchanlik: {report['throughput_updates_per_s']} update/s")
+    print(f"{'qadam':<26} {'soni':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'xato':>6} {'timeout':>8}")
+    for step, row in list(report["steps"].items()) + [("JAMI", report["overall"])]:
+        print(f"{step:<26} {row['count']:>7} {row['p50_ms']!s:>10} {row['p95_ms']!s:>10} {row['p99_ms']!s:>10} "
+              f"{row.get('errors', ''):>6} {row.get('timeouts', ''):>8}")
+    print(f"Bot API chaqiruvlari: {report['bot_api_calls']}")
+    print(f"LLM: {report['llm']}")
+    print(f"GigaChat: {report['gigachat']}")
+    print(f"LLM router: {report['llm_router']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="finai yuklama testi")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--flows", default="profile,credit,deposit,ai")
+    parser.add_argument("--unique-questions", action="store_true", help="AI savollari takrorlanmasin")
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--llm-jitter", type=float, default=0.3)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="sekin LLM javoblari ulushi (hedging)")
+    parser.add_argument("--llm-slow-latency", type=float, default=5.0)
+    parser.add_argument("--openai-down-after", type=float, help="shuncha soniyadan keyin OpenAI 503 qaytaradi")
+    parser.add_argument("--giga-latency", type=float, default=1.0)
+    parser.add_argument("--giga-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-providers", default="openai,gigachat")
+    parser.add_argument("--tg-latency", type=float, default=0.0)
+    parser.add_argument("--tg-chat-limit", type=int, help="chatga soniyasiga xabarlar (oshsa 429)")
+    parser.add_argument("--send-chat-rate", type=float,
+                        help="botning chatga yuborish tezligi (standart 1/s; simulyatsiya userlari tezroq yozadi)")
+    parser.add_argument("--send-global-rate", type=float, help="botning umumiy yuborish tezligi (standart 30/s)")
+    parser.add_argument("--tg-port", type=int, default=8081)
+    parser.add_argument("--llm-port", type=int, default=8082)
+    parser.add_argument("--giga-port", type=int, default=8084)
+    parser.add_argument("--metrics-port", type=int, default=8083)
+    parser.add_argument("--metrics-output", help="bot metrikalarini faylga yozish")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--record", help="yuborilgan update'larni JSONL faylga yozish")
+    parser.add_argument("--replay", help="JSONL fayldagi update'larni qayta yuborish")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay tezligi koeffitsienti")
+    parser.add_argument("--output", default="loadtest_report.json")
+    args = parser.parse_args()
+
+    # Bot faqat lokal serverlar bilan ishlaydi, ma'lumotlar vaqtinchalik papkada
+    data_dir = tempfile.mkdtemp(prefix="finai-loadtest-")
+    os.environ.update({
+        "API_TOKEN": "123456:LOADTEST",
+        "GIGA_TOKEN": "loadtest",
+        "OPENAI_API_KEY": "loadtest",
+        "TELEGRAM_API_SERVER": f"http://127.0.0.1:{args.tg_port}",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.llm_port}/v1",
+        "GIGA_API_BASE": f"http://127.0.0.1:{args.giga_port}/api/v1",
+        "GIGA_AUTH_URL": f"http://127.0.0.1:{args.giga_port}/api/v2/oauth",
+        "LLM_PROVIDERS": args.llm_providers,
+        "USER_DB_FILE": os.path.join(data_dir, "user_data.db"),
+        "FSM_DB_FILE": os.path.join(data_dir, "fsm_state.db"),
+        "AI_CACHE_FILE": "",
+        "METRICS_PORT": str(args.metrics_port),
+    })
+    if args.send_chat_rate:
+        os.environ["SEND_CHAT_RATE"] = str(args.send_chat_rate)
+    if args.send_global_rate:
+        os.environ["SEND_GLOBAL_RATE"] = str(args.send_global_rate)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Hisobot {args.output} fayliga yozildi")
+
+
+if __name__ == "__main__":
+    main()
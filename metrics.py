@@ -0,0 +1,270 @@
+import bisect
+import os
+import time
+from collections import Counter as _Tally
+from contextvars import ContextVar
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+# Prometheus endpoint (faqat lokal). 0 - o'chirilgan
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += self._samples()
+        return lines
+
+    def _samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+# Qiymati o'rnatiladigan yoki har bir scrape paytida funksiyadan olinadigan gauge
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+        self._collectors = []
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    # func() -> son
+    def track(self, func, **labels):
+        self._functions[self._key(labels)] = func
+
+    # func() -> {(label qiymatlari, ...): son}
+    def track_many(self, func):
+        self._collectors.append(func)
+
+    def _samples(self):
+        values = dict(self._values)
+        for key, func in self._functions.items():
+            try:
+                values[key] = func()
+            except Exception as e:
+                print(f"{self.name} metrikasini olishda xatolik: {e}")
+        for func in self._collectors:
+            try:
+                values.update(func())
+            except Exception as e:
+                print(f"{self.name} metrikasini olishda xatolik: {e}")
+        return [
+            f"{self.name}{_format_labels(self.labelnames, tuple(map(str, key)))} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            # [har bir bucket uchun soni (+Inf bilan), yig'indi, jami soni]
+            series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# Prometheus text formatida barcha metrikalar
+def render():
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+UPDATE_LATENCY = Histogram("finai_update_seconds", "Update'ni to'liq qayta ishlash vaqti", ["event"])
+HANDLER_LATENCY = Histogram("finai_handler_seconds", "Handler bajarilish vaqti", ["handler", "event"])
+HANDLER_CALLS = Counter("finai_handler_calls_total", "Handler chaqiruvlari", ["handler", "event", "result"])
+BOT_API_LATENCY = Histogram("finai_bot_api_seconds", "Bot API so'rovlari vaqti", ["method"])
+BOT_API_CALLS = Counter("finai_bot_api_calls_total", "Bot API so'rovlari", ["method", "result"])
+BOT_API_PER_UPDATE = Histogram("finai_bot_api_calls_per_update", "Bitta update uchun Bot API so'rovlari soni",
+                               ["method"], buckets=COUNT_BUCKETS)
+LLM_LATENCY = Histogram("finai_llm_request_seconds", "LLM HTTP so'rovlari vaqti (har bir urinish)", ["provider", "status"])
+LLM_REQUESTS = Counter("finai_llm_requests_total", "LLM HTTP so'rovlari (har bir urinish)", ["provider", "status"])
+LLM_RETRIES = Counter("finai_llm_retries_total", "LLM so'rovlarini qayta urinishlar", ["provider"])
+LLM_FIRST_TOKEN = Histogram("finai_llm_first_token_seconds", "Oqimli javobning birinchi bo'lagigacha vaqt", ["provider"])
+STORE_FLUSH_LATENCY = Histogram("finai_store_flush_seconds", "Bazaga yozish (flush) vaqti", ["store"])
+STORE_FLUSH_ROWS = Counter("finai_store_flush_rows_total", "Bazaga yozilgan qatorlar", ["store"])
+FSM_STATES = Gauge("finai_fsm_states", "Xotiradagi FSM holatlari soni", ["state"])
+QUEUE_DEPTH = Gauge("finai_queue_depth", "Navbatlar uzunligi", ["queue"])
+COMPONENT_STATS = Gauge("finai_component_stats", "Kesh va navbatlarning stats() qiymatlari", ["component", "field"])
+
+# Joriy update davomida qilingan Bot API so'rovlari (metod -> soni)
+_update_calls = ContextVar("finai_update_calls", default=None)
+
+
+# Update darajasidagi middleware: umumiy vaqt va har bir update uchun Bot API so'rovlari soni
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        calls = _Tally()
+        token = _update_calls.set(calls)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_LATENCY.observe(time.perf_counter() - started, event=event.event_type)
+            _update_calls.reset(token)
+            for method, count in calls.items():
+                BOT_API_PER_UPDATE.observe(count, method=method)
+
+
+# Handler darajasidagi (inner) middleware: qaysi handler qancha vaqt olgani
+class HandlerMetricsMiddleware(BaseMiddleware):
+    def __init__(self, event_type):
+        self.event_type = event_type
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        started = time.perf_counter()
+        result = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            result = "error"
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, handler=name, event=self.event_type)
+            HANDLER_CALLS.inc(handler=name, event=self.event_type, result=result)
+
+
+# Bot sessiyasi middleware'i: har bir Bot API metodining vaqti va natijasi
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        calls = _update_calls.get()
+        if calls is not None:
+            calls[name] += 1
+        started = time.perf_counter()
+        result = "ok"
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            result = type(e).__name__
+            raise
+        finally:
+            BOT_API_LATENCY.observe(time.perf_counter() - started, method=name)
+            BOT_API_CALLS.inc(method=name, result=result)
+
+
+# Dispatcher va bot'ga middleware'larni ulash
+def instrument(dp, bot):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    for event_type in ("message", "callback_query", "chat_member"):
+        dp.observers[event_type].middleware(HandlerMetricsMiddleware(event_type))
+    bot.session.middleware(BotApiMetricsMiddleware())
+
+
+# stats() lug'atining sonli maydonlarini label'larga aylantirish
+def track_stats(name, stats):
+    COMPONENT_STATS.track_many(lambda: {
+        (name, field): value for field, value in stats().items()
+        if isinstance(value, (int, float))
+    })
+
+
+async def handle_metrics(request):
+    return web.Response(body=render().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+# Shard worker'lari har biri o'z portida ishlaydi (METRICS_PORT + 1 + index)
+def metrics_port():
+    shard_index = os.getenv("SHARD_INDEX")
+    if not METRICS_PORT or shard_index is None:
+        return METRICS_PORT
+    return METRICS_PORT + 1 + int(shard_index)
+
+
+# Lokal /metrics serverini ishga tushirish
+async def start_server(host=METRICS_HOST, port=None):
+    port = metrics_port() if port is None else port
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"Metrikalar serverini {host}:{port} da ochib bo'lmadi: {e}")
+        await runner.cleanup()
+        return None
+    print(f"Metrikalar http://{host}:{port}/metrics da")
+    return runner
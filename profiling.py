@@ -0,0 +1,177 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+
+from aiogram import BaseMiddleware
+
+from metrics import Counter, Histogram
+
+# Event loop bloklanishini kuzatish
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.05"))
+
+# Profil fayllari papkasi va standart update soni
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_UPDATES = int(os.getenv("PROFILE_UPDATES", "100"))
+# Qaysi ulushdagi update'lar profillanadi (1.0 - hammasi)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+
+LOOP_LAG = Histogram("finai_loop_lag_seconds", "Event loop kechikishi",
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_STALLS = Counter("finai_loop_stalls_total", "Chegaradan uzoq bloklanishlar")
+
+
+# Event loop kechikishini o'lchovchi monitor:
+# loop ichidagi vazifa "yurak urishi"ni yangilaydi, alohida thread esa u to'xtab qolganini sezsa
+# loop thread'ining joriy stack'ini log'ga yozadi (bloklagan kodni topish uchun)
+class LoopMonitor:
+    def __init__(self, threshold=LOOP_LAG_THRESHOLD, interval=LOOP_LAG_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.observe(lag)
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat
+            if blocked < self.threshold + self.interval or reported == heartbeat:
+                continue
+            # Har bir bloklanish uchun stack faqat bir marta yoziladi
+            reported = heartbeat
+            self.stalls += 1
+            LOOP_STALLS.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(stack topilmadi)"
+            print(f"⚠️ Event loop {blocked:.3f}s dan beri bloklangan. Joriy stack:\n{stack}")
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._thread.start()
+
+    async def close(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def stats(self):
+        return {"max_lag": round(self.max_lag, 4), "stalls": self.stalls, "threshold": self.threshold}
+
+
+# Keyingi N ta update uchun cProfile va tracemalloc yig'uvchi middleware
+# Bir vaqtda faqat bitta cProfile faol bo'la oladi, shuning uchun profil
+# kamida bitta tanlangan update ishlayotgan paytda yoqiq turadi
+class UpdateProfiler(BaseMiddleware):
+    def __init__(self, directory=PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.remaining = 0
+        self.captured = 0
+        self.last_path = None
+        self._active = 0
+        self._profile = None
+        self._on_done = None
+        # tracemalloc shu profiler tomonidan yoqilganmi (operator yoqqan kuzatuv to'xtatilmaydi)
+        self._tracing = False
+
+    @property
+    def armed(self):
+        return self._profile is not None
+
+    # Profillashni yoqish; on_done(path) natija fayli yozilgandan keyin chaqiriladi
+    def arm(self, updates=PROFILE_UPDATES, on_done=None):
+        if self.armed:
+            return False
+        self.remaining = updates
+        self.captured = 0
+        self._on_done = on_done
+        self._profile = cProfile.Profile()
+        self._tracing = not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start(10)
+        print(f"Profillash yoqildi: keyingi {updates} ta update")
+        return True
+
+    async def __call__(self, handler, event, data):
+        if self.remaining <= 0 or random.random() >= self.sample_rate:
+            return await handler(event, data)
+
+        self.remaining -= 1
+        profile = self._profile
+        if self._active == 0:
+            profile.enable()
+        self._active += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self._active -= 1
+            self.captured += 1
+            if self._active == 0:
+                profile.disable()
+                if self.remaining <= 0:
+                    await self._finish()
+
+    async def _finish(self):
+        profile, self._profile = self._profile, None
+        snapshot = tracemalloc.take_snapshot()
+        if self._tracing:
+            self._tracing = False
+            tracemalloc.stop()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(self.directory, f"profile-{stamp}")
+        await asyncio.to_thread(self._write, profile, snapshot, base)
+        self.last_path = base + ".prof"
+        print(f"Profil yozildi: {self.last_path} ({self.captured} ta update)")
+        on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            await on_done(self.last_path)
+
+    def _write(self, profile, snapshot, base):
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(base + ".prof")
+
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(40)
+        text.write("\n=== tracemalloc: eng ko'p xotira ajratgan joylar ===\n")
+        for stat in snapshot.statistics("lineno")[:30]:
+            text.write(f"{stat}\n")
+        with open(base + ".txt", 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
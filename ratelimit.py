@@ -0,0 +1,36 @@
+import time
+
+
+# Token bucket: "rate" ta token "per" soniyada to'ladi, sig'imi "capacity"
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate, per=1.0, capacity=None):
+        self.rate = rate / per
+        self.capacity = rate if capacity is None else capacity
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    # Kerakli tokenlar to'lishigacha qolgan vaqt (soniyalarda)
+    def delay(self, amount=1.0):
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount=1.0):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    # Token yetarli bo'lsa olish, aks holda False
+    def try_consume(self, amount=1.0):
+        if self.delay(amount) > 0:
+            return False
+        self.consume(amount)
+        return True
@@ -0,0 +1,207 @@
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from metrics import Counter, Histogram
+from ratelimit import TokenBucket
+from ttlcache import TTLCache
+
+# Telegram cheklovlari: butun bot uchun ~30 xabar/s, shaxsiy chatga ~1 xabar/s,
+# guruhga ~20 xabar/daqiqa. Ketma-ket 2-3 ta javob kechikmasligi uchun kichik "burst" ruxsat
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", "20"))  # daqiqasiga
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+# Shuncha soniya ichida shuncha turli chatga RetryAfter kelsa, bu butun bot limiti deb hisoblanadi
+# va hamma chatlar pauza qilinadi (bitta chatning 429 xatosi faqat o'sha chatni to'xtatadi)
+SEND_GLOBAL_PAUSE_CHATS = int(os.getenv("SEND_GLOBAL_PAUSE_CHATS", "3"))
+SEND_GLOBAL_PAUSE_WINDOW = float(os.getenv("SEND_GLOBAL_PAUSE_WINDOW", "1.0"))
+# Faol bo'lmagan chatlarning bucket'lari shuncha vaqt saqlanadi
+SEND_BUCKET_TTL = float(os.getenv("SEND_BUCKET_TTL", "120"))
+
+# Navbat orqali yuboriladigan metodlar (qolganlari, masalan getUpdates, to'g'ridan-to'g'ri ketadi)
+SEND_METHODS = frozenset({
+    "sendMessage", "editMessageText", "editMessageReplyMarkup", "editMessageCaption",
+    "sendPhoto", "sendDocument", "sendAnimation", "sendVideo", "sendAudio", "sendVoice",
+    "sendSticker", "sendMediaGroup", "sendLocation", "sendContact", "sendPoll",
+    "copyMessage", "forwardMessage", "deleteMessage",
+})
+
+SEND_QUEUE_LATENCY = Histogram("finai_send_queue_seconds", "Xabarning yuborish navbatida kutgan vaqti", ["method"])
+SEND_RETRIES = Counter("finai_send_retry_after_total", "RetryAfter (429) sababli qayta yuborishlar")
+
+
+class _Job:
+    __slots__ = ("bot", "method", "make_request", "future", "context", "enqueued_at")
+
+    def __init__(self, bot, method, make_request, future):
+        self.bot = bot
+        self.method = method
+        self.make_request = make_request
+        self.future = future
+        # So'rov chaqiruvchining kontekstida bajariladi (metrikalar to'g'ri update'ga yoziladi)
+        self.context = contextvars.copy_context()
+        self.enqueued_at = time.monotonic()
+
+
+# Chiquvchi xabarlar navbati (Bot sessiyasi middleware'i):
+# har bir chat uchun tartib saqlanadi, umumiy va chat bo'yicha token bucket'lar,
+# RetryAfter kelsa kutib qayta yuboriladi. Handler'lar uchun `await message.answer(...)` o'zgarmaydi
+class SendQueue(BaseRequestMiddleware):
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST,
+                 group_rate=SEND_GROUP_RATE, max_retries=SEND_MAX_RETRIES,
+                 global_pause_chats=SEND_GLOBAL_PAUSE_CHATS, global_pause_window=SEND_GLOBAL_PAUSE_WINDOW):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.global_pause_chats = global_pause_chats
+        self.global_pause_window = global_pause_window
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.global_pauses = 0
+        self.max_wait = 0.0
+        self._queues = {}
+        self._buckets = TTLCache(maxsize=200000, ttl=SEND_BUCKET_TTL)
+        self._paused_until = {}
+        self._global_paused_until = 0.0
+        # Oxirgi RetryAfter'lar: (vaqt, chat_id)
+        self._limited = deque()
+        self._tasks = set()
+
+    def depth(self):
+        return sum(len(jobs) for jobs in self._queues.values())
+
+    def _bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, per=60.0)
+            else:
+                bucket = TokenBucket(self.chat_rate, capacity=self.chat_burst)
+        # Har bir foydalanishda muddati yangilanadi
+        self._buckets.set(chat_id, bucket)
+        return bucket
+
+    async def __call__(self, make_request, bot, method):
+        if method.__api_method__ not in SEND_METHODS:
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        future = asyncio.get_running_loop().create_future()
+        jobs = self._queues.get(chat_id)
+        if jobs is None:
+            jobs = self._queues[chat_id] = deque()
+            # Har bir chat uchun bitta drain vazifasi - tartib shu bilan saqlanadi
+            task = contextvars.Context().run(asyncio.create_task, self._drain(chat_id, jobs))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        jobs.append(_Job(bot, method, make_request, future))
+        return await future
+
+    # Chat tokeni, umumiy token va RetryAfter pauzalari tugashigacha kutish
+    async def _wait_turn(self, chat_id):
+        bucket = self._bucket(chat_id) if chat_id is not None else None
+        while True:
+            now = time.monotonic()
+            delay = max(
+                bucket.delay() if bucket is not None else 0.0,
+                self.global_bucket.delay(),
+                self._paused_until.get(chat_id, 0.0) - now,
+                self._global_paused_until - now,
+            )
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if bucket is not None:
+            bucket.consume()
+        self.global_bucket.consume()
+        self._paused_until.pop(chat_id, None)
+
+    async def _drain(self, chat_id, jobs):
+        try:
+            while jobs:
+                job = jobs[0]
+                if job.future.done():
+                    # Chaqiruvchi bekor qilingan
+                    jobs.popleft()
+                    continue
+                await self._wait_turn(chat_id)
+                await self._send(chat_id, job)
+                jobs.popleft()
+        finally:
+            if self._queues.get(chat_id) is jobs:
+                del self._queues[chat_id]
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(RuntimeError("Xabar navbati to'xtatildi"))
+
+    async def _send(self, chat_id, job):
+        waited = time.monotonic() - job.enqueued_at
+        self.max_wait = max(self.max_wait, waited)
+        SEND_QUEUE_LATENCY.observe(waited, method=job.method.__api_method__)
+
+        attempt = 0
+        while True:
+            try:
+                task = job.context.run(asyncio.create_task, job.make_request(job.bot, job.method))
+                result = await task
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries or job.future.done():
+                    self._finish(job, exception=e)
+                    return
+                attempt += 1
+                self.retried += 1
+                SEND_RETRIES.inc()
+                self._pause(chat_id, e.retry_after)
+                await self._wait_turn(chat_id)
+                continue
+            except Exception as e:
+                self._finish(job, exception=e)
+                return
+            self.sent += 1
+            self._finish(job, result=result)
+            return
+
+    # Shu chatga keyingi xabarlar pauza tugaguncha kutadi. Telegram qaysi limit (chat yoki butun bot)
+    # oshganini aytmaydi: bir nechta chatga birdaniga 429 kelsa yoki umumiy bucket tugagan bo'lsa,
+    # bu bot limiti deb hisoblanadi va barcha chatlar kutadi
+    def _pause(self, chat_id, retry_after):
+        now = time.monotonic()
+        paused_until = now + retry_after
+        self._paused_until[chat_id] = paused_until
+        self._limited.append((now, chat_id))
+        while self._limited and now - self._limited[0][0] > self.global_pause_window:
+            self._limited.popleft()
+        chats = {limited_chat for _, limited_chat in self._limited}
+        if len(chats) >= self.global_pause_chats or self.global_bucket.delay() > 0:
+            self.global_pauses += 1
+            self._global_paused_until = max(self._global_paused_until, paused_until)
+
+    def _finish(self, job, result=None, exception=None):
+        if job.future.done():
+            return
+        if exception is not None:
+            self.failed += 1
+            job.future.set_exception(exception)
+        else:
+            job.future.set_result(result)
+
+    def stats(self):
+        return {
+            "queued": self.depth(),
+            "chats": len(self._queues),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "global_pauses": self.global_pauses,
+            "max_wait": round(self.max_wait, 3),
+        }
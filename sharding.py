@@ -0,0 +1,278 @@
+import asyncio
+import bisect
+import hashlib
+import importlib
+import importlib.util
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from webhook import WebhookServer
+
+# Shard sozlamalari
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", str(os.cpu_count() or 2)))
+# Update manbai: "polling" yoki "webhook"
+SHARD_SOURCE = os.getenv("SHARD_SOURCE", "polling")
+SHARD_APP_MODULE = os.getenv("SHARD_APP_MODULE", "api2")
+SHARD_INBOX_SIZE = int(os.getenv("SHARD_INBOX_SIZE", "1000"))
+SHARD_WORKER_CONCURRENCY = int(os.getenv("SHARD_WORKER_CONCURRENCY", "100"))
+SHARD_HEALTH_INTERVAL = float(os.getenv("SHARD_HEALTH_INTERVAL", "5"))
+SHARD_VNODES = 128
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+# Consistent hashing halqasi: worker soni o'zgarsa, userlarning kam qismi ko'chadi
+class HashRing:
+    def __init__(self, nodes, vnodes=SHARD_VNODES):
+        points = sorted((_hash(f"{node}:{i}"), node) for node in nodes for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node(self, key) -> int:
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._nodes[index]
+
+
+# Xom update'dan routing kalitini olish (avval from_user.id, bo'lmasa chat.id).
+# chat_member'da "from" - o'zgartirgan admin; a'zolik keshi esa a'zo bo'lgan user'niki,
+# shuning uchun u update o'sha user workeriga yuboriladi
+def routing_key(payload: dict):
+    for field, event in payload.items():
+        if field == "update_id" or not isinstance(event, dict):
+            continue
+        if field == "chat_member":
+            return event["new_chat_member"]["user"]["id"]
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return payload.get("update_id", 0)
+
+
+# Ilova modulini yuklash. "spawn" rejimida supervisor'ning __main__ moduli workerda __mp_main__
+# nomi bilan allaqachon bajarilgan bo'ladi (masalan, "python api2.py"); o'sha faylni yana import
+# qilish ikkinchi Dispatcher, ombor va fon vazifalarini yaratadi, shuning uchun u qayta ishlatiladi
+def load_app(app_module):
+    if app_module in sys.modules:
+        return sys.modules[app_module]
+    main = sys.modules.get("__mp_main__")
+    main_file = getattr(main, "__file__", None)
+    spec = importlib.util.find_spec(app_module)
+    if main_file and spec is not None and spec.origin \
+            and os.path.realpath(main_file) == os.path.realpath(spec.origin):
+        sys.modules[app_module] = main
+        return main
+    return importlib.import_module(app_module)
+
+
+# Worker jarayoni: o'z dispatcheri bilan faqat o'ziga tegishli userlarni qayta ishlaydi
+def worker_main(index, inbox, outbox, app_module=SHARD_APP_MODULE):
+    os.environ["SHARD_INDEX"] = str(index)
+    asyncio.run(_worker_loop(index, inbox, outbox, app_module))
+
+
+async def _worker_loop(index, inbox, outbox, app_module):
+    from aiogram.types import Update
+
+    app = load_app(app_module)
+    dp, bot = app.dp, app.bot
+    await dp.emit_startup(bot=bot, bots=[bot], dispatcher=dp, **dp.workflow_data)
+
+    stats = {"processed": 0, "failed": 0}
+    limit = asyncio.Semaphore(SHARD_WORKER_CONCURRENCY)
+    tasks = set()
+
+    async def process(payload):
+        started = time.monotonic()
+        try:
+            update = Update.model_validate(payload, context={"bot": bot})
+            await dp.feed_update(bot, update)
+            stats["processed"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"[worker {index}] Update'ni qayta ishlashda xatolik: {e}")
+        finally:
+            stats["last_latency"] = time.monotonic() - started
+            limit.release()
+
+    async def heartbeat():
+        while True:
+            outbox.put({
+                "worker": index,
+                "pid": os.getpid(),
+                "time": time.time(),
+                "inflight": len(tasks),
+                **stats,
+            })
+            await asyncio.sleep(SHARD_HEALTH_INTERVAL)
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        while True:
+            payload = await asyncio.to_thread(inbox.get)
+            if payload is None:
+                break
+            await limit.acquire()
+            task = asyncio.create_task(process(payload))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        beat.cancel()
+        await dp.emit_shutdown(bot=bot, bots=[bot], dispatcher=dp, **dp.workflow_data)
+        await bot.session.close()
+
+
+# Supervisor: update'larni qabul qiladi va user id bo'yicha workerlarga taqsimlaydi
+class ShardSupervisor:
+    def __init__(self, dp, bot, workers=SHARD_WORKERS, app_module=SHARD_APP_MODULE):
+        self.dp = dp
+        self.bot = bot
+        self.worker_count = workers
+        self.app_module = app_module
+        self.ring = HashRing(range(workers))
+        self.health = {}
+        self._ctx = multiprocessing.get_context("spawn")
+        self._outbox = self._ctx.Queue()
+        self._inboxes = []
+        self._processes = []
+        self._pending = []
+        self._tasks = []
+
+    def _spawn(self, index):
+        process = self._ctx.Process(
+            target=worker_main,
+            args=(index, self._inboxes[index], self._outbox, self.app_module),
+            name=f"shard-worker-{index}",
+            daemon=True,
+        )
+        # Worker __main__ modulini worker_main'dan oldin import qiladi - import vaqtida o'qiladigan
+        # sozlamalar (masalan, FSM_SHARED) SHARD_INDEX'ni ko'rishi uchun u muhitda beriladi
+        previous = os.environ.get("SHARD_INDEX")
+        os.environ["SHARD_INDEX"] = str(index)
+        try:
+            process.start()
+        finally:
+            if previous is None:
+                os.environ.pop("SHARD_INDEX", None)
+            else:
+                os.environ["SHARD_INDEX"] = previous
+        self._processes[index] = process
+        print(f"Worker {index} ishga tushdi (pid {process.pid})")
+
+    # Update'ni tegishli workerga yuborish (tartib saqlanadi)
+    async def dispatch(self, payload):
+        index = self.ring.node(routing_key(payload))
+        await self._pending[index].put(payload)
+
+    async def _forward(self, index):
+        while True:
+            payload = await self._pending[index].get()
+            await asyncio.to_thread(self._inboxes[index].put, payload)
+
+    async def _collect_health(self):
+        while True:
+            try:
+                report = await asyncio.to_thread(self._outbox.get, True, 1)
+            except queue.Empty:
+                continue
+            self.health[report["worker"]] = report
+
+    # Worker holatini kuzatish va o'lgan jarayonlarni qayta ishga tushirish
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(SHARD_HEALTH_INTERVAL)
+            now = time.time()
+            for index, process in enumerate(self._processes):
+                report = self.health.get(index, {})
+                if not process.is_alive():
+                    print(f"Worker {index} to'xtab qoldi (exit code {process.exitcode}), qayta ishga tushirilmoqda")
+                    self._spawn(index)
+                elif report and now - report["time"] > SHARD_HEALTH_INTERVAL * 3:
+                    print(f"Worker {index} javob bermayapti ({now - report['time']:.0f}s)")
+
+    def status(self):
+        return {
+            index: {
+                "alive": process.is_alive(),
+                "queued": self._pending[index].qsize(),
+                **self.health.get(index, {}),
+            }
+            for index, process in enumerate(self._processes)
+        }
+
+    # Long polling orqali update'larni olish
+    async def poll(self):
+        allowed_updates = self.dp.resolve_used_update_types()
+        await self.bot.delete_webhook()
+        offset = None
+        failures = 0
+        while True:
+            try:
+                updates = await self.bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"getUpdates xatosi: {e}")
+                await asyncio.sleep(min(2 ** failures, 30))
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                await self.dispatch(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+
+    async def start(self):
+        self._inboxes = [self._ctx.Queue(maxsize=SHARD_INBOX_SIZE) for _ in range(self.worker_count)]
+        self._pending = [asyncio.Queue(maxsize=SHARD_INBOX_SIZE) for _ in range(self.worker_count)]
+        self._processes = [None] * self.worker_count
+        for index in range(self.worker_count):
+            self._spawn(index)
+
+        self._tasks = [asyncio.create_task(self._forward(index)) for index in range(self.worker_count)]
+        self._tasks.append(asyncio.create_task(self._collect_health()))
+        self._tasks.append(asyncio.create_task(self._watch()))
+
+    async def stop(self):
+        # Navbatdagi update'lar workerlarga yetib borishini kutamiz
+        deadline = time.monotonic() + 10
+        while any(not pending.empty() for pending in self._pending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        for inbox in self._inboxes:
+            await asyncio.to_thread(inbox.put, None)
+        for process in self._processes:
+            await asyncio.to_thread(process.join, 30)
+            if process.is_alive():
+                process.terminate()
+
+
+# Supervisor rejimida ishlash (to'xtatilguncha)
+async def run_supervisor(dp, bot, workers=SHARD_WORKERS, source=SHARD_SOURCE):
+    supervisor = ShardSupervisor(dp, bot, workers=workers)
+    await supervisor.start()
+    print(f"Supervisor {workers} ta worker bilan ishga tushdi ({source})")
+
+    try:
+        if source == "webhook":
+            server = WebhookServer(dp, bot, workers=1, handler=supervisor.dispatch)
+            await server.start()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await server.stop()
+        else:
+            try:
+                await supervisor.poll()
+            finally:
+                await bot.session.close()
+    finally:
+        await supervisor.stop()
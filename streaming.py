@@ -0,0 +1,112 @@
+import asyncio
+import os
+
+from aiogram.exceptions import TelegramBadRequest
+
+from metrics import Counter
+
+# Xabarni tahrirlash oralig'i (soniya): shu vaqt ichida kelgan bo'laklar bitta edit'ga yig'iladi
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+# Bitta xabar uzunligi (Telegram chegarasi 4096 belgi, biroz zaxira bilan)
+STREAM_MESSAGE_LIMIT = min(int(os.getenv("STREAM_MESSAGE_LIMIT", "4000")), 4096)
+# Javob hali yozilayotganini bildiruvchi belgi
+STREAM_CURSOR = " ▌"
+
+STREAM_EDITS = Counter("finai_stream_edits_total", "Oqimli javoblar uchun xabar tahrirlari")
+
+
+# Matnni chegaradan oshmaydigan joyda (yangi qator, bo'lmasa bo'shliq) bo'lish
+def split_point(text, limit):
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = text.rfind(" ", 0, limit)
+    return cut if cut > 0 else limit
+
+
+# LLM javobini kelishi bilan ko'rsatuvchi xabar: bo'laklar yig'ilib, ko'pi bilan
+# har STREAM_EDIT_INTERVAL da bir marta edit_text qilinadi; matn chegaradan oshsa,
+# xabar yakunlanib davomi yangi xabarda ko'rsatiladi
+class StreamingReply:
+    def __init__(self, message, interval=STREAM_EDIT_INTERVAL, limit=STREAM_MESSAGE_LIMIT):
+        self.message = message
+        self.interval = interval
+        self.limit = limit
+        self.text = ""
+        self.edits = 0
+        self.messages = 1
+        # text[:_offset] oldingi xabarlarda yakunlangan
+        self._offset = 0
+        self._shown = None
+        self._changed = asyncio.Event()
+        self._finished = asyncio.Event()
+        # Vazifa handler kontekstida yaratiladi (feed() esa LLM scheduler ichidan chaqiriladi)
+        self._task = asyncio.create_task(self._run())
+
+    # Yangi bo'lak (sinxron, tarmoqqa murojaat qilmaydi)
+    def feed(self, delta):
+        self.text += delta
+        self._changed.set()
+
+    # Yakuniy matnni ko'rsatish. Oqim yarmida xato bo'lsa, xato matni javob oxiriga qo'shiladi
+    async def finish(self, text=None):
+        if text is not None and text != self.text:
+            self.text = f"{self.text}\n\n{text}" if self.text and not text.startswith(self.text) else text
+        self._finished.set()
+        self._changed.set()
+        await self._task
+
+    def cancel(self):
+        self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            final = self._finished.is_set()
+            try:
+                await self._render(final)
+            except Exception as e:
+                if final:
+                    raise
+                print(f"Javobni ko'rsatishda xatolik: {e}")
+            if final:
+                return
+            # Keyingi edit'gacha kutish; yakunlansa darhol chiqiladi
+            try:
+                await asyncio.wait_for(self._finished.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _render(self, final):
+        pending = self.text[self._offset:]
+        while len(pending) > self.limit:
+            cut = split_point(pending, self.limit)
+            await self._edit(pending[:cut].rstrip())
+            self._offset += cut
+            pending = self.text[self._offset:]
+            first = pending.lstrip()[:self.limit] or "…"
+            self.message = await self.message.answer(first)
+            self._shown = first
+            self.messages += 1
+
+        display = pending.strip()
+        if not display:
+            if not final:
+                return
+            display = "…"
+        if not final:
+            # Belgi bilan birga ham chegaradan oshmasligi kerak (qolgan qismi keyingi edit'da chiqadi)
+            display = display[:self.limit - len(STREAM_CURSOR)] + STREAM_CURSOR
+        await self._edit(display)
+
+    async def _edit(self, text):
+        if text == self._shown:
+            return
+        try:
+            await self.message.edit_text(text)
+        except TelegramBadRequest as e:
+            if "not modified" not in str(e):
+                raise
+        self._shown = text
+        self.edits += 1
+        STREAM_EDITS.inc()
@@ -0,0 +1,67 @@
+import asyncio
+import os
+
+from ttlcache import TTLCache
+
+# A'zolik keshi sozlamalari (soniyalarda)
+SUB_POSITIVE_TTL = float(os.getenv("SUB_POSITIVE_TTL", "600"))
+SUB_NEGATIVE_TTL = float(os.getenv("SUB_NEGATIVE_TTL", "30"))
+SUB_CACHE_SIZE = int(os.getenv("SUB_CACHE_SIZE", "100000"))
+
+MEMBER_STATUSES = ("member", "administrator", "creator")
+
+# (kanal, user_id) -> a'zomi yoki yo'q
+_members = TTLCache(maxsize=SUB_CACHE_SIZE, ttl=SUB_POSITIVE_TTL)
+
+
+# Kanal havolasidan @username olish
+def channel_username(link: str) -> str:
+    username = link.split("/")[-1]
+    if not username.startswith("@"):
+        username = "@" + username
+    return username.lower()
+
+
+# A'zolik holatini keshga yozish
+def remember(channel: str, user_id: int, status) -> bool:
+    is_member = status in MEMBER_STATUSES
+    ttl = SUB_POSITIVE_TTL if is_member else SUB_NEGATIVE_TTL
+    _members.set((channel.lower(), user_id), is_member, ttl=ttl)
+    return is_member
+
+
+# chat_member update kelganda keshni yangilash
+def on_member_update(chat_username, user_id: int, status):
+    if chat_username:
+        remember("@" + chat_username, user_id, status)
+
+
+async def _fetch(bot, channel: str, user_id: int) -> bool:
+    try:
+        member = await bot.get_chat_member(chat_id=channel, user_id=user_id)
+    except Exception as e:
+        # Xatolik keshlanmaydi, keyingi safar qayta tekshiriladi
+        print(f"Kanal tekshirishda xatolik: {e}")
+        return False
+    return remember(channel, user_id, member.status)
+
+
+# Barcha kanallarga a'zolikni tekshirish (keshdan yoki parallel so'rovlar bilan)
+async def is_subscribed(bot, channels, user_id: int, force: bool = False) -> bool:
+    pending = []
+    for channel in channels:
+        cached = None if force else _members.get((channel, user_id))
+        if cached is False:
+            return False
+        if cached is None:
+            pending.append(channel)
+
+    if not pending:
+        return True
+
+    results = await asyncio.gather(*(_fetch(bot, channel, user_id) for channel in pending))
+    return all(results)
+
+
+def cache_stats():
+    return _members.stats()
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from ai_cache import AnswerCache, normalize_text
+
+PROFILE = ["30", "Dasturchi", "10 mln", "investitsiya", "yo'q"]
+
+
+def test_key_ignores_case_punctuation_and_close_profiles():
+    cache = AnswerCache(path="")
+    other = ["32", "dasturchi", "12000000", "Investitsiya", "Yo'q"]
+    assert cache.key("Depozit qayerga qo'yaman?", PROFILE) == cache.key("depozit  qayerga qoʻyaman", other)
+    assert cache.key("Depozit", PROFILE) != cache.key("Kredit", PROFILE)
+    assert normalize_text("  Salom,   DUNYO! ") == "salom dunyo"
+
+
+def test_concurrent_requests_share_one_fetch():
+    calls = []
+
+    async def scenario():
+        cache = AnswerCache(path="")
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "javob"
+
+        answers = await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)))
+        assert await cache.get_or_fetch("k", fetch) == "javob"
+        return answers, cache.stats()
+
+    answers, stats = asyncio.run(scenario())
+    assert answers == ["javob"] * 5
+    assert len(calls) == 1
+    assert stats["collapsed"] == 4
+    assert stats["inflight"] == 0
+
+
+def test_followers_retry_when_leader_is_cancelled():
+    calls = []
+
+    async def scenario():
+        cache = AnswerCache(path="")
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "javob"
+
+        leader = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(cache.get_or_fetch("k", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(asyncio.gather(*followers), 2)
+
+    assert asyncio.run(scenario()) == ["javob"] * 3
+    # Bekor qilingan so'rov va bitta qayta so'rov (qolganlari unga qo'shiladi)
+    assert len(calls) == 2
+
+
+def test_cancelled_follower_does_not_cancel_leader():
+    async def scenario():
+        cache = AnswerCache(path="")
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "javob"
+
+        leader = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(scenario()) == "javob"
+
+
+def test_errors_are_shared_but_not_cached():
+    async def scenario():
+        cache = AnswerCache(path="")
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("LLM ishlamayapti")
+
+        results = await asyncio.gather(*(cache.get_or_fetch("k", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        async def ok():
+            return "javob"
+
+        return await cache.get_or_fetch("k", ok)
+
+    assert asyncio.run(scenario()) == "javob"
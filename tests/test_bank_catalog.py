@@ -0,0 +1,35 @@
+import asyncio
+import json
+import os
+
+import bank_catalog
+from bank_catalog import BankCatalog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_default_file_does_not_depend_on_working_directory(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    assert bank_catalog.BANKS_FILE == os.path.join(ROOT, "banks.json")
+    catalog = BankCatalog()
+    catalog.load()
+    assert "topilmadi" not in capsys.readouterr().out
+    with open(os.path.join(ROOT, "banks.json"), encoding="utf-8") as f:
+        assert set(catalog.current.banks) == set(json.load(f))
+
+
+def test_missing_file_is_reported(tmp_path, capsys):
+    path = tmp_path / "banks.json"
+    catalog = BankCatalog(str(path))
+    assert not catalog.load()
+    assert str(path) in capsys.readouterr().out
+
+    # Fayl keyin paydo bo'lsa, qayta yuklashda o'qiladi
+    path.write_text(json.dumps({"test": {"name": "Test bank", "rate": 20, "min_amount": 1}}), encoding="utf-8")
+    assert asyncio.run(catalog.reload())
+    assert set(catalog.current.banks) == {"test"}
+
+    path.unlink()
+    assert not asyncio.run(catalog.reload())
+    assert "o'chirildi" in capsys.readouterr().out
+    assert set(catalog.current.banks) == {"test"}
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from broadcast import Broadcaster
+from user_store import UserStore
+
+
+class FakeBot:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(self.delay)
+        self.sent.append(chat_id)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"))
+    store.open()
+    for user_id in range(100, 160):
+        store[str(user_id)] = {"profile": ["30"]}
+    store.flush_sync()
+    yield store
+    store.flush_sync()
+
+
+def test_broadcast_is_owned_by_one_process(store):
+    async def scenario():
+        first_bot, second_bot = FakeBot(delay=0.01), FakeBot()
+        first = Broadcaster(first_bot, store, rate=1000, batch=10, lease=30)
+        second = Broadcaster(second_bot, store, rate=1000, batch=10, lease=30)
+
+        await first.start("salom")
+        while len(first_bot.sent) < 25:
+            await asyncio.sleep(0.01)
+        # Birinchi jarayon yuborayotganda ikkinchisi uni olmaydi
+        assert await second.resume() is None
+        assert second._waiter is not None
+
+        # Shutdown: band qilish bekor qilinadi, ikkinchi jarayon darhol davom ettiradi
+        await first.close()
+        checkpoint = first.job.last_user_id
+        second._waiter.cancel()
+        assert await second.resume() == first.job.id
+        await second._task
+        await second.close()
+        return first_bot.sent, second_bot.sent, checkpoint
+
+    first_sent, second_sent, checkpoint = asyncio.run(scenario())
+    assert set(first_sent) | set(second_sent) == set(range(100, 160))
+    assert min(second_sent) > int(checkpoint)
+    # Ko'pi bilan bitta bo'lim qayta yuboriladi
+    assert len(set(first_sent) & set(second_sent)) <= 10
+
+
+def test_expired_lease_can_be_taken_over(store):
+    async def scenario():
+        first = Broadcaster(FakeBot(delay=0.05), store, rate=1000, batch=10, lease=0.3)
+        second = Broadcaster(FakeBot(), store, rate=1000, batch=10, lease=30)
+        await first.start("salom")
+        # Jarayon "o'ldi": vazifa band qilishni bekor qilmasdan to'xtaydi
+        first._save = lambda *args, **kwargs: True
+        first._task.cancel()
+        await asyncio.gather(first._task, return_exceptions=True)
+        assert await second.resume() is None
+        await asyncio.sleep(0.4)
+        assert await second.resume() is not None
+        await second._task
+        await second.close()
+        await first.close()
+        return second.job.sent
+
+    assert asyncio.run(scenario()) > 0
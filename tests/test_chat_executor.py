@@ -0,0 +1,120 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Update
+
+from chat_executor import FLOOD_NOTICE, ChatExecutor
+
+USER = {"id": 7, "is_bot": False, "first_name": "Ali"}
+CHAT = {"id": 7, "type": "private"}
+
+
+# Telegram'ga so'rov yubormasdan chaqirilgan metodlarni yozib boruvchi sessiya
+class RecordingSession(BaseSession):
+    def __init__(self):
+        super().__init__()
+        self.methods = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.methods.append(method)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def message(update_id, text):
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "chat": CHAT, "from": USER, "text": text,
+    }}
+
+
+def callback(update_id, data):
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "from": USER, "chat_instance": "1", "data": data,
+        "message": {"message_id": 1, "date": 0, "chat": CHAT, "text": "menyu"},
+    }}
+
+
+def member(update_id):
+    bot_user = {"id": 1, "is_bot": True, "first_name": "bot"}
+    return {"update_id": update_id, "my_chat_member": {
+        "chat": CHAT, "from": USER, "date": 0,
+        "old_chat_member": {"status": "member", "user": bot_user},
+        "new_chat_member": {"status": "kicked", "until_date": 0, "user": bot_user},
+    }}
+
+
+class Harness:
+    def __init__(self, **kwargs):
+        self.session = RecordingSession()
+        self.bot = Bot("1:a", session=self.session)
+        self.executor = ChatExecutor(**{"max_pending": 10, **kwargs})
+        self.release = asyncio.Event()
+        self.handled = []
+
+    async def handler(self, update, data):
+        await self.release.wait()
+        self.handled.append(update.update_id)
+
+    def feed(self, payload):
+        update = Update.model_validate(payload, context={"bot": self.bot})
+        data = {"event_chat": update.event.chat if hasattr(update.event, "chat") else None,
+                "event_from_user": update.event.from_user}
+        return asyncio.create_task(self.executor(self.handler, update, data))
+
+    def sent(self, name):
+        return [method for method in self.session.methods if type(method).__name__ == name]
+
+
+def test_identical_messages_are_all_processed():
+    async def scenario():
+        harness = Harness()
+        tasks = [harness.feed(message(i, "salom")) for i in range(1, 4)]
+        await asyncio.sleep(0)
+        harness.release.set()
+        await asyncio.gather(*tasks)
+        return harness
+
+    harness = asyncio.run(scenario())
+    assert harness.handled == [1, 2, 3]
+    assert harness.executor.duplicates == 0
+
+
+def test_repeated_callback_and_redelivered_update_are_dropped():
+    async def scenario():
+        harness = Harness()
+        tasks = [harness.feed(callback(1, "credit")), harness.feed(callback(2, "credit"))]
+        await asyncio.sleep(0)
+        harness.release.set()
+        await asyncio.gather(*tasks)
+        await harness.feed(message(3, "salom"))
+        await harness.feed(message(3, "salom"))
+        return harness
+
+    harness = asyncio.run(scenario())
+    assert harness.handled == [1, 3]
+    assert harness.executor.duplicates == 2
+    # Takror tugma bosilishiga ham javob beriladi
+    assert len(harness.sent("AnswerCallbackQuery")) == 1
+
+
+def test_flood_drop_notifies_once_and_keeps_service_updates():
+    async def scenario():
+        harness = Harness(max_pending=2)
+        tasks = [harness.feed(message(i, f"savol {i}")) for i in range(1, 6)]
+        tasks.append(harness.feed(member(6)))
+        await asyncio.sleep(0)
+        harness.release.set()
+        await asyncio.gather(*tasks)
+        return harness
+
+    harness = asyncio.run(scenario())
+    assert harness.handled == [1, 2, 6]
+    assert harness.executor.flood_dropped == 3
+    notices = harness.sent("SendMessage")
+    assert [notice.text for notice in notices] == [FLOOD_NOTICE]
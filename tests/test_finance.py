@@ -0,0 +1,107 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from finance import calculate_credit_schedule, calculate_credit_schedules, calculate_deposit
+
+
+# Vektorlashtirishdan oldingi sikl bilan hisoblash (taqqoslash uchun)
+def legacy_schedule(amount, interest_rate, term, start_date):
+    start_date = datetime.strptime(start_date, "%d.%m.%Y")
+    monthly_rate = interest_rate / 100 / 12
+    monthly_payment = amount * (monthly_rate * (1 + monthly_rate) ** term) / ((1 + monthly_rate) ** term - 1)
+
+    schedule = []
+    remaining_balance = amount
+    for i in range(1, term + 1):
+        interest_payment = remaining_balance * monthly_rate
+        principal_payment = monthly_payment - interest_payment
+        remaining_balance -= principal_payment
+        if i == term:
+            monthly_payment += remaining_balance
+            remaining_balance = 0
+        schedule.append({
+            'number': i,
+            'date': (start_date + timedelta(days=30 * i)).strftime("%d.%m.%Y"),
+            'interest': round(interest_payment, 2),
+            'total_payment': round(monthly_payment, 2),
+            'remaining_balance': round(max(remaining_balance, 0), 2),
+        })
+    return schedule
+
+
+def random_loans(count, seed=5):
+    rng = random.Random(seed)
+    return [
+        (
+            rng.choice([rng.randint(1, 500) * 100000, rng.uniform(100000, 2e9)]),
+            rng.choice([round(rng.uniform(0.5, 60), 2), 18.5, 24.0]),
+            rng.randint(1, 360),
+            f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(2020, 2026)}",
+        )
+        for _ in range(count)
+    ]
+
+
+# Yopiq formula sikldan suzuvchi nuqta xatoligi darajasida farq qiladi. Xatolik summa * (1+r)^n ga
+# proporsional (yuqori stavka va uzoq muddatda bir necha so'mgacha yetadi), tolerantlik shunga ko'ra
+def test_matches_legacy_loop():
+    loans = random_loans(2000)
+    for loan, schedule in zip(loans, calculate_credit_schedules(loans)):
+        expected = legacy_schedule(*loan)
+        rows = list(schedule.rows())
+        assert len(rows) == len(expected)
+        growth = (1 + loan[1] / 100 / 12) ** loan[2]
+        tolerance = 0.01 + loan[0] * growth * 1e-14
+        for row, old in zip(rows, expected):
+            assert row['number'] == old['number']
+            assert row['date'] == old['date']
+            for field in ('interest', 'total_payment', 'remaining_balance'):
+                assert abs(row[field] - old[field]) <= tolerance, (loan, field, row, old)
+
+
+# Oddiy stavkalarda farq tiyinlardan oshmaydi
+def test_matches_legacy_loop_to_the_cent():
+    loans = [(amount, rate, term, "01.01.2025")
+             for amount in (1000000, 50000000, 950000000) for rate in (12.0, 18.5, 24.0) for term in (12, 60, 240)]
+    for loan, schedule in zip(loans, calculate_credit_schedules(loans)):
+        for row, old in zip(schedule.rows(), legacy_schedule(*loan)):
+            for field in ('interest', 'total_payment', 'remaining_balance'):
+                assert abs(row[field] - old[field]) <= 0.01 + 1e-12 * loan[0], (loan, field)
+
+
+def test_batch_matches_single_calls():
+    loans = random_loans(300, seed=9)
+    for loan, schedule in zip(loans, calculate_credit_schedules(loans)):
+        assert list(schedule.rows()) == list(calculate_credit_schedule(*loan).rows())
+
+
+@pytest.mark.parametrize("loan", [
+    (10000000, 0, 12, "01.10.2024"),
+    (10000000, 18.5, 0, "01.10.2024"),
+    (10000000, 18.5, 12, "2024-10-01"),
+    (10000000, 1e308, 12, "01.10.2024"),
+    (10000000, float("inf"), 12, "01.10.2024"),
+    (10000000, float("nan"), 12, "01.10.2024"),
+    (float("inf"), 18.5, 12, "01.10.2024"),
+    (10000000, 5000000, 360, "01.10.2024"),
+])
+def test_invalid_loans_return_none(loan):
+    assert calculate_credit_schedule(*loan) is None
+
+
+def test_invalid_loan_does_not_affect_others_in_batch():
+    good = (10000000, 18.5, 12, "01.10.2024")
+    results = calculate_credit_schedules([good, (10000000, 1e308, 360, "01.10.2024"), good])
+    assert results[1] is None
+    assert list(results[0].rows()) == list(results[2].rows())
+    assert results[0].summary()['principal'] == pytest.approx(10000000, abs=0.05)
+
+
+def test_deposit_totals():
+    result = calculate_deposit(1000000, 20, 12, capitalization=True, tax_rate=12)
+    assert result['total_amount'] == pytest.approx(1000000 * (1 + 0.2 / 12) ** 12, abs=0.01)
+    assert result['net_interest'] == pytest.approx(result['total_interest'] * 0.88, abs=0.01)
+    simple = calculate_deposit(1000000, 20, 12, capitalization=False)
+    assert simple['total_interest'] == 200000
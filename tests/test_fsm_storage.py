@@ -0,0 +1,107 @@
+import asyncio
+import sqlite3
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+import fsm_storage
+from fsm_storage import SQLiteStorage
+
+
+def key(chat_id):
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def first():
+        storage = SQLiteStorage(path, shared=False)
+        await storage.set_state(key(1), "CreditForm:term")
+        await storage.set_data(key(1), {"amount": 1000000.0})
+        await storage.close()
+
+    async def second():
+        storage = SQLiteStorage(path, shared=False)
+        try:
+            return await storage.get_state(key(1)), await storage.get_data(key(1))
+        finally:
+            await storage.close()
+
+    run(first())
+    assert run(second()) == ("CreditForm:term", {"amount": 1000000.0})
+
+
+def test_unserializable_data_does_not_stop_flushing(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def scenario():
+        storage = SQLiteStorage(path, shared=False)
+        await storage.set_data(key(1), {"bad": object()})
+        await storage.set_state(key(2), "DepositForm:term")
+        await storage.flush()
+        # Keyingi o'zgarishlar ham yoziladi
+        await storage.set_data(key(1), {"amount": 5.0})
+        await storage.close()
+
+    run(scenario())
+    conn = sqlite3.connect(path)
+    rows = dict(conn.execute("SELECT key, data FROM fsm").fetchall())
+    conn.close()
+    assert len(rows) == 2
+    assert '{"amount": 5.0}' in rows.values()
+
+
+def test_failed_write_keeps_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(fsm_storage, "FSM_CACHE_SIZE", 1)
+    path = str(tmp_path / "fsm.db")
+
+    async def scenario():
+        storage = SQLiteStorage(path, shared=False)
+        write = storage._write
+
+        def broken(*args):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        monkeypatch.setattr(storage, "_write", broken)
+        await storage.set_state(key(1), "A:a")
+        await storage.set_state(key(2), "B:b")
+        await storage.flush()
+        assert len(storage._dirty) == 2
+        # Yozilmagan holatlar keshdan chiqarilmaydi
+        await storage.get_state(key(3))
+        assert await storage.get_state(key(1)) == "A:a"
+
+        monkeypatch.setattr(storage, "_write", write)
+        await storage.close()
+
+        reopened = SQLiteStorage(path, shared=False)
+        try:
+            return await reopened.get_state(key(1)), await reopened.get_state(key(2))
+        finally:
+            await reopened.close()
+
+    assert run(scenario()) == ("A:a", "B:b")
+
+
+def test_shared_storages_see_each_other(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def scenario():
+        first = SQLiteStorage(path, shared=True)
+        second = SQLiteStorage(path, shared=True)
+        try:
+            assert await second.get_state(key(1)) is None
+            await first.set_state(key(1), "ProfileForm:age")
+            assert await second.get_state(key(1)) == "ProfileForm:age"
+            await second.set_data(key(1), {"age": "30"})
+            assert await first.get_data(key(1)) == {"age": "30"}
+        finally:
+            await first.close()
+            await second.close()
+
+    run(scenario())
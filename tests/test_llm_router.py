@@ -0,0 +1,175 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from llm_client import LLMError
+from llm_router import CircuitBreaker, LLMRouter, Provider
+
+
+def answer(text):
+    return {"choices": [{"message": {"content": text}}]}
+
+
+class FakeProvider(Provider):
+    def __init__(self, name, outcomes=(), delay=0.0, consecutive=3):
+        super().__init__()
+        self.name = name
+        self.breaker = CircuitBreaker(consecutive=consecutive, min_requests=100, cooldown=60)
+        # Har bir chaqiruv natijasi: matn yoki xato; ro'yxat tugasa - provayder nomi
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = 0
+
+    def _outcome(self):
+        self.calls += 1
+        return self.outcomes.pop(0) if self.outcomes else self.name
+
+    async def complete(self, payload):
+        outcome = self._outcome()
+        await asyncio.sleep(self.delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return answer(outcome)
+
+    async def stream_deltas(self, payload):
+        outcome = self._outcome()
+        await asyncio.sleep(self.delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        for word in outcome.split():
+            yield word
+
+
+def router(*providers, **kwargs):
+    return LLMRouter(providers, **{"hedge": False, **kwargs})
+
+
+async def collect(stream):
+    return [delta async for delta in stream]
+
+
+def test_provider_must_implement_complete():
+    class Incomplete(Provider):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_client_errors_do_not_open_breaker_or_fail_over():
+    primary = FakeProvider("a", [LLMError(400, "bad request")] * 5)
+    backup = FakeProvider("b")
+
+    async def scenario():
+        llm = router(primary, backup)
+        for _ in range(5):
+            with pytest.raises(LLMError):
+                await llm.complete({})
+        return llm
+
+    llm = asyncio.run(scenario())
+    assert primary.breaker.state == "closed"
+    assert backup.calls == 0
+    assert llm.failovers == 0
+    assert primary.stats()["rejected"] == 5
+    assert primary.stats()["errors"] == 0
+
+
+@pytest.mark.parametrize("error", [
+    LLMError(503, "unavailable"),
+    asyncio.TimeoutError(),
+    aiohttp.ServerDisconnectedError(),
+])
+def test_provider_failures_open_breaker_and_fail_over(error):
+    primary = FakeProvider("a", [error] * 3)
+    backup = FakeProvider("b")
+
+    async def scenario():
+        llm = router(primary, backup)
+        results = [(await llm.complete({}))["choices"][0]["message"]["content"] for _ in range(4)]
+        return llm, results
+
+    llm, results = asyncio.run(scenario())
+    assert results == ["b"] * 4
+    assert primary.breaker.state == "open"
+    # Breaker ochilgach asosiy provayderga so'rov yuborilmaydi
+    assert primary.calls == 3
+    assert llm.failovers == 3
+
+
+def test_half_open_trial_released_after_client_error():
+    primary = FakeProvider("a", [LLMError(500), LLMError(422)], consecutive=1)
+    primary.breaker.cooldown = 0
+
+    async def scenario():
+        llm = router(primary)
+        with pytest.raises(LLMError):
+            await llm.complete({})
+        assert primary.breaker.state == "open"
+        # Sinov so'rovi 4xx oldi - breaker yopilmaydi ham, qayta ochilmaydi ham
+        with pytest.raises(LLMError):
+            await llm.complete({})
+        assert primary.breaker.state == "half_open"
+        return await llm.complete({})
+
+    assert asyncio.run(scenario()) == answer("a")
+    assert primary.breaker.state == "closed"
+
+
+def test_stream_fails_over_before_first_chunk():
+    primary = FakeProvider("a", [LLMError(502)])
+    backup = FakeProvider("b", ["ikkinchi javob"])
+
+    async def scenario():
+        llm = router(primary, backup)
+        return llm, await collect(llm.stream({}))
+
+    llm, deltas = asyncio.run(scenario())
+    assert deltas == ["ikkinchi", "javob"]
+    assert llm.failovers == 1
+    assert primary.errors == 1
+
+
+def test_stream_client_error_is_not_failed_over():
+    primary = FakeProvider("a", [LLMError(401)])
+    backup = FakeProvider("b")
+
+    async def scenario():
+        with pytest.raises(LLMError):
+            await collect(router(primary, backup).stream({}))
+
+    asyncio.run(scenario())
+    assert backup.calls == 0
+
+
+def test_stream_is_hedged_when_first_chunk_is_late():
+    primary = FakeProvider("a", ["sekin javob"], delay=1.0)
+    backup = FakeProvider("b", ["tez javob"])
+
+    async def scenario():
+        llm = router(primary, backup, hedge=True, hedge_min_delay=0.05, hedge_min_samples=1, hedge_max_ratio=1)
+        primary.stats_window.record(0.01, True)
+        return llm, await collect(llm.stream({}))
+
+    llm, deltas = asyncio.run(scenario())
+    assert deltas == ["tez", "javob"]
+    assert llm.hedged == 1 and llm.hedge_wins == 1
+    # Yutqazgan oqim bekor qilindi - xato sifatida hisoblanmaydi
+    assert primary.errors == 0
+    assert primary.breaker.state == "closed"
+
+
+def test_complete_is_hedged_when_answer_is_late():
+    primary = FakeProvider("a", delay=1.0)
+    backup = FakeProvider("b")
+
+    async def scenario():
+        llm = router(primary, backup, hedge=True, hedge_min_delay=0.05, hedge_min_samples=1, hedge_max_ratio=1)
+        primary.stats_window.record(0.01, True)
+        return llm, await llm.complete({})
+
+    llm, result = asyncio.run(scenario())
+    assert result == answer("b")
+    assert llm.hedge_wins == 1
+    assert primary.errors == 0
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import LLMScheduler, SchedulerOverloaded
+
+
+def scheduler(**kwargs):
+    return LLMScheduler(**{"max_concurrency": 1, "rpm": 100000, "tpm": 10 ** 9, "max_queue": 100, **kwargs})
+
+
+def test_round_robin_between_users():
+    order = []
+
+    async def scenario():
+        llm = scheduler()
+
+        def job(name):
+            async def factory():
+                order.append(name)
+                await asyncio.sleep(0.01)
+                return name
+            return factory
+
+        tasks = [asyncio.create_task(llm.run("a", job(f"a{i}"))) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(llm.run("b", job("b0"))))
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(scenario())
+    assert results == ["a0", "a1", "a2", "a3", "b0"]
+    # "b" ning yagona so'rovi "a" ning qolgan navbatini kutmaydi
+    assert order.index("b0") <= 2
+
+
+def test_errors_reach_the_caller():
+    async def scenario():
+        llm = scheduler()
+
+        async def failing():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await llm.run("a", failing)
+        return llm.stats()
+
+    assert asyncio.run(scenario())["completed"] == 1
+
+
+@pytest.mark.parametrize("error", [asyncio.CancelledError, KeyboardInterrupt])
+def test_caller_is_released_when_factory_does_not_return(error):
+    class Stop(BaseException):
+        pass
+
+    raised = Stop if error is KeyboardInterrupt else error
+
+    async def scenario():
+        llm = scheduler()
+
+        async def factory():
+            raise raised()
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(llm.run("a", factory), 2)
+        # Keyingi so'rovlar ishlashda davom etadi
+        async def ok():
+            return 1
+
+        assert await asyncio.wait_for(llm.run("a", ok), 2) == 1
+        assert llm.running == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_limit():
+    async def scenario():
+        llm = scheduler(max_queue=1)
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        # Bittasi ishlayapti, bittasi navbatda
+        tasks = []
+        for _ in range(2):
+            tasks.append(asyncio.create_task(llm.run("a", blocked)))
+            await asyncio.sleep(0.01)
+        assert llm.stats()["running"] == 1 and llm.depth() == 1
+        with pytest.raises(SchedulerOverloaded):
+            await llm.run("b", blocked)
+        release.set()
+        await asyncio.wait_for(asyncio.gather(*tasks), 2)
+        assert llm.stats()["rejected"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_job_does_not_use_budget():
+    async def scenario():
+        # Daqiqasiga 60 so'rov, bitta token qolgan - ikkinchi so'rov ~1 s kutadi
+        llm = scheduler(rpm=60)
+        llm.requests.consume(59)
+        started = []
+
+        async def factory(name):
+            started.append(name)
+            return name
+
+        assert await llm.run("a", lambda: factory("a")) == "a"
+        waiting = asyncio.create_task(llm.run("b", lambda: factory("b")))
+        await asyncio.sleep(0.05)
+        # User javobni kutmay ketib qoldi (limit kutilayotgan paytda)
+        waiting.cancel()
+        await asyncio.sleep(1.1)
+        return llm, started
+
+    llm, started = asyncio.run(scenario())
+    assert started == ["a"]
+    assert llm.started == 1
+    assert llm.requests.delay(1) == 0
+
+
+def test_abandoned_job_cancels_running_factory():
+    async def scenario():
+        llm = scheduler()
+        running, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def slow():
+            running.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        task = asyncio.create_task(llm.run("a", slow))
+        await asyncio.wait_for(running.wait(), 2)
+        task.cancel()
+        await asyncio.wait_for(cancelled.wait(), 2)
+        await asyncio.sleep(0)
+        # O'rin bo'shadi - keyingi so'rov darhol boshlanadi
+        assert llm.running == 0
+
+        async def ok():
+            return 1
+
+        assert await asyncio.wait_for(llm.run("b", ok), 2) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,53 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "loadtest", "run_loadtest.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Kichik yuklama testi: bot lokal fake Telegram/LLM serverlari bilan alohida jarayonda ishlaydi
+def run_loadtest(tmp_path, *extra):
+    output = tmp_path / "report.json"
+    command = [
+        sys.executable, SCRIPT, "--users", "8", "--concurrency", "8",
+        "--llm-latency", "0.05", "--llm-jitter", "0.01", "--giga-latency", "0.05", "--timeout", "20",
+        "--send-chat-rate", "50", "--send-global-rate", "1000",
+        "--tg-port", str(free_port()), "--llm-port", str(free_port()),
+        "--giga-port", str(free_port()), "--metrics-port", str(free_port()),
+        "--output", str(output), *extra,
+    ]
+    result = subprocess.run(command, cwd=tmp_path, capture_output=True, text=True, timeout=240)
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
+    with open(output, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def assert_all_steps_passed(report):
+    assert report["steps"]
+    for step, row in report["steps"].items():
+        assert row["errors"] == 0 and row["timeouts"] == 0, (step, row)
+
+
+def test_all_flows_complete_under_load(tmp_path):
+    report = run_loadtest(tmp_path)
+    assert_all_steps_passed(report)
+    # Har bir user profile, credit, deposit va ai oqimlarini to'liq o'tadi
+    assert report["steps"]["start"]["count"] == 8
+    assert report["steps"]["ai_answer_done"]["count"] == 8
+
+
+def test_ai_answers_fail_over_when_openai_is_down(tmp_path):
+    report = run_loadtest(tmp_path, "--flows", "profile,ai", "--openai-down-after", "0")
+    assert_all_steps_passed(report)
+    # OpenAI 503 qaytaradi - javoblar GigaChat orqali keladi
+    assert report["gigachat"]["requests"] > 0
+    assert report["llm_router"]["openai"]["errors"] > 0
@@ -0,0 +1,38 @@
+import asyncio
+import os
+import tracemalloc
+
+import pytest
+
+from profiling import UpdateProfiler
+
+
+async def handler(event, data):
+    return event
+
+
+def profile_updates(profiler, updates=2):
+    async def scenario():
+        done = []
+
+        async def on_done(path):
+            done.append(path)
+
+        assert profiler.arm(updates, on_done=on_done)
+        for update in range(updates):
+            await profiler(handler, update, {})
+        return done
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("tracing_before", [False, True])
+def test_profiler_leaves_tracemalloc_as_it_found_it(tmp_path, tracing_before):
+    if tracing_before:
+        tracemalloc.start()
+    try:
+        done = profile_updates(UpdateProfiler(directory=str(tmp_path), sample_rate=1.0))
+        assert tracemalloc.is_tracing() == tracing_before
+    finally:
+        tracemalloc.stop()
+    assert len(done) == 1 and os.path.exists(done[0])
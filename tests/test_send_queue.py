@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from send_queue import SendQueue
+
+
+def send_queue(**kwargs):
+    return SendQueue(**{"global_rate": 1000, "chat_rate": 1000, "chat_burst": 1000, **kwargs})
+
+
+# Ko'rsatilgan chatlarga birinchi xabar 429 bilan qaytadi
+def limited_telegram(limited_chats, retry_after):
+    sent = []
+    limited = set()
+
+    async def make_request(bot, method):
+        if method.chat_id in limited_chats and method.chat_id not in limited:
+            limited.add(method.chat_id)
+            raise TelegramRetryAfter(method, "Too Many Requests", retry_after)
+        sent.append((method.chat_id, time.monotonic()))
+        return True
+
+    return make_request, sent
+
+
+def test_retry_after_pauses_only_that_chat():
+    make_request, sent = limited_telegram({1}, 0.3)
+
+    async def scenario():
+        queue = send_queue()
+        started = time.monotonic()
+        first = asyncio.create_task(queue(make_request, None, SendMessage(chat_id=1, text="a")))
+        await asyncio.sleep(0.05)
+        await queue(make_request, None, SendMessage(chat_id=2, text="b"))
+        await first
+        return started, queue
+
+    started, queue = asyncio.run(scenario())
+    at = dict(sent)
+    # Boshqa chat kutmaydi, 429 olgan chat esa pauzadan keyin yuboriladi
+    assert at[2] - started < 0.2
+    assert at[1] - started >= 0.29
+    assert queue.retried == 1 and queue.global_pauses == 0
+
+
+def test_retry_after_in_several_chats_pauses_every_chat():
+    make_request, sent = limited_telegram({1, 2, 3}, 0.3)
+
+    async def scenario():
+        queue = send_queue(global_pause_chats=3)
+        started = time.monotonic()
+        limited = [asyncio.create_task(queue(make_request, None, SendMessage(chat_id=chat_id, text="a")))
+                   for chat_id in (1, 2, 3)]
+        await asyncio.sleep(0.05)
+        await queue(make_request, None, SendMessage(chat_id=4, text="b"))
+        await asyncio.gather(*limited)
+        return started, queue
+
+    started, queue = asyncio.run(scenario())
+    assert sorted(chat_id for chat_id, _ in sent) == [1, 2, 3, 4]
+    assert all(at - started >= 0.29 for _, at in sent)
+    assert queue.global_pauses == 1
+
+
+def test_retry_after_with_exhausted_global_bucket_pauses_every_chat():
+    make_request, sent = limited_telegram({1}, 0.3)
+
+    async def scenario():
+        queue = send_queue(global_rate=2)
+        started = time.monotonic()
+        first = asyncio.create_task(queue(make_request, None, SendMessage(chat_id=1, text="a")))
+        await queue(make_request, None, SendMessage(chat_id=2, text="b"))
+        await queue(make_request, None, SendMessage(chat_id=3, text="c"))
+        await first
+        return started, queue
+
+    started, queue = asyncio.run(scenario())
+    assert queue.global_pauses == 1
+    assert all(at - started >= 0.29 for chat_id, at in sent if chat_id == 3)
@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from sharding import HashRing, routing_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP = textwrap.dedent("""
+    import multiprocessing
+    import os
+
+    with open(os.environ["APP_LOG"], "a") as log:
+        log.write(f"import {os.getpid()} {__name__} {os.environ.get('SHARD_INDEX')}\\n")
+
+
+    def child():
+        import sharding
+
+        app = sharding.load_app("shard_app")
+        with open(os.environ["APP_LOG"], "a") as log:
+            log.write(f"loaded {os.getpid()} {app.__name__}\\n")
+
+
+    if __name__ == "__main__":
+        ctx = multiprocessing.get_context("spawn")
+        os.environ["SHARD_INDEX"] = "3"
+        process = ctx.Process(target=child)
+        process.start()
+        process.join()
+""")
+
+
+# "python api2.py" kabi ishga tushirilganda worker ilova modulini ikkinchi marta bajarmasligi kerak
+def test_worker_reuses_spawned_main_module(tmp_path):
+    (tmp_path / "shard_app.py").write_text(APP)
+    log = tmp_path / "app.log"
+    env = {**os.environ, "APP_LOG": str(log), "PYTHONPATH": ROOT}
+    subprocess.run([sys.executable, "shard_app.py"], cwd=tmp_path, env=env, check=True, timeout=60)
+
+    lines = log.read_text().split("\n")
+    child_pid = next(line.split()[1] for line in lines if line.startswith("loaded"))
+    child_imports = [line for line in lines if line.startswith(f"import {child_pid} ")]
+    assert child_imports == [f"import {child_pid} __mp_main__ 3"]
+    assert f"loaded {child_pid} __mp_main__" in lines
+
+
+def test_hash_ring_is_stable_when_a_worker_is_added():
+    before = HashRing(range(4))
+    after = HashRing(range(5))
+    moved = sum(before.node(user_id) != after.node(user_id) for user_id in range(10000))
+    assert moved < 10000 * 0.35
+
+
+def member_update(field, admin_id, member_id):
+    chat = {"id": -100, "type": "channel", "username": "kanal"}
+    return {"update_id": 1, field: {
+        "chat": chat, "from": {"id": admin_id, "is_bot": False, "first_name": "Admin"}, "date": 0,
+        "old_chat_member": {"status": "left", "user": {"id": member_id, "is_bot": False, "first_name": "A"}},
+        "new_chat_member": {"status": "member", "user": {"id": member_id, "is_bot": False, "first_name": "A"}},
+    }}
+
+
+# Kanal a'zoligi o'zgarsa, kesh a'zo bo'lgan user workerida yangilanishi kerak (admin'nikida emas)
+def test_chat_member_is_routed_to_the_member():
+    ring = HashRing(range(8))
+    admin_id = 1
+    member_id = next(user_id for user_id in range(2, 1000) if ring.node(user_id) != ring.node(admin_id))
+    key = routing_key(member_update("chat_member", admin_id, member_id))
+    assert key == member_id
+    assert ring.node(key) == ring.node(routing_key({"update_id": 2, "message": {
+        "message_id": 1, "date": 0, "chat": {"id": member_id, "type": "private"},
+        "from": {"id": member_id, "is_bot": False, "first_name": "A"}, "text": "salom",
+    }}))
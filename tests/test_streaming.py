@@ -0,0 +1,94 @@
+import asyncio
+import random
+import time
+
+from streaming import STREAM_CURSOR, StreamingReply, split_point
+
+
+class FakeChat:
+    def __init__(self):
+        self.messages = []
+        # (vaqt, xabar raqami, matn)
+        self.edits = []
+
+
+# Telegram xabari o'rniga: matnlar chatda saqlanadi
+class FakeMessage:
+    def __init__(self, chat, text):
+        self.chat = chat
+        self.index = len(chat.messages)
+        chat.messages.append(text)
+
+    async def edit_text(self, text):
+        self.chat.messages[self.index] = text
+        self.chat.edits.append((time.monotonic(), self.index, text))
+
+    async def answer(self, text):
+        return FakeMessage(self.chat, text)
+
+
+def answer_text(words=2500, seed=1):
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(words):
+        parts.append(rng.choice(["depozit", "kredit", "foiz", "bank", "jamg'arma", "**muhim**", "1 000 000"]))
+        parts.append(rng.choice([" ", " ", " ", "\n", "\n\n"]))
+    return "".join(parts).strip()
+
+
+def stream(text, chunk=7, pause=0.0, interval=0.05, limit=4000):
+    async def scenario():
+        chat = FakeChat()
+        reply = StreamingReply(FakeMessage(chat, "⏳"), interval=interval, limit=limit)
+        for start in range(0, len(text), chunk):
+            reply.feed(text[start:start + chunk])
+            await asyncio.sleep(pause)
+        await reply.finish(text)
+        return chat, reply
+
+    return asyncio.run(scenario())
+
+
+def test_edits_are_coalesced_per_interval():
+    text = answer_text(words=200)
+    chat, reply = stream(text, chunk=3, pause=0.001, interval=0.05)
+    times = [at for at, _, _ in chat.edits]
+    assert len(times) < len(text) / 3 / 5
+    # Yakuniy edit kutmaydi, qolganlari orasida kamida bitta interval
+    assert all(later - earlier >= 0.045 for earlier, later in zip(times, times[1:-1]))
+    assert chat.messages == [text]
+
+
+def test_rollover_keeps_whole_answer_within_telegram_limit():
+    text = answer_text()
+    assert len(text) > 3 * 4000
+    chat, reply = stream(text, chunk=50)
+    assert reply.messages == len(chat.messages) > 1
+    assert all(len(message) <= 4000 for message in chat.messages)
+    assert not any(message.endswith(STREAM_CURSOR) for message in chat.messages)
+    # Bo'linish faqat bo'shliqlarda - so'zlar yo'qolmaydi va bo'linmaydi
+    assert " ".join(chat.messages).split() == text.split()
+
+
+def test_rollover_without_spaces_loses_nothing():
+    text = "".join(str(i % 10) for i in range(9000))
+    chat, _ = stream(text, chunk=100, limit=4096)
+    assert "".join(chat.messages) == text
+    assert all(len(message) <= 4096 for message in chat.messages)
+    # Oraliq (kursorli) edit'lar ham chegaradan oshmaydi
+    assert all(len(edit) <= 4096 for _, _, edit in chat.edits)
+
+
+def test_split_point_prefers_newlines_then_spaces():
+    assert split_point("abc def\nghi jkl", 14) == 7
+    # Yangi qator juda boshida bo'lsa, oxirgi bo'shliqdan bo'linadi
+    assert split_point("a" * 10 + "\n" + "b" * 20 + " c", 32) == 31
+    assert split_point("x" * 50, 20) == 20
+
+
+def test_cursor_does_not_push_edit_over_limit():
+    text = "x" * 4095 + " oxiri"
+    chat, _ = stream(text, chunk=4095, pause=0.06, limit=4096)
+    assert any(edit.endswith(STREAM_CURSOR) for _, _, edit in chat.edits)
+    assert all(len(edit) <= 4096 for _, _, edit in chat.edits)
+    assert " ".join(chat.messages) == text
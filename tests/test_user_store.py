@@ -0,0 +1,157 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+import user_store
+from user_store import UserStore
+
+PROFILE = ["30", "dasturchi", "10000000", "investitsiya", "yo'q"]
+
+
+def stored(path, user_id):
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    finally:
+        conn.close()
+    return row
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"))
+    store.open()
+    yield store
+    store.flush_sync()
+
+
+def test_write_behind_until_flush(store):
+    store["1"] = {"profile": PROFILE, "credit_info": None}
+    assert store.dirty_count() == 1
+    assert len(store) == 1
+    assert stored(store.path, "1") is None
+
+    assert asyncio.run(store.flush()) == 1
+    assert store.dirty_count() == 0
+    assert stored(store.path, "1") is not None
+    assert len(store) == 1
+
+
+def test_eviction_skips_records_being_written(store, monkeypatch):
+    monkeypatch.setattr(user_store, "USER_CACHE_SIZE", 2)
+    store["old"] = {"profile": PROFILE}
+    store.flush_sync()
+    store["a"] = {"profile": ["1"]}
+
+    started, release = threading.Event(), threading.Event()
+    write = store._write
+
+    def slow_write(rows):
+        started.set()
+        release.wait(5)
+        write(rows)
+
+    monkeypatch.setattr(store, "_write", slow_write)
+
+    async def scenario():
+        flush = asyncio.create_task(store.flush())
+        await asyncio.to_thread(started.wait, 5)
+        # Yozish davom etayotganda kesh to'lib ketadi
+        store["b"] = {"profile": ["2"]}
+        store["c"] = {"profile": ["3"]}
+        # LRU'dan chiqqan, lekin yozilayotgan yozuv xotirada qoladi
+        assert "a" in store._pinned
+        # Yangi qiymat yozilayotgan yozuv ustiga (commit'dan keyin ham dirty qoladi)
+        store["a"]["profile"] = ["4"]
+        store.mark_dirty("a")
+        release.set()
+        assert await flush == 1
+
+    asyncio.run(scenario())
+    assert "old" not in store._cache
+    assert store.get("a")["profile"] == ("4",)
+    assert store.dirty_count() == 3
+    monkeypatch.setattr(store, "_write", write)
+    store.flush_sync()
+    assert '"4"' in stored(store.path, "a")[0]
+
+
+def test_failed_flush_keeps_records(store, monkeypatch):
+    monkeypatch.setattr(user_store, "USER_CACHE_SIZE", 1)
+    store["1"] = {"profile": PROFILE}
+
+    def broken(rows):
+        raise sqlite3.OperationalError("database is locked")
+
+    write = store._write
+    monkeypatch.setattr(store, "_write", broken)
+    assert asyncio.run(store.flush()) == 0
+    assert store.dirty_count() == 1
+
+    # Qayta belgilangan yozuv keshdan chiqarilmaydi va keyingi flush'da yoziladi
+    store["2"] = {"profile": ["x"]}
+    assert "1" in store._pinned
+    monkeypatch.setattr(store, "_write", write)
+    assert asyncio.run(store.flush()) == 2
+    assert stored(store.path, "1") is not None
+
+
+def test_mark_dirty_loads_or_raises(store, monkeypatch):
+    store["1"] = {"profile": PROFILE}
+    store.flush_sync()
+    store._cache.clear()
+
+    store.mark_dirty("1")
+    assert "1" in store._cache
+    assert store.dirty_count() == 1
+
+    with pytest.raises(KeyError):
+        store.mark_dirty("missing")
+
+
+def queries(store):
+    executed = []
+    store.conn.set_trace_callback(executed.append)
+    return executed
+
+
+def test_unknown_users_are_not_queried_again(store):
+    executed = queries(store)
+    assert store.get("404") is None
+    assert "404" not in store
+    assert store.get("404", {}) == {}
+    assert len(executed) == 1
+
+    # Yangi user: __setitem__ bazaga qayta murojaat qilmaydi
+    store["404"] = {"profile": PROFILE}
+    assert "404" in store
+    assert len(executed) == 1
+
+
+def test_len_is_counted_without_querying(store):
+    store["1"] = {"profile": PROFILE}
+    store["2"] = {"profile": PROFILE}
+    store.flush_sync()
+    store["2"] = {"profile": ["yangi"]}
+    executed = queries(store)
+    assert len(store) == 2
+    assert not executed
+
+    reopened = UserStore(store.path)
+    reopened.open()
+    reopened["3"] = {"profile": PROFILE}
+    assert len(reopened) == 3
+
+
+def test_written_records_leave_memory_after_eviction(store, monkeypatch):
+    monkeypatch.setattr(user_store, "USER_CACHE_SIZE", 2)
+    for user_id in "abcd":
+        store[user_id] = {"profile": [user_id]}
+    assert list(store._cache) == ["c", "d"]
+    assert set(store._pinned) == {"a", "b"}
+
+    store.flush_sync()
+    assert not store._pinned
+    assert store.get("a")["profile"] == ("a",)
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp.test_utils import make_mocked_request
+
+from chat_executor import ChatExecutor
+from webhook import WebhookServer
+
+
+def server(dp=None, bot=None, **kwargs):
+    return WebhookServer(dp, bot, url="https://example.com/hook", secret="maxfiy-kalit", **kwargs)
+
+
+def message(update_id, chat_id):
+    chat = {"id": chat_id, "type": "private"}
+    user = {"id": chat_id, "is_bot": False, "first_name": "Ali"}
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "chat": chat, "from": user, "text": f"xabar {update_id}",
+    }}
+
+
+@pytest.mark.parametrize("token", ["", "noto'g'ri", "kalit-ключ"])
+def test_wrong_secret_is_rejected(token):
+    request = make_mocked_request("POST", "/hook", headers={"X-Telegram-Bot-Api-Secret-Token": token})
+    response = asyncio.run(server().handle_update(request))
+    assert response.status == 401
+
+
+def test_matching_secret_is_accepted():
+    async def scenario():
+        webhook = server()
+        request = make_mocked_request("POST", "/hook", headers={"X-Telegram-Bot-Api-Secret-Token": "maxfiy-kalit"})
+        request.json = lambda: asyncio.sleep(0, {"update_id": 1})
+        response = await webhook.handle_update(request)
+        return response, webhook.queue.get_nowait()
+
+    response, payload = asyncio.run(scenario())
+    assert response.status == 200
+    assert payload == {"update_id": 1}
+
+
+def test_blocked_chat_does_not_delay_other_chats():
+    async def scenario():
+        dp = Dispatcher()
+        ChatExecutor(max_pending=10).setup(dp)
+        release = asyncio.Event()
+        handled = []
+
+        @dp.message()
+        async def handler(message):
+            # 1-chatning javobi (masalan, sekin LLM) kutib turadi
+            if message.chat.id == 1:
+                await release.wait()
+            handled.append(message.message_id)
+
+        webhook = server(dp, Bot("1:a"), workers=2)
+        workers = [asyncio.create_task(webhook._worker()) for _ in range(webhook.worker_count)]
+        for update_id in range(1, 6):
+            webhook.queue.put_nowait(message(update_id, 1))
+        webhook.queue.put_nowait(message(6, 2))
+        try:
+            for _ in range(100):
+                if 6 in handled:
+                    break
+                await asyncio.sleep(0.01)
+            blocked = list(handled)
+            release.set()
+            await asyncio.wait_for(webhook.queue.join(), 5)
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return blocked, handled
+
+    blocked, handled = asyncio.run(scenario())
+    assert blocked == [6]
+    assert handled == [6, 1, 2, 3, 4, 5]
@@ -0,0 +1,100 @@
+import math
+import os
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery
+
+from metrics import Counter
+from ratelimit import TokenBucket
+from ttlcache import TTLCache
+
+# Limitlar (daqiqasiga so'rovlar va ketma-ket ruxsat etilgan "burst"):
+# default - har qanday xabar/tugma (obuna tekshiruvidan oldin), ai - AI savollari, calculator - kalkulyator qadamlari
+THROTTLE_DEFAULT_RATE = float(os.getenv("THROTTLE_DEFAULT_RATE", "60"))
+THROTTLE_DEFAULT_BURST = float(os.getenv("THROTTLE_DEFAULT_BURST", "20"))
+THROTTLE_AI_RATE = float(os.getenv("THROTTLE_AI_RATE", "6"))
+THROTTLE_AI_BURST = float(os.getenv("THROTTLE_AI_BURST", "3"))
+THROTTLE_CALC_RATE = float(os.getenv("THROTTLE_CALC_RATE", "60"))
+THROTTLE_CALC_BURST = float(os.getenv("THROTTLE_CALC_BURST", "20"))
+# Bucket'lar xotirada ko'pi bilan shuncha (user, limit) uchun va faol bo'lmasa shuncha soniya saqlanadi
+THROTTLE_MAX_BUCKETS = int(os.getenv("THROTTLE_MAX_BUCKETS", "100000"))
+THROTTLE_BUCKET_TTL = float(os.getenv("THROTTLE_BUCKET_TTL", "600"))
+
+THROTTLE_LIMITS = {
+    "default": (THROTTLE_DEFAULT_RATE, THROTTLE_DEFAULT_BURST),
+    "ai": (THROTTLE_AI_RATE, THROTTLE_AI_BURST),
+    "calculator": (THROTTLE_CALC_RATE, THROTTLE_CALC_BURST),
+}
+
+THROTTLED = Counter("finai_throttled_total", "Limitdan oshgani uchun tashlab yuborilgan update'lar", ["limit"])
+
+
+class _Entry:
+    __slots__ = ("bucket", "warned")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        # Shu ketma-ketlikda ogohlantirish yuborilganmi (har bir tashlangan update'ga javob yozilmaydi)
+        self.warned = False
+
+
+# Kiruvchi update'lar uchun user bo'yicha token bucket limiti.
+# Limit nomi handler flag'idan olinadi: @dp.message(..., flags={"throttle": "ai"});
+# flag bo'lmasa "default" ishlatiladi (outer middleware'da handler hali ma'lum emas)
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, default=None, limits=THROTTLE_LIMITS, maxsize=THROTTLE_MAX_BUCKETS, ttl=THROTTLE_BUCKET_TTL):
+        self.default = default
+        self.limits = limits
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.allowed = 0
+        self.throttled = 0
+        self.notices = 0
+
+    def _entry(self, name, user_id):
+        key = (name, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            rate, burst = self.limits[name]
+            entry = _Entry(TokenBucket(rate, per=60.0, capacity=burst))
+        # Har bir murojaatda muddati yangilanadi
+        self._entries.set(key, entry)
+        return entry
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        name = get_flag(data, "throttle", default=self.default)
+        if user is None or name not in self.limits:
+            return await handler(event, data)
+
+        entry = self._entry(name, user.id)
+        if entry.bucket.try_consume():
+            entry.warned = False
+            self.allowed += 1
+            return await handler(event, data)
+
+        self.throttled += 1
+        THROTTLED.inc(limit=name)
+        if not entry.warned:
+            entry.warned = True
+            self.notices += 1
+            await self._notify(event, entry.bucket.delay())
+        elif isinstance(event, CallbackQuery):
+            # Tugmadagi soat belgisi yo'qolishi uchun (xabarsiz)
+            await event.answer()
+        return None
+
+    @staticmethod
+    async def _notify(event, retry_in):
+        # Message uchun alohida xabar, CallbackQuery uchun esa tugma ustidagi bildirishnoma
+        await event.answer(
+            f"⏳ Juda tez yozyapsiz. Iltimos, {max(1, math.ceil(retry_in))} soniyadan keyin qayta urinib ko'ring."
+        )
+
+    def stats(self):
+        return {
+            "buckets": len(self._entries),
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+            "notices": self.notices,
+        }
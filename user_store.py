@@ -0,0 +1,406 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+
+from metrics import STORE_FLUSH_LATENCY, STORE_FLUSH_ROWS
+from ttlcache import TTLCache
+
+# Yozishni kechiktirish (write-behind) sozlamalari
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "1.0"))
+USER_FLUSH_BATCH = int(os.getenv("USER_FLUSH_BATCH", "500"))
+# Xotirada saqlanadigan userlar soni (o'zgartirilmagan yozuvlar chiqarib yuboriladi)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+# Bazada yo'qligi aniqlangan userlar (ro'yxatdan o'tmaganlar har update'da bazaga so'rov yubormasligi uchun)
+USER_MISS_CACHE_SIZE = int(os.getenv("USER_MISS_CACHE_SIZE", "50000"))
+USER_MISS_TTL = float(os.getenv("USER_MISS_TTL", "300"))
+
+# active = 0 - user botni bloklagan (broadcast'da o'tkazib yuboriladi)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1
+)
+"""
+
+# User yozuvi o'zgargan bo'lsa, u bot bilan gaplashgan - yana faol hisoblanadi
+UPSERT = """
+INSERT INTO users (user_id, data, updated_at, active) VALUES (?, ?, ?, 1)
+ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at, active = 1
+"""
+
+
+# Shu uzunlikkacha bo'lgan javoblar intern qilinadi ("ha", "yo'q", kasblar, sanalar ...)
+INTERN_MAX_LENGTH = 32
+
+
+def _intern(value):
+    if isinstance(value, str) and len(value) <= INTERN_MAX_LENGTH:
+        return sys.intern(value)
+    return value
+
+
+# Kredit ma'lumoti: faqat kerakli 4 ta maydon (FSM'dan qolgan boshqa kalitlar saqlanmaydi)
+class CreditInfo:
+    __slots__ = ("amount", "interest_rate", "term", "start_date")
+    FIELDS = __slots__
+
+    def __init__(self, amount, interest_rate, term, start_date):
+        self.amount = float(amount)
+        self.interest_rate = float(interest_rate)
+        self.term = int(term)
+        self.start_date = _intern(start_date)
+
+    @classmethod
+    def from_dict(cls, data):
+        if data is None or isinstance(data, cls):
+            return data
+        return cls(data['amount'], data['interest_rate'], data['term'], data['start_date'])
+
+    # Lug'atga o'xshash interfeys (credit_info['amount'], .get(...))
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.FIELDS]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (CreditInfo, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CreditInfo({self.to_dict()!r})"
+
+
+# Ixcham user yozuvi: profil interned satrlar tuple'i, kredit ma'lumoti CreditInfo.
+# Eski handlerlar uchun {"profile": [...], "credit_info": {...}} lug'atiga o'xshab ishlaydi
+class UserRecord:
+    __slots__ = ("profile", "credit_info")
+    FIELDS = __slots__
+
+    def __init__(self, profile=(), credit_info=None):
+        self.profile = tuple(_intern(value) for value in profile or ())
+        self.credit_info = CreditInfo.from_dict(credit_info)
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        return cls(data.get("profile"), data.get("credit_info"))
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key == "profile":
+            self.profile = tuple(_intern(item) for item in value or ())
+        elif key == "credit_info":
+            self.credit_info = CreditInfo.from_dict(value)
+        else:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.FIELDS]
+
+    def to_dict(self):
+        return {
+            "profile": list(self.profile),
+            "credit_info": self.credit_info.to_dict() if self.credit_info is not None else None,
+        }
+
+    def __repr__(self):
+        return f"UserRecord({self.to_dict()!r})"
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+# SQLite (WAL) ustidagi user ombori, lug'atga o'xshash interfeys bilan
+class UserStore:
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._writer = None
+        self._cache = OrderedDict()
+        # LRU'dan chiqqan, lekin hali yozilmagan (dirty yoki yozilayotgan) yozuvlar - commit'gacha shu yerda
+        self._pinned = {}
+        self._missing = TTLCache(maxsize=USER_MISS_CACHE_SIZE, ttl=USER_MISS_TTL)
+        self._dirty = set()
+        # Yozilayotgan (hali commit qilinmagan) userlar
+        self._flushing = set()
+        # Userlar soni (har safar COUNT(*) qilinmasligi uchun; yangi userlar qo'shilganda oshiriladi)
+        self._count = None
+        self._lock = None
+        self._wake = None
+        self._flush_task = None
+
+    def open(self, migrate_from=None):
+        if self._conn is None:
+            self._conn = _connect(self.path)
+            with self._conn:
+                self._conn.execute(SCHEMA)
+                columns = {row[1] for row in self._conn.execute("PRAGMA table_info(users)")}
+                if "active" not in columns:
+                    self._conn.execute("ALTER TABLE users ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+            (self._count,) = self._conn.execute("SELECT COUNT(*) FROM users").fetchone()
+        if migrate_from:
+            self._migrate_json(migrate_from)
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self.open()
+        return self._conn
+
+    # Eski user_data.json faylidan bir martalik ko'chirish
+    def _migrate_json(self, json_path):
+        if not os.path.exists(json_path):
+            return 0
+        if self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Faylni o'qishda xatolik: {e}")
+            return 0
+
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                UPSERT,
+                ((str(user_id), json.dumps(record, ensure_ascii=False), now) for user_id, record in data.items())
+            )
+        os.replace(json_path, json_path + ".migrated")
+        self._count += len(data)
+        self._missing.clear()
+        print(f"JSON fayldan {len(data)} ta user ko'chirildi")
+        return len(data)
+
+    # Eng eski yozuv chiqariladi; yozilmagan o'zgarishi bo'lsa _pinned'ga o'tadi (LRU'da qidirilmaydi)
+    def _remember(self, user_id, record):
+        self._pinned.pop(user_id, None)
+        self._cache[user_id] = record
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > USER_CACHE_SIZE:
+            victim, victim_record = self._cache.popitem(last=False)
+            if victim in self._dirty or victim in self._flushing:
+                self._pinned[victim] = victim_record
+
+    def _cached(self, user_id):
+        record = self._cache.get(user_id)
+        if record is not None:
+            self._cache.move_to_end(user_id)
+            return record
+        return self._pinned.get(user_id)
+
+    def _load(self, user_id):
+        row = self.conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            self._missing.set(user_id, True)
+            return None
+        record = UserRecord.from_dict(json.loads(row[0]))
+        self._remember(user_id, record)
+        return record
+
+    def get(self, user_id, default=None):
+        record = self._cached(user_id)
+        if record is None and user_id not in self._missing:
+            record = self._load(user_id)
+        return default if record is None else record
+
+    def __getitem__(self, user_id):
+        record = self.get(user_id)
+        if record is None:
+            raise KeyError(user_id)
+        return record
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    # Lug'at berilsa ixcham UserRecord'ga aylantiriladi
+    def __setitem__(self, user_id, record):
+        if user_id not in self:
+            self._count += 1
+            self._missing.pop(user_id)
+        self._remember(user_id, UserRecord.from_dict(record))
+        self.mark_dirty(user_id)
+
+    def __len__(self):
+        if self._count is None:
+            self.open()
+        return self._count
+
+    # O'zgargan userni navbatdagi yozishga belgilash
+    def dirty_count(self):
+        return len(self._dirty)
+
+    # Xotirada bo'lmagan user bazadan yuklanadi; umuman yo'q bo'lsa KeyError
+    def mark_dirty(self, user_id=None):
+        if user_id is None:
+            self._dirty.update(self._cache)
+        else:
+            if self._cached(user_id) is None and self._load(user_id) is None:
+                raise KeyError(user_id)
+            self._dirty.add(user_id)
+        if self._wake is not None and len(self._dirty) >= USER_FLUSH_BATCH:
+            self._wake.set()
+
+    # Belgilangan userlar yozish uchun olinadi; commit'gacha ular _flushing'da turadi
+    def _snapshot(self):
+        dirty, self._dirty = self._dirty, set()
+        self._flushing |= dirty
+        now = time.time()
+        rows = [
+            (user_id, json.dumps(self._cached(user_id).to_dict(), ensure_ascii=False), now)
+            for user_id in dirty
+        ]
+        return dirty, rows
+
+    # Yozilgan va qayta o'zgarmagan pinned yozuvlar xotiradan chiqariladi
+    def _committed(self, dirty):
+        self._flushing -= dirty
+        for user_id in dirty:
+            if user_id not in self._dirty:
+                self._pinned.pop(user_id, None)
+
+    # Yozib bo'lmasa userlar yana belgilanadi (xotiradan chiqarilmagani uchun yo'qolmaydi)
+    def _restore(self, dirty):
+        self._flushing -= dirty
+        self._dirty |= dirty
+
+    def _write(self, rows):
+        if self._writer is None:
+            self._writer = _connect(self.path)
+        with self._writer:
+            self._writer.executemany(UPSERT, rows)
+
+    # Faol userlar ID'lari user_id tartibida, "after" dan keyingi "limit" tasi
+    # (hammasi xotiraga yuklanmaydi - broadcast shu bilan bo'lib-bo'lib o'qiydi)
+    def active_user_ids(self, after="", limit=1000):
+        rows = self.conn.execute(
+            "SELECT user_id FROM users WHERE active = 1 AND user_id > ? ORDER BY user_id LIMIT ?",
+            (after, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def active_count(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM users WHERE active = 1").fetchone()
+        return count
+
+    def _deactivate(self, user_ids):
+        if self._writer is None:
+            self._writer = _connect(self.path)
+        with self._writer:
+            self._writer.executemany("UPDATE users SET active = 0 WHERE user_id = ?", ((user_id,) for user_id in user_ids))
+
+    # Botni bloklagan userlarni nofaol deb belgilash
+    async def deactivate(self, user_ids):
+        if not user_ids:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await asyncio.to_thread(self._deactivate, list(user_ids))
+
+    # Belgilangan userlarni bitta tranzaksiyada yozish (event loopdan tashqarida)
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._dirty:
+                return 0
+            started = time.perf_counter()
+            dirty = set(self._dirty)
+            try:
+                dirty, rows = self._snapshot()
+                await asyncio.to_thread(self._write, rows)
+            except BaseException as e:
+                if not isinstance(e, asyncio.CancelledError):
+                    print(f"Bazaga yozishda xatolik: {e}")
+                self._restore(dirty)
+                if not isinstance(e, Exception):
+                    raise
+                return 0
+            self._committed(dirty)
+            STORE_FLUSH_LATENCY.observe(time.perf_counter() - started, store="users")
+            STORE_FLUSH_ROWS.inc(len(rows), store="users")
+            return len(rows)
+
+    # Sinxron yozish (event loop yo'q joylar uchun)
+    def flush_sync(self):
+        dirty = set(self._dirty)
+        try:
+            dirty, rows = self._snapshot()
+            self._write(rows)
+        except BaseException:
+            self._restore(dirty)
+            raise
+        self._committed(dirty)
+        return len(rows)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), USER_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None:
+            self._wake = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+            self._wake = None
+        await self.flush()
+        for conn in (self._writer, self._conn):
+            if conn is not None:
+                conn.close()
+        self._writer = None
+        self._conn = None
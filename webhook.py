@@ -0,0 +1,159 @@
+import asyncio
+import hmac
+import os
+from urllib.parse import urlparse
+
+from aiohttp import web
+from aiogram.types import Update
+
+from metrics import QUEUE_DEPTH
+
+# Webhook sozlamalari
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Navbat to'lsa Telegramga 503 qaytariladi va u update'ni keyinroq qayta yuboradi
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "32"))
+# Dispatcher'da bir vaqtda turishi mumkin bo'lgan update'lar (chat navbatida kutayotganlar bilan)
+WEBHOOK_MAX_INFLIGHT = int(os.getenv("WEBHOOK_MAX_INFLIGHT", "1000"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))
+
+
+# aiohttp webhook server: update'lar tez qabul qilinadi va fon vazifalarida qayta ishlanadi
+# handler berilsa, xom update dispatcher o'rniga unga uzatiladi (masalan, shard supervisorga)
+class WebhookServer:
+    def __init__(self, dp, bot, url=None, secret=None, host=WEBHOOK_HOST, port=WEBHOOK_PORT,
+                 queue_size=WEBHOOK_QUEUE_SIZE, workers=WEBHOOK_WORKERS, max_inflight=WEBHOOK_MAX_INFLIGHT,
+                 handler=None):
+        self.dp = dp
+        self.bot = bot
+        self.handler = handler
+        self.url = url or WEBHOOK_URL
+        self.secret = secret or WEBHOOK_SECRET
+        if not self.url:
+            raise ValueError("WEBHOOK_URL .env faylda topilmadi!")
+        if not self.secret:
+            raise ValueError("WEBHOOK_SECRET .env faylda topilmadi!")
+
+        self.host = host
+        self.port = port
+        self.path = urlparse(self.url).path or "/"
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.worker_count = workers
+        self.rejected = 0
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._tasks = set()
+        self._workers = []
+        self._runner = None
+        QUEUE_DEPTH.track(self.queue_depth, queue="webhook")
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    async def handle_update(self, request):
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        # compare_digest str uchun faqat ASCII qabul qiladi - boshqa belgili sarlavha TypeError beradi
+        if not hmac.compare_digest(token.encode("utf-8", "surrogateescape"), self.secret.encode()):
+            return web.Response(status=401)
+
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+        return web.Response()
+
+    async def handle_health(self, request):
+        return web.json_response({
+            "queue": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "rejected": self.rejected,
+            "inflight": len(self._tasks),
+        })
+
+    async def _worker(self):
+        while True:
+            payload = await self.queue.get()
+            if self.handler is None:
+                # Update fon vazifasida qayta ishlanadi: chat navbatini (ChatExecutor) kutayotgan update
+                # workerni band qilmaydi, parallel ishlash chegarasi ChatExecutor semaforidan keladi
+                await self._inflight.acquire()
+                task = asyncio.create_task(self._feed(payload))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                continue
+            try:
+                await self.handler(payload)
+            except Exception as e:
+                print(f"Update'ni qayta ishlashda xatolik: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _feed(self, payload):
+        try:
+            update = Update.model_validate(payload, context={"bot": self.bot})
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            print(f"Update'ni qayta ishlashda xatolik: {e}")
+        finally:
+            self._inflight.release()
+            self.queue.task_done()
+
+    async def start(self):
+        if self.handler is None:
+            await self.dp.emit_startup(bot=self.bot, bots=[self.bot], dispatcher=self.dp, **self.dp.workflow_data)
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.handle_health)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+        await self.bot.set_webhook(
+            self.url,
+            secret_token=self.secret,
+            allowed_updates=self.dp.resolve_used_update_types(),
+            max_connections=100,
+        )
+        print(f"Webhook {self.host}:{self.port}{self.path} da ishga tushdi")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        # Navbatdagi update'larni tugatishga vaqt beramiz
+        try:
+            await asyncio.wait_for(self.queue.join(), WEBHOOK_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"{self.queue.qsize()} ta update qayta ishlanmay qoldi")
+
+        tasks = self._workers + list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+
+        if self.handler is None:
+            await self.dp.emit_shutdown(bot=self.bot, bots=[self.bot], dispatcher=self.dp, **self.dp.workflow_data)
+        await self.bot.session.close()
+
+
+# Webhook rejimida ishlash (to'xtatilguncha)
+async def run_webhook(dp, bot, **kwargs):
+    server = WebhookServer(dp, bot, **kwargs)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()